@@ -0,0 +1,286 @@
+# 异步批量验证TVBox地址，test_main 和 test_local_file 共用
+# 用 asyncio + aiohttp 同时发起大量请求，全局和单个域名的并发数都有上限，
+# 这样一次可以验证上万个地址，同时占用的连接数是有限的。
+# 每个实际发出请求的地址还会记录性能数据（收到响应头的耗时、总耗时、大小、sites/lives 数），用于排序导出
+import asyncio
+import logging
+import time
+import urllib.parse
+from collections import namedtuple
+
+import aiohttp
+
+from config_parser import find_top_level_key, loads_lenient, parse_config_body
+from body_reader import STREAM_VALIDATION, MAX_BODY_BYTES, read_response_async, decode_body
+from http_cache import check_with_cache_async
+from cancellation import CANCEL_POLL, CancelToken, Cancelled
+from metrics import aiohttp_trace_config
+import parse_pool
+from host_health import CircuitOpen, get_tracker, tracked_get, trace_config
+from mirror_race import mirror_candidates, race_async
+
+logger = logging.getLogger(__name__)
+
+# 全局最大并发请求数（同时打开的连接数上限）
+MAX_CONCURRENCY = 200
+
+# 单个域名的最大并发请求数
+PER_HOST_LIMIT = 8
+
+# 单个地址的验证超时时间（秒）
+VALIDATE_TIMEOUT = 10
+
+# 非 JSON 内容中常见的 TVBox 配置关键字
+TVBOX_KEYWORDS = ['tvbox', 'live', 'vod', 'epg', 'source']
+
+# 一次验证请求的性能数据：ttfb、elapsed 为收到响应头和读取完毕的耗时（秒），size 为内容字节数，
+# sites、lives 为配置中的条目数；无法得知的字段为 None（例如流式验证提前停止，只读取了部分内容）
+Measurement = namedtuple('Measurement', ['ttfb', 'elapsed', 'size', 'sites', 'lives'])
+
+
+def match_tvbox_content(text):
+    """按 AsyncValidator 的规则判断内容，返回 'valid'（有效）、'possible'（可能有效）或 None。
+    顶层有 TVBox 键即有效（允许注释、结尾逗号等常见的不规范写法，见 config_parser），只扫描顶层结构；
+    没有键时才完整解析一次，判断内容是不是 JSON"""
+    if find_top_level_key(text):
+        return 'valid'
+    try:
+        loads_lenient(text)
+    except ValueError:
+        return match_keywords(text)
+    return None
+
+
+def match_keywords(text):
+    """不是 JSON 的内容：包含常见 TVBox 配置关键字时返回 'possible'，否则返回 None"""
+    text_content = text.lower()
+    if any(keyword in text_content for keyword in TVBOX_KEYWORDS):
+        return 'possible'
+    return None
+
+
+def judge_bytes(body, encoding=None):
+    """按 match_tvbox_content 判断原始内容（在解析进程中执行）"""
+    return match_tvbox_content(decode_body(body, encoding))
+
+
+def judge_body(result, encoding=None):
+    """根据流式读取的结果判断，读取时已看到 TVBox 顶层键则不再解析"""
+    if result.key_found:
+        return 'valid'
+    return parse_pool.run(judge_bytes, result.body, encoding)
+
+
+async def judge_body_async(result, encoding=None):
+    """judge_body 的异步版本，解析时不阻塞事件循环"""
+    if result.key_found:
+        return 'valid'
+    return await parse_pool.run_async(judge_bytes, result.body, encoding)
+
+
+def _usable_body(result, url):
+    if result.status != 200:
+        logger.debug(f"无效的地址 (状态码 {result.status}): {url}")
+        return False
+    if result.body is None:
+        logger.debug(f"跳过地址 ({result.reason}): {url}")
+        return False
+    return True
+
+
+def judge_result(result, url=''):
+    """按 AsyncValidator 的规则判断一次请求的结果（FetchResult）"""
+    if not _usable_body(result, url):
+        return None
+    return judge_body(result.body, result.encoding)
+
+
+async def judge_result_async(result, url=''):
+    """judge_result 的异步版本"""
+    if not _usable_body(result, url):
+        return None
+    return await judge_body_async(result.body, result.encoding)
+
+
+def count_entries(body, encoding=None):
+    """返回配置中 (sites 条目数, lives 条目数)；内容不完整或不是 JSON 配置时返回 None（在解析进程中执行）"""
+    config = parse_config_body(body, encoding)
+    if config is None:
+        return None
+    return tuple(len(config[key]) if isinstance(config.get(key), list) else 0 for key in ('sites', 'lives'))
+
+
+def needs_count(result):
+    """看到顶层键后可能提前停止了读取，只有内容完整时才能解析出条目数"""
+    return result.body is not None and not result.body.truncated and result.body.key_found
+
+
+def measure(result, counts=None):
+    """从一次请求的结果（FetchResult）和 count_entries 的结果得到 Measurement"""
+    size = sites = lives = None
+    length = result.headers.get('Content-Length') if result.headers is not None else None
+    if length and length.isdigit():
+        size = int(length)
+    body = result.body
+    if counts is not None:
+        sites, lives = counts
+    if size is None and body is not None and not body.truncated and (counts is not None or not body.key_found):
+        size = len(body.body)
+    return Measurement(result.ttfb, result.elapsed, size, sites, lives)
+
+
+class AsyncValidator:
+    def __init__(self, max_concurrency=MAX_CONCURRENCY, per_host=PER_HOST_LIMIT, timeout=VALIDATE_TIMEOUT,
+                 stream=STREAM_VALIDATION, max_body_bytes=MAX_BODY_BYTES, measurements=None):
+        self.max_concurrency = max_concurrency
+        self.per_host = per_host
+        self.timeout = timeout
+        self.stream = stream
+        self.max_body_bytes = max_body_bytes
+        # 地址 -> Measurement，只包含实际发出请求的地址（使用缓存判定的地址没有）
+        self.measurements = {} if measurements is None else measurements
+        self._global_sem = None
+        self._host_sems = {}
+
+    def _host_semaphore(self, url):
+        host = urllib.parse.urlparse(url).netloc.lower()
+        sem = self._host_sems.get(host)
+        if sem is None:
+            sem = asyncio.Semaphore(self.per_host)
+            self._host_sems[host] = sem
+        return sem
+
+    async def _fetch(self, session, url, headers, max_defer=None):
+        # 先占用域名名额再占用全局名额，排队等待同一域名的请求不会占用全局名额；
+        # 熔断器打开时在域名名额内等待冷却结束，不占用全局名额
+        async with self._host_semaphore(url):
+            await get_tracker().acquire_async(url, max_defer)
+            async with self._global_sem:
+                start = time.monotonic()
+                async with tracked_get(session, url, self.timeout, headers=headers) as response:
+                    ttfb = time.monotonic() - start
+                    result = await read_response_async(
+                        response, self.max_body_bytes, stop_on_key=self.stream)
+                return result._replace(ttfb=ttfb, elapsed=time.monotonic() - start)
+
+    async def _fetch_verdict(self, session, url):
+        async def fetch(headers):
+            # GitHub 文件在多个镜像之间竞速，有其他镜像可用时不等待熔断的镜像；验证结果仍记在规范地址下
+            candidates = mirror_candidates(url)
+            max_defer = None if len(candidates) == 1 else 0
+            result = await race_async(
+                url, candidates, lambda mirror_url: self._fetch(session, mirror_url, headers, max_defer))
+            counts = None
+            if needs_count(result):
+                counts = await parse_pool.run_async(count_entries, result.body.body, result.encoding)
+            self.measurements[url] = measure(result, counts)
+            return result
+
+        return await check_with_cache_async('test', url, fetch, lambda result: judge_result_async(result, url))
+
+    async def check_url(self, session, url):
+        """验证单个地址，返回 'valid'、'possible' 或 None"""
+        try:
+            verdict = await self._fetch_verdict(session, url)
+        except CircuitOpen as e:
+            logger.debug(f"跳过地址 ({e}): {url}")
+            return None
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            logger.error(f"测试 URL 时出错: {url} - {e!r}")
+            return None
+        if verdict == 'valid':
+            logger.debug(f"有效的 TVBox 地址: {url}")
+        elif verdict == 'possible':
+            logger.debug(f"可能的 TVBox 地址: {url}")
+        return verdict
+
+    async def _check(self, session, url):
+        # 单个地址的意外错误只让这个地址判为无效，不中断整批验证
+        try:
+            return await self.check_url(session, url)
+        except Exception as e:
+            logger.error(f"测试 URL 时出错: {url} - {e!r}")
+            return None
+
+    async def run(self, urls, token=None):
+        """并发验证所有地址，返回 {地址: 判定结果}；token 被取消时放弃未完成的地址，只返回已完成的结果"""
+        self._global_sem = asyncio.Semaphore(self.max_concurrency)
+        self._host_sems = {}
+        connector = aiohttp.TCPConnector(
+            limit=self.max_concurrency, limit_per_host=self.per_host)
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout,
+                                         trace_configs=[aiohttp_trace_config(), trace_config()]) as session:
+            urls = list(dict.fromkeys(urls))
+            tasks = {asyncio.ensure_future(self._check(session, url)): url for url in urls}
+            results = {}
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, timeout=CANCEL_POLL)
+                for task in done:
+                    results[tasks[task]] = task.result()
+                if token is not None and token.cancelled and pending:
+                    logger.warning(f"验证已取消（{token.reason}），放弃 {len(pending)} 个未完成的地址")
+                    await _cancel_tasks(pending)
+                    break
+        return {url: results[url] for url in urls if url in results}
+
+    async def run_stream(self, source, sink, done, token=None):
+        """流式验证：从线程安全的队列 source 中逐个取出地址，直到取到 done；
+        每个结果以 (地址, 判定结果) 放入队列 sink，最后放入 done。
+        同时验证的地址数达到上限时不再取新地址，上游的有界队列随之阻塞（背压）。
+        token 被取消时不再取新地址，并放弃正在验证的地址"""
+        token = token or CancelToken()
+        loop = asyncio.get_running_loop()
+        self._global_sem = asyncio.Semaphore(self.max_concurrency)
+        self._host_sems = {}
+        seen = set()
+        tasks = set()
+
+        async def check(session, url):
+            verdict = await self._check(session, url)
+            await loop.run_in_executor(None, sink.put, (url, verdict))
+
+        connector = aiohttp.TCPConnector(
+            limit=self.max_concurrency, limit_per_host=self.per_host)
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout,
+                                         trace_configs=[aiohttp_trace_config(), trace_config()]) as session:
+            while True:
+                # 请求由 _global_sem 限制并发；这里只限制同时验证的地址数（含排队等待域名名额的），
+                # 达到上限时等待其中一个完成（结果放入 sink 之后）再取新地址
+                if len(tasks) >= self.max_concurrency:
+                    await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                try:
+                    url = await loop.run_in_executor(None, token.get, source)
+                except Cancelled:
+                    logger.warning(f"验证已取消（{token.reason}），放弃 {len(tasks)} 个未完成的地址")
+                    await _cancel_tasks(tasks)
+                    break
+                if url is done:
+                    break
+                if url in seen:
+                    continue
+                seen.add(url)
+                task = asyncio.ensure_future(check(session, url))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks)
+        await loop.run_in_executor(None, sink.put, done)
+
+
+async def _cancel_tasks(tasks):
+    tasks = list(tasks)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def check_urls(urls, max_concurrency=MAX_CONCURRENCY, per_host=PER_HOST_LIMIT, timeout=VALIDATE_TIMEOUT,
+               stream=STREAM_VALIDATION, max_body_bytes=MAX_BODY_BYTES, token=None, measurements=None):
+    """同步入口：批量验证地址，返回 {地址: 'valid'、'possible' 或 None}（取消时只包含已完成的地址）；
+    measurements 为字典时填入各地址的 Measurement"""
+    validator = AsyncValidator(
+        max_concurrency, per_host, timeout, stream, max_body_bytes, measurements)
+    return asyncio.run(validator.run(urls, token))
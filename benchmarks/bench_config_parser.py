@@ -0,0 +1,109 @@
+# 配置解析的基准：在大小不同的样例配置上对比以前的做法（json.loads、text/* 内容的 DOTALL 正则）
+# 与 config_parser 的检测模式和完整解析模式，并列出各方式接受了哪些样例。
+# 样例包括规范的 JSON、带注释/结尾逗号/BOM 的配置、键在嵌套对象中的非配置、以及不含配置键的大段文本。
+# 运行：python benchmarks/bench_config_parser.py [sites 条目数]
+import json
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config_parser  # noqa: E402
+
+# 以前 is_valid_tvbox_url 对 text/* 内容使用的正则
+OLD_TEXT_PATTERN = r'("lives":\s*\[.*\]|"sites":\s*\[.*\]|"spider":\s*".*")'
+
+# 每个样例重复的次数
+REPEAT = 5
+
+
+def make_config(sites):
+    return {
+        'spider': 'https://example.com/jar/custom_spider.jar;md5;0123456789abcdef',
+        'wallpaper': 'https://example.com/wallpaper',
+        'sites': [{'key': f"csp_{n}", 'name': f"站点 {n} // 影视", 'type': 3, 'api': f"csp_Site{n}",
+                   'searchable': 1, 'quickSearch': 1, 'filterable': 1,
+                   'ext': f"https://example.com/ext/{n}.json?token=/*{n}*/"} for n in range(sites)],
+        'lives': [{'group': 'redirect', 'channels': [{'name': 'live', 'urls': ['proxy://do=live&type=txt']}]}],
+        'parses': [{'name': '解析', 'type': 0, 'url': 'https://example.com/parse?url='}],
+    }
+
+
+def with_comments(text):
+    """每个站点前加一行 // 注释，最后一个站点和数组后加结尾逗号"""
+    text = text.replace('{"key"', '// 站点\n{"key"')
+    return text.replace('}], "lives"', '},], "lives"', 1).rstrip('}') + ',\n}'
+
+
+def make_samples(sites):
+    config = make_config(sites)
+    plain = json.dumps(config, ensure_ascii=False)
+    # 以前的正则在没有配置键的大段文本上要扫描到结尾
+    not_config = json.dumps({'items': [{'name': f"item {n}", 'url': f"https://example.com/{n}"}
+                                       for n in range(sites * 5)]})
+    return {
+        '规范 JSON': (plain, True),
+        '带缩进': (json.dumps(config, ensure_ascii=False, indent=2), True),
+        '注释和结尾逗号': (with_comments(plain), True),
+        'BOM': ('\ufeff' + plain, True),
+        '键在嵌套对象中': (json.dumps({'data': config}, ensure_ascii=False), False),
+        '非配置 JSON': (not_config, False),
+    }
+
+
+def old_json(text):
+    try:
+        data = json.loads(text)
+    except ValueError:
+        return False
+    return isinstance(data, dict) and any(key in data for key in config_parser.TVBOX_KEYS)
+
+
+def old_regex(text):
+    return re.search(OLD_TEXT_PATTERN, text.lower(), re.DOTALL) is not None
+
+
+def detect(text):
+    return config_parser.find_top_level_key(text) is not None
+
+
+def lenient(text):
+    config = config_parser.parse_config(text)
+    return config is not None and any(key in config for key in config_parser.TVBOX_KEYS)
+
+
+METHODS = (
+    ('json.loads', old_json),
+    ('原 DOTALL 正则', old_regex),
+    ('检测模式', detect),
+    ('宽松完整解析', lenient),
+)
+
+
+def main():
+    sites = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    samples = make_samples(sites)
+    print(f"sites 条目数 {sites}，每个样例重复 {REPEAT} 次，单位 ms/次，括号内为是否判为配置")
+    print(f"{'样例':<16}{'大小 KB':>10}" + ''.join(f"{name:>22}" for name, _ in METHODS))
+    failed = False
+    for name, (text, expected) in samples.items():
+        row = f"{name:<16}{len(text.encode('utf-8')) / 1024:>10.0f}"
+        for method_name, method in METHODS:
+            start = time.perf_counter()
+            for _ in range(REPEAT):
+                accepted = method(text)
+            elapsed = (time.perf_counter() - start) / REPEAT
+            row += f"{elapsed * 1000:>15.2f} ({'是' if accepted else '否'})"
+            if method in (detect, lenient) and accepted != expected:
+                failed = True
+        print(row)
+    if failed:
+        print("config_parser 的判定与预期不符")
+        sys.exit(1)
+    print("config_parser 的判定符合预期")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+# 链接提取后端的基准：对比流式扫描（stream）和 BeautifulSoup（bs4）的吞吐量和内存峰值，并检查两者提取的链接一致
+# 默认使用 benchmarks/pages/ 下保存的页面；没有保存的页面时使用生成的模拟博客页面
+# 保存样例页面：python benchmarks/bench_link_extractor.py --save https://www.cnblogs.com/joe235/p/17202339.html ...
+# 运行：python benchmarks/bench_link_extractor.py [页面文件 ...]
+import glob
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import link_extractor  # noqa: E402
+
+PAGES_DIR = os.path.join(ROOT, 'benchmarks', 'pages')
+
+# 每个页面重复提取的次数
+ROUNDS = 5
+
+
+def save_pages(urls):
+    import requests
+    os.makedirs(PAGES_DIR, exist_ok=True)
+    for i, url in enumerate(urls):
+        response = requests.get(url, timeout=30)
+        path = os.path.join(PAGES_DIR, f"page_{i}.html")
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(response.text)
+        print(f"已保存 {url} -> {path}（{len(response.text)} 字符）")
+
+
+def synthetic_page(paragraphs=4000, seed=1):
+    """生成类似 cnblogs 文章的页面：大量段落、代码块、脚本和链接"""
+    rng = random.Random(seed)
+    parts = ['<!DOCTYPE html><html><head><title>TVBox 接口</title>',
+             '<style>a{color:red}</style><script>var s = "<a href=\'https://js.example.com/x\'>";</script>',
+             '</head><body><div id="content">']
+    for i in range(paragraphs):
+        kind = rng.random()
+        if kind < 0.3:
+            parts.append(f'<p>接口 {i}：<a href="https://raw.githubusercontent.com/u{i}/r/main/tv.json" '
+                         f'target="_blank">https://raw.githubusercontent.com/u{i}/r/main/tv.json</a></p>')
+        elif kind < 0.4:
+            parts.append(f"<p><a class='x' href='/p/{i}.html'>相对链接</a>"
+                         f'<a href=http://houlijiang.cn/{i}/>无引号</a></p>')
+        elif kind < 0.5:
+            parts.append(f'<!-- <a href="https://comment.example.com/{i}">注释</a> -->'
+                         f'<pre><code>{{"sites": [{{"key": "{i}", "api": "csp_{i}"}}]}}</code></pre>')
+        else:
+            parts.append(f'<p>{"这是一段很长的正文内容，" * rng.randint(5, 30)}</p>')
+    parts.append('</div></body></html>')
+    return ''.join(parts)
+
+
+def measure(fn, text):
+    tracemalloc.start()
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        links = fn(text)
+    elapsed = (time.perf_counter() - start) / ROUNDS
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return links, elapsed, peak
+
+
+def main():
+    args = sys.argv[1:]
+    if args[:1] == ['--save']:
+        save_pages(args[1:])
+        return
+    files = args or sorted(glob.glob(os.path.join(PAGES_DIR, '*.html')))
+    if files:
+        pages = [(os.path.basename(p), open(p, encoding='utf-8', errors='replace').read()) for p in files]
+    else:
+        print("没有保存的样例页面，使用生成的模拟页面")
+        pages = [('synthetic', synthetic_page())]
+
+    failed = False
+    for name, text in pages:
+        size_mb = len(text.encode('utf-8')) / 1024 / 1024
+        print(f"\n{name}: {size_mb:.2f} MB")
+        results = {}
+        for backend in link_extractor.BACKENDS:
+            links, elapsed, peak = measure(lambda t: link_extractor.extract_links(t, backend), text)
+            results[backend] = links
+            print(f"  {backend:<7} {elapsed * 1000:8.1f} ms  {size_mb / elapsed:7.1f} MB/秒  "
+                  f"内存峰值 {peak / 1024 / 1024:7.1f} MB  链接 {len(links)} 个")
+        if results['stream'] != results['bs4']:
+            only_stream = set(results['stream']) - set(results['bs4'])
+            only_bs4 = set(results['bs4']) - set(results['stream'])
+            print(f"  提取结果不一致：仅 stream {list(only_stream)[:3]}，仅 bs4 {list(only_bs4)[:3]}")
+            failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
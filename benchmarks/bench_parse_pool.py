@@ -0,0 +1,89 @@
+# 解析进程池的基准：多个线程同时判断一批大小不一的配置和网页（与验证时的情形相同），
+# 对比在线程中解析（共用一个 GIL）和交给 parse_pool 的解析进程。同时检查两种方式的结果完全一致。
+# 核数越多差距越大；单核机器上进程池只会增加开销。
+# 运行：python benchmarks/bench_parse_pool.py [内容数量] [解析进程数]
+import json
+import os
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import parse_pool  # noqa: E402
+from async_validator import count_entries, judge_bytes  # noqa: E402
+from link_extractor import extract_body_links  # noqa: E402
+
+# 与验证时相同的线程数
+THREADS = 10
+
+
+def make_config(rng, sites):
+    return json.dumps({
+        'spider': f"https://example.com/jar/{rng.randrange(1000)}.jar",
+        'sites': [{'key': f"site{n}", 'name': f"站点{n}", 'type': 3, 'api': f"csp_Site{n}",
+                   'ext': f"https://example.com/ext/{n}.json"} for n in range(sites)],
+        'lives': [{'name': 'live', 'url': 'https://example.com/live.txt'}],
+    }, ensure_ascii=False).encode('utf-8')
+
+
+def make_page(rng, links):
+    items = ''.join(f'<li><a href="https://example.com/{rng.randrange(10 ** 6)}/tv.json">配置 {n}</a></li>'
+                    for n in range(links))
+    return f"<html><body><script>var a = '<a href=\"x\">';</script><ul>{items}</ul></body></html>".encode('utf-8')
+
+
+def make_items(count):
+    rng = random.Random(42)
+    items = []
+    for _ in range(count):
+        size = rng.choice((20, 200, 2000, 10000))
+        kind = rng.choice(('judge', 'count', 'links'))
+        body = make_page(rng, size) if kind == 'links' else make_config(rng, size)
+        items.append((kind, body))
+    return items
+
+
+def parse(kind, body):
+    if kind == 'judge':
+        return parse_pool.run(judge_bytes, body, 'utf-8')
+    if kind == 'count':
+        return parse_pool.run(count_entries, body, 'utf-8')
+    return parse_pool.run(extract_body_links, body, 'utf-8', 'stream')
+
+
+def bench(name, items):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=THREADS) as executor:
+        results = list(executor.map(lambda item: parse(*item), items))
+    elapsed = time.perf_counter() - start
+    print(f"{name:<30} {elapsed * 1000:9.1f} ms  {len(items) / elapsed:10,.1f} 个/秒")
+    return results
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else (os.cpu_count() or 1)
+    items = make_items(count)
+    total = sum(len(body) for _, body in items)
+    print(f"{count} 个内容，共 {total / 1024 / 1024:.1f} MB，{THREADS} 个线程，CPU 核数 {os.cpu_count()}")
+
+    parse_pool.PARSE_WORKERS = 0
+    inline = bench('在线程中解析', items)
+    parse_pool.PARSE_WORKERS = workers
+    parse_pool.start()
+    try:
+        pooled = bench(f"解析进程池（{workers} 个进程）", items)
+    finally:
+        parse_pool.shutdown()
+
+    if inline != pooled:
+        mismatches = [n for n, (a, b) in enumerate(zip(inline, pooled)) if a != b]
+        print(f"结果不一致：第 {mismatches[:5]} 个内容")
+        sys.exit(1)
+    print("结果一致")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,254 @@
+# 整个流程的离线基准：启动本地替身服务器（benchmarks/standin_server.py），不访问外网，
+# 分别测量 test_main 的批量验证（validate）、make_request、process_url 和 search_tvbox_sources（search）
+# 的吞吐量（地址/秒）、单个地址的 p50/p99 延迟和内存峰值（RSS）。
+# 每个阶段在单独的子进程中运行，内存峰值互不影响；限速器换成不限速的，测量的是代码本身的开销。
+# 保存基线：python benchmarks/bench_pipeline.py --save-baseline benchmarks/baseline.json
+# 与基线比较（变慢或内存增加超过容差时以非零状态退出）：python benchmarks/bench_pipeline.py --baseline benchmarks/baseline.json
+import argparse
+import asyncio
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+from standin_server import mixed_paths, start_server  # noqa: E402
+
+STAGES = ('validate', 'make_request', 'process_url', 'search')
+
+# 每个阶段默认使用的地址数
+DEFAULT_URLS = 120
+
+# 与基线比较时允许的相对差距
+DEFAULT_TOLERANCE = 0.25
+
+# 子进程输出结果时使用的前缀
+RESULT_PREFIX = 'BENCH_RESULT '
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 上单位是 KB，macOS 上是字节
+    return peak / 1024 / 1024 if sys.platform == 'darwin' else peak / 1024
+
+
+def _prepare(base_url):
+    """子进程的运行环境：临时工作目录、关闭缓存、不限速、搜索引擎指向本地服务器"""
+    os.chdir(tempfile.mkdtemp(prefix='tvbox-bench-'))
+    logging.disable(logging.CRITICAL)
+    import http_cache
+    import serp_cache
+    import search_tvbox_sources
+    from rate_limiter import RequestScheduler
+    http_cache.CACHE_ENABLED = False
+    serp_cache.SERP_CACHE_ENABLED = False
+    search_tvbox_sources.request_scheduler = RequestScheduler(
+        global_rate=10000, domain_rate=10000, max_workers=search_tvbox_sources.FETCH_WORKERS)
+    search_tvbox_sources.search_scheduler = RequestScheduler(
+        global_rate=10000, domain_rate=10000, max_workers=search_tvbox_sources.SEARCH_WORKERS)
+    for engine in search_tvbox_sources.SEARCH_ENGINE_URLS:
+        search_tvbox_sources.SEARCH_ENGINE_URLS[engine] = f"{base_url}/serp/{engine}?q={{query}}&num={{num}}"
+
+
+def run_validate(base_url, count):
+    from async_validator import AsyncValidator
+    latencies = []
+
+    class TimedValidator(AsyncValidator):
+        async def check_url(self, session, url):
+            start = time.perf_counter()
+            try:
+                return await super().check_url(session, url)
+            finally:
+                latencies.append(time.perf_counter() - start)
+
+    urls = [base_url + path for path in mixed_paths(count)]
+    start = time.perf_counter()
+    verdicts = asyncio.run(TimedValidator().run(urls))
+    elapsed = time.perf_counter() - start
+    return len(urls), elapsed, latencies, sum(1 for verdict in verdicts.values() if verdict)
+
+
+def run_make_request(base_url, count):
+    import search_tvbox_sources
+    from http_pool import get_session
+    latencies = []
+    ok = 0
+
+    def fetch(url):
+        start = time.perf_counter()
+        try:
+            response = search_tvbox_sources.make_request(get_session(), url, 10, stream=True)
+            response.close()
+            return response.status_code == 200
+        except Exception:
+            return False
+        finally:
+            latencies.append(time.perf_counter() - start)
+
+    urls = [base_url + path for path in mixed_paths(count)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=search_tvbox_sources.FETCH_WORKERS) as executor:
+        ok = sum(executor.map(fetch, urls))
+    elapsed = time.perf_counter() - start
+    return len(urls), elapsed, latencies, ok
+
+
+def run_process_url(base_url, count):
+    import search_tvbox_sources
+    latencies = []
+    # 一半是配置地址，一半是包含配置链接的网页
+    urls = [base_url + path for path in mixed_paths(count // 2)]
+    urls += [f"{base_url}/tvbox/page/{n}.html" for n in range(count - len(urls))]
+    start = time.perf_counter()
+    for url in urls:
+        item_start = time.perf_counter()
+        search_tvbox_sources.process_url(url)
+        latencies.append(time.perf_counter() - item_start)
+    elapsed = time.perf_counter() - start
+    return len(urls), elapsed, latencies, len(search_tvbox_sources.urls)
+
+
+def run_search(base_url, count):
+    import search_tvbox_sources
+    latencies = []
+    run_search_query = search_tvbox_sources.run_search
+
+    def timed_run_search(*args):
+        start = time.perf_counter()
+        try:
+            return run_search_query(*args)
+        finally:
+            latencies.append(time.perf_counter() - start)
+
+    search_tvbox_sources.run_search = timed_run_search
+    start = time.perf_counter()
+    found = search_tvbox_sources.search_tvbox_sources(timeout=120, url_file=None)
+    elapsed = time.perf_counter() - start
+    return found, elapsed, latencies, found
+
+
+RUNNERS = {
+    'validate': run_validate,
+    'make_request': run_make_request,
+    'process_url': run_process_url,
+    'search': run_search,
+}
+
+
+def run_child(stage, base_url, count):
+    _prepare(base_url)
+    items, elapsed, latencies, ok = RUNNERS[stage](base_url, count)
+    result = {
+        'items': items,
+        'ok': ok,
+        'seconds': round(elapsed, 3),
+        'urls_per_sec': round(items / elapsed, 2) if elapsed else 0.0,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 1),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 1),
+        'peak_rss_mb': round(peak_rss_mb(), 1) if resource is not None else None,
+    }
+    sys.stdout.write(RESULT_PREFIX + json.dumps(result) + '\n')
+    sys.stdout.flush()
+    # 解析进程是 fork 出来的，继承了标准输出；不先关闭的话直接退出后它们仍然持有管道，父进程一直等不到结束
+    import parse_pool
+    parse_pool.shutdown()
+    # 不等待后台线程（如尚未结束的重试），直接退出
+    os._exit(0)
+
+
+def run_stage(stage, base_url, count):
+    process = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--child', stage, '--base-url', base_url, '--urls', str(count)],
+        capture_output=True, text=True, encoding='utf-8', errors='replace')
+    for line in process.stdout.splitlines():
+        if line.startswith(RESULT_PREFIX):
+            return json.loads(line[len(RESULT_PREFIX):])
+    raise RuntimeError(f"阶段 {stage} 运行失败：\n{process.stderr[-2000:]}")
+
+
+def compare(results, baseline, tolerance):
+    """返回超出容差的项目列表"""
+    regressions = []
+    for stage, base in baseline.items():
+        current = results.get(stage)
+        if current is None:
+            continue
+        if current['items'] != base['items']:
+            print(f"{stage}: 地址数与基线不同（{current['items']} / {base['items']}），跳过比较")
+            continue
+        if current['urls_per_sec'] < base['urls_per_sec'] * (1 - tolerance):
+            regressions.append(f"{stage}: 吞吐量 {current['urls_per_sec']} < 基线 {base['urls_per_sec']}")
+        if current['p99_ms'] > base['p99_ms'] * (1 + tolerance):
+            regressions.append(f"{stage}: p99 {current['p99_ms']} ms > 基线 {base['p99_ms']} ms")
+        if current['peak_rss_mb'] and base.get('peak_rss_mb') and \
+                current['peak_rss_mb'] > base['peak_rss_mb'] * (1 + tolerance):
+            regressions.append(f"{stage}: 内存峰值 {current['peak_rss_mb']} MB > 基线 {base['peak_rss_mb']} MB")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='TVBox 搜索和验证流程的离线基准')
+    parser.add_argument('--stages', default=','.join(STAGES), help='要运行的阶段，逗号分隔')
+    parser.add_argument('--urls', type=int, default=DEFAULT_URLS, help='每个阶段使用的地址数')
+    parser.add_argument('--baseline', help='与该基线文件比较，超出容差时以非零状态退出')
+    parser.add_argument('--save-baseline', help='把本次结果保存为基线文件')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE, help='允许的相对差距')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    parser.add_argument('--base-url', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args.base_url, args.urls)
+        return 0
+
+    server, base_url = start_server()
+    results = {}
+    print(f"{'阶段':<14}{'地址数':>8}{'地址/秒':>10}{'p50 ms':>10}{'p99 ms':>10}{'内存峰值 MB':>14}")
+    for stage in args.stages.split(','):
+        result = run_stage(stage, base_url, args.urls)
+        results[stage] = result
+        print(f"{stage:<14}{result['items']:>8}{result['urls_per_sec']:>10}{result['p50_ms']:>10}"
+              f"{result['p99_ms']:>10}{str(result['peak_rss_mb']):>14}")
+    server.shutdown()
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"基线已保存到 {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("性能回退：")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print("与基线相比没有超出容差的回退")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
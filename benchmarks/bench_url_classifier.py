@@ -0,0 +1,77 @@
+# 地址分类器的微基准：对比原来 process_url + is_valid_tvbox_url 中各执行一遍的两个正则
+# 与 url_classifier 的预编译正则（单个地址逐一分类和批量分类）。同时检查两种方式的判定结果完全一致。
+# 运行：python benchmarks/bench_url_classifier.py [地址数量]
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import url_classifier  # noqa: E402
+
+EXCLUDE = r'(github\.com/search|github\.com/[^/]+/[^/]+$|search\?q=|\.com/s\?|\.com/web\?)'
+INCLUDE = (r'(tvbox|tv\.json|live\.json|epg\.json|source\.json|raw\.githubusercontent\.com.*\.json'
+           r'|gitee\.com.*\.json|pastebin\.com|gist\.github\.com)')
+
+TEMPLATES = [
+    'https://raw.githubusercontent.com/user{n}/repo/main/tv.json',
+    'https://github.com/user{n}/tvbox',
+    'https://github.com/search?q=tvbox{n}',
+    'https://gitee.com/user{n}/box/raw/master/config.json',
+    'https://www.cnblogs.com/user{n}/p/{n}.html',
+    'https://www.baidu.com/s?wd=tvbox{n}',
+    'https://example{n}.com/static/css/site.css',
+    'https://pastebin.com/raw/{n}',
+    'https://cdn.example.com/assets/{n}/image.png?v=1',
+    'http://houlijiang.cn/2024/08/18/tvbox-{n}/',
+    'https://gist.github.com/user{n}/abc{n}',
+    'HTTPS://GitHub.com/Search?q=TVBox{n}',
+    'https://raw.githubusercontent.com/user{n}/repo/main/TV.JSON',
+    'https://gitee.com/user{n}/box/blob/master/readme.md',
+]
+
+
+def old_keep(url):
+    if re.search(EXCLUDE, url, re.I):
+        return False
+    return bool(re.search(INCLUDE, url, re.I))
+
+
+def make_urls(count, distinct):
+    rng = random.Random(42)
+    return [rng.choice(TEMPLATES).format(n=rng.randrange(distinct)) for _ in range(count)]
+
+
+def bench(name, fn, urls):
+    start = time.perf_counter()
+    result = fn(urls)
+    elapsed = time.perf_counter() - start
+    print(f"{name:<40} {elapsed * 1000:8.1f} ms  {len(urls) / elapsed:12,.0f} 个/秒")
+    return result
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    urls = make_urls(count, distinct=count // 5)
+    print(f"{count} 个地址（约 {len(set(urls))} 个不同地址）")
+
+    # 原来的做法：process_url 检查一遍，is_valid_tvbox_url 再检查一遍
+    old = bench('原正则（process_url + is_valid 各一次）',
+                lambda us: [old_keep(u) and old_keep(u) for u in us], urls)
+    bench('原正则（只检查一次）', lambda us: [old_keep(u) for u in us], urls)
+    bench('url_classifier.classify_url（逐一）',
+          lambda us: [url_classifier.classify_url(u)[0] for u in us], urls)
+    new = bench('url_classifier.classify_urls',
+                lambda us: [c.keep for c in url_classifier.classify_urls(us)], urls)
+
+    if old != new:
+        mismatches = [u for u, a, b in zip(urls, old, new) if a != b]
+        print(f"判定结果不一致：{mismatches[:5]}")
+        sys.exit(1)
+    print("判定结果一致")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+# 工作队列的基准：启动本地替身服务器（benchmarks/standin_server.py），把一批地址加入工作队列，
+# 分别用 1、2、4……个工作进程领取并验证，测量吞吐量随工作进程数的变化。
+# 每个工作进程的并发数固定（相当于每台运行机器的上限），地址都是有固定延迟的慢地址，
+# 吞吐量受限于单个进程的并发和延迟，工作进程数翻倍时应接近翻倍。
+# 同时检查每个地址都已完成、没有地址被领取两次；--kill 时在运行中途强制结束一个工作进程，
+# 检查它持有的地址在租约到期后由其他工作进程接手。
+# 运行：python benchmarks/bench_work_queue.py [--urls 1000] [--workers 1,2,4] [--kill]
+import argparse
+import logging
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+from standin_server import start_server  # noqa: E402
+
+import work_queue  # noqa: E402
+
+# 每个工作进程同时验证的地址数
+WORKER_CONCURRENCY = 10
+
+# 替身服务器对每个地址的延迟（毫秒）
+URL_DELAY_MS = 200
+
+# 每次领取的地址数
+BATCH_SIZE = 50
+
+
+def run_child(queue_path, lease_seconds):
+    """工作进程：关闭缓存和解析进程，领取并验证地址直到队列完成"""
+    os.chdir(tempfile.mkdtemp(prefix='tvbox-bench-'))
+    logging.disable(logging.CRITICAL)
+    import http_cache
+    import parse_pool
+    import queue_worker
+    http_cache.CACHE_ENABLED = False
+    parse_pool.PARSE_WORKERS = 0
+    queue_worker.QUEUE_POLL_INTERVAL = 0.5
+    queue = work_queue.open_queue('sqlite', queue_path)
+    queue_worker.run_worker(queue, BATCH_SIZE, lease_seconds,
+                            max_concurrency=WORKER_CONCURRENCY, per_host=WORKER_CONCURRENCY)
+    queue.close()
+
+
+def start_worker(queue_path, lease_seconds):
+    return subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), '--child', queue_path, '--lease', str(lease_seconds)],
+        start_new_session=True)
+
+
+def run_round(base_url, urls, workers, lease_seconds, kill):
+    queue_path = os.path.join(tempfile.mkdtemp(prefix='tvbox-queue-'), 'queue.db')
+    queue = work_queue.open_queue('sqlite', queue_path)
+    queue.add(f"{base_url}/tvbox/slow/{URL_DELAY_MS}/{n}.json" for n in range(urls))
+    start = time.perf_counter()
+    processes = [start_worker(queue_path, lease_seconds) for _ in range(workers)]
+    if kill:
+        # 等第一个工作进程领到地址后强制结束它（连同它的子进程）
+        while not queue.stats()['leased']:
+            time.sleep(0.05)
+        time.sleep(1)
+        os.killpg(processes[0].pid, signal.SIGKILL)
+    for process in processes:
+        process.wait()
+    elapsed = time.perf_counter() - start
+    stats = queue.stats()
+    with queue._lock:
+        retried = queue._conn.execute('SELECT COUNT(*) FROM items WHERE attempts > 1').fetchone()[0]
+    queue.close()
+    return elapsed, stats, retried
+
+
+def main():
+    parser = argparse.ArgumentParser(description='工作队列随工作进程数的吞吐量')
+    parser.add_argument('--urls', type=int, default=1000, help='地址数')
+    parser.add_argument('--workers', default='1,2,4', help='工作进程数，逗号分隔')
+    parser.add_argument('--lease', type=float, default=5, help='租约时长（秒）')
+    parser.add_argument('--kill', action='store_true', help='每轮强制结束一个工作进程，检查地址被其他进程接手')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args.lease)
+        return 0
+
+    server, base_url = start_server()
+    print(f"{args.urls} 个地址，每个延迟 {URL_DELAY_MS} ms，每个工作进程并发 {WORKER_CONCURRENCY}")
+    print(f"{'工作进程':>8}{'耗时 s':>10}{'地址/秒':>10}{'加速比':>8}{'已完成':>8}{'重新领取':>10}")
+    failed = False
+    baseline = None
+    for workers in (int(n) for n in args.workers.split(',')):
+        kill = args.kill and workers > 1
+        elapsed, stats, retried = run_round(base_url, args.urls, workers, args.lease, kill)
+        rate = args.urls / elapsed
+        baseline = baseline or rate
+        print(f"{workers:>8}{elapsed:>10.2f}{rate:>10.1f}{rate / baseline:>8.2f}{stats['done']:>8}{retried:>10}")
+        if stats['done'] != args.urls:
+            print(f"  未全部完成：{stats}")
+            failed = True
+        elif retried and not kill:
+            print(f"  没有工作进程中断，却有 {retried} 个地址被重新领取")
+            failed = True
+    server.shutdown()
+    if failed:
+        return 1
+    print("所有地址都已完成")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,170 @@
+# 基准测试用的本地 HTTP 服务器，代替真实的配置托管站点和搜索引擎
+# 路径中都带有 tvbox，这样地址分类器会保留它们：
+#   /tvbox/valid/<n>.json            有效的 TVBox 配置
+#   /tvbox/invalid/<n>.json          没有 TVBox 键的 JSON
+#   /tvbox/slow/<毫秒>/<n>.json       延迟返回的有效配置
+#   /tvbox/huge/<n>.json             不带 Content-Length、持续输出的超大内容
+#   /tvbox/reset/<n>.json            直接重置连接
+#   /tvbox/redirect/<次数>/<n>.json   多次重定向后到达有效配置
+#   /tvbox/flaky/<n>.json            第一次返回 503，之后返回有效配置（触发重试）
+#   /tvbox/error/<n>.json            总是返回 503
+#   /tvbox/page/<n>.html             包含若干配置链接的网页
+#   /serp/google|bing|baidu?q=...    与各搜索引擎结构相同的结果页
+# 运行：python benchmarks/standin_server.py [端口]
+import http.server
+import json
+import socket
+import struct
+import sys
+import threading
+import time
+import urllib.parse
+import zlib
+
+# 超大内容的总长度（字节）
+HUGE_BODY_BYTES = 64 * 1024 * 1024
+
+# 每个结果页中的结果数
+SERP_RESULTS = 10
+
+# 每个网页中的配置链接数
+PAGE_LINKS = 5
+
+VALID_CONFIG = json.dumps({
+    'spider': './spider.jar',
+    'sites': [{'key': f'site{i}', 'name': f'站点{i}', 'type': 3, 'api': f'csp_Site{i}'} for i in range(50)],
+    'lives': [{'name': '直播', 'type': 0, 'url': './live.txt'}],
+}, ensure_ascii=False).encode('utf-8')
+
+INVALID_CONFIG = json.dumps({'name': 'not a tvbox config', 'items': list(range(200))}).encode('utf-8')
+
+
+def mixed_paths(count):
+    """按固定比例生成各类地址的路径，用于验证类的基准"""
+    kinds = ['valid/{n}.json'] * 4 + ['invalid/{n}.json'] * 2 + [
+        'slow/200/{n}.json', 'redirect/3/{n}.json', 'flaky/{n}.json', 'error/{n}.json',
+        'reset/{n}.json', 'huge/{n}.json']
+    return [f"/tvbox/{kinds[n % len(kinds)].format(n=n)}" for n in range(count)]
+
+
+class StandinHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    flaky_seen = set()
+    flaky_lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, body, content_type='application/json'):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        parts = urllib.parse.urlsplit(self.path)
+        segments = [s for s in parts.path.split('/') if s]
+        if segments[:1] == ['serp']:
+            return self._serp(segments[1] if len(segments) > 1 else 'google',
+                              urllib.parse.parse_qs(parts.query).get('q', [''])[0])
+        if segments[:1] != ['tvbox'] or len(segments) < 3:
+            return self._send(404, b'not found', 'text/plain')
+        kind = segments[1]
+        if kind == 'valid':
+            return self._send(200, VALID_CONFIG)
+        if kind == 'invalid':
+            return self._send(200, INVALID_CONFIG)
+        if kind == 'slow':
+            time.sleep(int(segments[2]) / 1000)
+            return self._send(200, VALID_CONFIG)
+        if kind == 'huge':
+            return self._huge()
+        if kind == 'reset':
+            # SO_LINGER 为 0 时 close 会发送 RST
+            self.connection.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack('ii', 1, 0))
+            self.connection.close()
+            self.close_connection = True
+            return
+        if kind == 'redirect':
+            remaining = int(segments[2])
+            target = (f"/tvbox/redirect/{remaining - 1}/{segments[3]}" if remaining > 1
+                      else f"/tvbox/valid/{segments[3]}")
+            self.send_response(302)
+            self.send_header('Location', target)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        if kind == 'flaky':
+            with self.flaky_lock:
+                first = self.path not in self.flaky_seen
+                self.flaky_seen.add(self.path)
+            return self._send(503, b'busy', 'text/plain') if first else self._send(200, VALID_CONFIG)
+        if kind == 'error':
+            return self._send(503, b'busy', 'text/plain')
+        if kind == 'page':
+            return self._page(segments[2])
+        return self._send(404, b'not found', 'text/plain')
+
+    def _huge(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        self.close_connection = True
+        chunk = b' ' * 65536
+        try:
+            self.wfile.write(b'{"padding": "')
+            for _ in range(HUGE_BODY_BYTES // len(chunk)):
+                self.wfile.write(chunk)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def _base(self):
+        return f"http://{self.headers.get('Host')}"
+
+    def _page(self, name):
+        n = name.split('.')[0]
+        links = ''.join(
+            f'<p><a href="{self._base()}/tvbox/valid/page{n}_{i}.json">配置 {i}</a></p>' for i in range(PAGE_LINKS))
+        body = f'<html><body><div class="post">{links}</div></body></html>'.encode('utf-8')
+        self._send(200, body, 'text/html; charset=utf-8')
+
+    def _serp(self, engine, query):
+        key = zlib.crc32(query.encode('utf-8')) % 1000
+        urls = [f"{self._base()}/tvbox/valid/{engine}_{key}_{i}.json" for i in range(SERP_RESULTS)]
+        if engine == 'bing':
+            items = ''.join(f'<li class="b_algo"><h2><a href="{u}">结果</a></h2></li>' for u in urls)
+        elif engine == 'baidu':
+            items = ''.join(f'<div class="result"><h3 class="t"><a href="{u}">结果</a></h3></div>' for u in urls)
+        else:
+            items = ''.join(f'<div class="g"><div class="yuRUbf"><a href="{u}"><h3>结果</h3></a></div></div>'
+                            for u in urls)
+        body = f'<html><body>{items}</body></html>'.encode('utf-8')
+        self._send(200, body, 'text/html; charset=utf-8')
+
+
+class StandinServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # 客户端放弃连接（超大内容、重置测试）是预期内的，不输出堆栈
+        if not isinstance(sys.exc_info()[1], (ConnectionError, socket.timeout)):
+            super().handle_error(request, client_address)
+
+
+def start_server(port=0):
+    """在后台线程中启动服务器，返回 (服务器, 基础地址)"""
+    server = StandinServer(('127.0.0.1', port), StandinHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+if __name__ == '__main__':
+    server, base_url = start_server(int(sys.argv[1]) if len(sys.argv) > 1 else 8800)
+    print(f"本地替身服务器已启动: {base_url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,161 @@
+# 流式读取响应内容，用于 is_valid_tvbox_url 和异步验证（AsyncValidator、check_urls）
+# 按块读取，超过字节上限就停止；根据 Content-Length 和 Content-Type 提前拒绝；
+# 一旦看到 "sites"、"lives" 或 "spider" 键就停止读取，节省带宽和验证时间
+import re
+import time
+from collections import namedtuple
+
+from cancellation import current_token
+from metrics import add_time, inc
+
+# 是否启用流式验证（关闭后仍会先下载完整内容再判断）
+STREAM_VALIDATION = True
+
+# 单个响应最多读取的字节数
+MAX_BODY_BYTES = 2 * 1024 * 1024
+
+# 每次读取的块大小
+CHUNK_SIZE = 16 * 1024
+
+# 明显不是 TVBox 配置的内容类型，直接拒绝
+REJECTED_CONTENT_TYPES = (
+    'image/', 'audio/', 'video/', 'font/',
+    'application/pdf', 'application/zip', 'application/x-rar',
+    'application/vnd.android.package-archive', 'application/java-archive',
+)
+
+# TVBox 配置的顶层键，例如 "sites": [ 或 "spider": "
+TVBOX_KEY_PATTERN = re.compile(
+    rb'"(?:sites|lives)"\s*:\s*\[|"spider"\s*:\s*"', re.I)
+
+# 跨块匹配时保留上一块末尾的字节数，需大于关键字模式可能的长度
+_TAIL_BYTES = 64
+
+BodyResult = namedtuple('BodyResult', ['body', 'truncated', 'key_found'])
+
+# 一次请求的结果：body 为 BodyResult，状态码不是 200 或被响应头拒绝时为 None，reason 为拒绝原因；
+# ttfb、elapsed 为收到响应头和读取完毕时的耗时（秒），由调用方填写，未测量时为 None
+FetchResult = namedtuple('FetchResult', ['status', 'headers', 'body', 'encoding', 'reason', 'ttfb', 'elapsed'],
+                         defaults=(None, None))
+
+
+def precheck_headers(headers, max_bytes=MAX_BODY_BYTES):
+    """根据响应头提前判断，返回拒绝原因，可以继续读取时返回 None"""
+    content_type = headers.get('Content-Type', '').lower()
+    if content_type.startswith(REJECTED_CONTENT_TYPES):
+        return f"内容类型不符: {content_type}"
+    content_length = headers.get('Content-Length')
+    if content_length and content_length.isdigit() and int(content_length) > max_bytes:
+        return f"内容过大: {content_length} 字节"
+    return None
+
+
+class _BodyAccumulator:
+    def __init__(self, max_bytes, stop_on_key):
+        self.max_bytes = max_bytes
+        self.stop_on_key = stop_on_key
+        self.chunks = []
+        self.size = 0
+        self.tail = b''
+        self.truncated = False
+        self.key_found = False
+
+    def feed(self, chunk):
+        """追加一块内容，返回 True 表示应停止读取"""
+        if self.size + len(chunk) > self.max_bytes:
+            chunk = chunk[:self.max_bytes - self.size]
+            self.truncated = True
+        self.chunks.append(chunk)
+        self.size += len(chunk)
+        if not self.key_found:
+            window = self.tail + chunk
+            if TVBOX_KEY_PATTERN.search(window):
+                self.key_found = True
+            self.tail = window[-_TAIL_BYTES:]
+        return self.truncated or (self.stop_on_key and self.key_found)
+
+    def result(self):
+        return BodyResult(b''.join(self.chunks), self.truncated, self.key_found)
+
+
+def read_body(response, max_bytes=MAX_BODY_BYTES, stop_on_key=True):
+    """从 requests 响应中按块读取内容（请求时应使用 stream=True）"""
+    acc = _BodyAccumulator(max_bytes, stop_on_key)
+    # 当前线程的取消令牌（例如镜像竞速已有其他镜像获胜）被取消时停止读取
+    token = current_token()
+    start = time.monotonic()
+    try:
+        for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+            if token is not None:
+                token.check()
+            if chunk and acc.feed(chunk):
+                break
+    finally:
+        response.close()
+        _record_download(start, acc)
+    return acc.result()
+
+
+async def read_body_async(response, max_bytes=MAX_BODY_BYTES, stop_on_key=True):
+    """从 aiohttp 响应中按块读取内容"""
+    acc = _BodyAccumulator(max_bytes, stop_on_key)
+    start = time.monotonic()
+    try:
+        async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+            if chunk and acc.feed(chunk):
+                break
+    finally:
+        _record_download(start, acc)
+    return acc.result()
+
+
+def _record_download(start, acc):
+    add_time('download', time.monotonic() - start)
+    inc('body_bytes_total', acc.size)
+    if acc.truncated:
+        inc('rejected_total', reason='too_large')
+    elif acc.stop_on_key and acc.key_found:
+        inc('early_stop_total')
+
+
+def _reject_reason(headers, max_bytes, accept_types):
+    reason = precheck_headers(headers, max_bytes)
+    if reason is None and accept_types:
+        content_type = headers.get('Content-Type', '').lower()
+        if not any(t in content_type for t in accept_types):
+            reason = f"内容类型不符: {content_type}"
+    if reason:
+        inc('rejected_total', reason='headers')
+    return reason
+
+
+def read_response(response, max_bytes=MAX_BODY_BYTES, stop_on_key=True, accept_types=None):
+    """读取 requests 响应；状态码不是 200 或响应头不符时不读取内容"""
+    if response.status_code != 200:
+        response.close()
+        return FetchResult(response.status_code, response.headers, None, response.encoding, None)
+    reason = _reject_reason(response.headers, max_bytes, accept_types)
+    if reason:
+        response.close()
+        return FetchResult(200, response.headers, None, response.encoding, reason)
+    body = read_body(response, max_bytes, stop_on_key)
+    return FetchResult(200, response.headers, body, response.encoding, None)
+
+
+async def read_response_async(response, max_bytes=MAX_BODY_BYTES, stop_on_key=True, accept_types=None):
+    """read_response 的 aiohttp 版本"""
+    if response.status != 200:
+        return FetchResult(response.status, response.headers, None, response.charset, None)
+    reason = _reject_reason(response.headers, max_bytes, accept_types)
+    if reason:
+        return FetchResult(200, response.headers, None, response.charset, reason)
+    body = await read_body_async(response, max_bytes, stop_on_key)
+    return FetchResult(200, response.headers, body, response.charset, None)
+
+
+def decode_body(body, encoding=None):
+    """body 可以是 bytes 或 memoryview（解析进程中的共享内存）"""
+    try:
+        return str(body, encoding or 'utf-8', 'replace')
+    except LookupError:
+        return str(body, 'utf-8', 'replace')
@@ -0,0 +1,162 @@
+# 取消和截止时间：代替按值导入、在 main.py 中修改了也不起作用的 stop_search 标志
+# CancelToken 是可以跨模块、跨线程共享的对象：Ctrl+C 取消根令牌，搜索使用带截止时间（SEARCH_TIMEOUT）的子令牌。
+# 所有请求的超时、重试前的等待、排队等待和线程间的队列操作都通过令牌进行，
+# 令牌被取消或超过截止时间后，它们最多在 CANCEL_POLL 秒或一次请求的超时时间内停止
+import concurrent.futures
+import contextlib
+import queue
+import threading
+import time
+
+# 等待时检查是否已取消的间隔（秒）
+CANCEL_POLL = 0.2
+
+
+class Cancelled(Exception):
+    """操作已被取消或超过截止时间"""
+
+
+class CancelToken:
+    def __init__(self, timeout=None, parent=None):
+        self.parent = parent
+        self.deadline = time.monotonic() + timeout if timeout is not None else None
+        if parent is not None and parent.deadline is not None:
+            self.deadline = parent.deadline if self.deadline is None else min(self.deadline, parent.deadline)
+        self.reason = None
+        self.cancelled_at = None
+        self._event = threading.Event()
+        self._children = []
+        self._lock = threading.Lock()
+        if parent is not None:
+            with parent._lock:
+                parent._children.append(self)
+            if parent.cancelled:
+                self.cancel(parent.reason)
+
+    def child(self, timeout=None):
+        """创建子令牌：父令牌取消时子令牌随之取消，截止时间不晚于父令牌"""
+        return CancelToken(timeout, self)
+
+    def cancel(self, reason='已取消'):
+        with self._lock:
+            if self._event.is_set():
+                return
+            self.reason = reason
+            self.cancelled_at = time.monotonic()
+            self._event.set()
+            children = list(self._children)
+            self._children = []
+        for child in children:
+            child.cancel(reason)
+        if self.parent is not None:
+            # 已取消的子令牌不再需要父令牌通知，短暂使用的子令牌（如每次镜像竞速一个）不会一直留在父令牌中
+            with self.parent._lock:
+                if self in self.parent._children:
+                    self.parent._children.remove(self)
+
+    @property
+    def cancelled(self):
+        if self._event.is_set():
+            return True
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            self.cancel('超过截止时间')
+            return True
+        return False
+
+    def remaining(self):
+        """距离截止时间还有多少秒，没有截止时间时返回 None"""
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    def check(self):
+        if self.cancelled:
+            raise Cancelled(self.reason)
+
+    def timeout(self, seconds):
+        """把请求的超时时间限制在截止时间之内"""
+        self.check()
+        remaining = self.remaining()
+        return seconds if remaining is None else min(seconds, max(remaining, CANCEL_POLL))
+
+    def sleep(self, seconds):
+        """可被取消的 sleep"""
+        remaining = self.remaining()
+        if remaining is not None:
+            seconds = min(seconds, remaining)
+        self._event.wait(seconds)
+        self.check()
+
+    def result(self, future):
+        """等待 Future 的结果，取消时放弃等待并取消尚未开始的 Future"""
+        while True:
+            if self.cancelled:
+                future.cancel()
+                raise Cancelled(self.reason)
+            try:
+                return future.result(timeout=CANCEL_POLL)
+            except concurrent.futures.TimeoutError:
+                continue
+
+    def as_completed(self, futures):
+        """按完成顺序产出 Future，取消时抛出 Cancelled"""
+        pending = set(futures)
+        while pending:
+            self.check()
+            done, pending = concurrent.futures.wait(
+                pending, timeout=CANCEL_POLL, return_when=concurrent.futures.FIRST_COMPLETED)
+            yield from done
+
+    def put(self, q, item):
+        """放入有界队列，队列已满时等待，取消时抛出 Cancelled"""
+        while True:
+            self.check()
+            try:
+                q.put(item, timeout=CANCEL_POLL)
+                return
+            except queue.Full:
+                continue
+
+    def get(self, q):
+        """从队列中取出，队列为空时等待，取消时抛出 Cancelled"""
+        while True:
+            self.check()
+            try:
+                return q.get(timeout=CANCEL_POLL)
+            except queue.Empty:
+                continue
+
+
+_local = threading.local()
+
+
+def current_token():
+    """当前线程正在使用的令牌（没有时返回 None），供无法直接传入令牌的底层代码检查，例如 urllib3 的重试"""
+    return getattr(_local, 'token', None)
+
+
+@contextlib.contextmanager
+def use_token(token):
+    previous = current_token()
+    _local.token = token
+    try:
+        yield token
+    finally:
+        _local.token = previous
+
+
+# 根令牌：Ctrl+C 时取消
+_root = CancelToken()
+_root_lock = threading.Lock()
+
+
+def root_token():
+    return _root
+
+
+def reset_root_token():
+    """开始新的一次运行时换一个新的根令牌"""
+    global _root
+    with _root_lock:
+        _root = CancelToken()
+        return _root
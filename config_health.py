@@ -0,0 +1,182 @@
+# TVBox 配置的深度健康检查（可选）：只含有 sites/lives/spider 键的配置不一定能用，
+# 它引用的 spider jar、站点 api 和 ext 地址经常已经 404。这里解析配置，同时探测这些资源，给每个配置打健康分。
+# 很多配置引用同一批 jar 和接口，每个资源在一次运行中只请求一次（正在进行的探测也会共享），
+# 每个配置最多探测 MAX_PROBES_PER_CONFIG 个资源，总请求数有上限
+import asyncio
+import logging
+import urllib.parse
+from collections import namedtuple
+
+import aiohttp
+
+from body_reader import MAX_BODY_BYTES, read_response_async
+from config_parser import parse_config_body
+from cancellation import CANCEL_POLL
+from metrics import aiohttp_trace_config
+from host_health import CircuitOpen, get_tracker, tracked_get, trace_config
+import parse_pool
+
+logger = logging.getLogger(__name__)
+
+# 是否在验证之后进行深度健康检查
+DEEP_VALIDATION = False
+
+# 每个配置最多探测的资源数
+MAX_PROBES_PER_CONFIG = 20
+
+# 同时进行的探测请求数
+PROBE_CONCURRENCY = 50
+
+# 单个请求的超时时间（秒）
+PROBE_TIMEOUT = 8
+
+# 探测资源时最多读取的字节数（只需确认能正常返回内容）
+PROBE_READ_BYTES = 1024
+
+# 各类资源在健康分中的权重：spider jar 失效时整个配置基本不可用
+RESOURCE_WEIGHTS = {'spider': 3, 'api': 1, 'ext': 1}
+
+# sites、lives 为配置中的条目数（深度检查读取完整内容，流式验证提前停止时得不到），无法解析时为 None
+ConfigHealth = namedtuple('ConfigHealth', ['url', 'score', 'probed', 'alive', 'dead', 'sites', 'lives'])
+
+
+def _resource_url(value, base_url):
+    """把配置中的地址转成绝对地址，不是地址时返回 None"""
+    if not isinstance(value, str):
+        return None
+    # spider 的格式可能是 "地址;md5;校验值"
+    value = value.split(';', 1)[0].strip()
+    if value.startswith(('http://', 'https://')):
+        return value
+    if value.startswith(('./', '../')):
+        return urllib.parse.urljoin(base_url, value)
+    return None
+
+
+def config_resources(config, base_url):
+    """返回配置引用的资源 [(类型, 地址), ...]，spider jar 在前，已去重"""
+    resources = {}
+    resources.setdefault(_resource_url(config.get('spider'), base_url), 'spider')
+    sites = config.get('sites')
+    for site in sites if isinstance(sites, list) else ():
+        if not isinstance(site, dict):
+            continue
+        resources.setdefault(_resource_url(site.get('jar'), base_url), 'spider')
+        resources.setdefault(_resource_url(site.get('api'), base_url), 'api')
+        resources.setdefault(_resource_url(site.get('ext'), base_url), 'ext')
+    resources.pop(None, None)
+    ordered = sorted(resources.items(), key=lambda item: item[1] != 'spider')
+    return [(kind, url) for url, kind in ordered]
+
+
+def health_score(resources, alive):
+    """按权重计算 0~100 的健康分；没有可探测的资源时为 100"""
+    total = sum(RESOURCE_WEIGHTS[kind] for kind, _ in resources)
+    if not total:
+        return 100
+    ok = sum(RESOURCE_WEIGHTS[kind] for kind, url in resources if alive[url])
+    return round(100 * ok / total)
+
+
+class HealthProber:
+    def __init__(self, concurrency=PROBE_CONCURRENCY, timeout=PROBE_TIMEOUT,
+                 max_probes=MAX_PROBES_PER_CONFIG, max_body_bytes=MAX_BODY_BYTES):
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.max_probes = max_probes
+        self.max_body_bytes = max_body_bytes
+        self._sem = None
+        # 地址 -> 探测任务，同一资源在一次运行中只请求一次
+        self._probes = {}
+        self.stats = {'configs': 0, 'unparsed': 0, 'probes': 0, 'shared': 0, 'dead': 0}
+
+    async def _probe(self, session, url):
+        try:
+            # 熔断的域名上的资源按失效处理
+            await get_tracker().acquire_async(url)
+            async with self._sem:
+                async with tracked_get(session, url, self.timeout) as response:
+                    if response.status >= 400:
+                        return False
+                    await response.content.read(PROBE_READ_BYTES)
+                    return True
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError, CircuitOpen) as e:
+            logger.debug(f"探测资源出错: {url} - {e!r}")
+            return False
+
+    def probe(self, session, url):
+        """探测一个资源是否可用，同一地址共享同一个任务"""
+        task = self._probes.get(url)
+        if task is None:
+            self.stats['probes'] += 1
+            task = asyncio.ensure_future(self._probe(session, url))
+            self._probes[url] = task
+        else:
+            self.stats['shared'] += 1
+        return task
+
+    async def _fetch_config(self, session, url):
+        await get_tracker().acquire_async(url)
+        async with self._sem:
+            async with tracked_get(session, url, self.timeout) as response:
+                result = await read_response_async(response, self.max_body_bytes, stop_on_key=False)
+        if result.body is None or result.body.truncated:
+            return None
+        # 在解析进程中解析，不阻塞事件循环
+        return await parse_pool.run_async(parse_config_body, result.body.body, result.encoding)
+
+    async def check_config(self, session, url):
+        """返回配置的 ConfigHealth，无法获取或解析时分数为 None"""
+        self.stats['configs'] += 1
+        try:
+            config = await self._fetch_config(session, url)
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError, CircuitOpen) as e:
+            logger.debug(f"获取配置出错: {url} - {e!r}")
+            config = None
+        if config is None:
+            self.stats['unparsed'] += 1
+            return ConfigHealth(url, None, 0, 0, [], None, None)
+        resources = config_resources(config, url)[:self.max_probes]
+        results = await asyncio.gather(*(self.probe(session, resource) for _, resource in resources))
+        alive = dict(zip((resource for _, resource in resources), results))
+        dead = [resource for resource, ok in alive.items() if not ok]
+        self.stats['dead'] += len(dead)
+        sites, lives = (len(config[key]) if isinstance(config.get(key), list) else 0 for key in ('sites', 'lives'))
+        return ConfigHealth(url, health_score(resources, alive), len(resources), len(resources) - len(dead), dead,
+                            sites, lives)
+
+    async def run(self, urls, token=None):
+        """检查所有配置，返回 {地址: ConfigHealth}；token 被取消时只返回已完成的结果"""
+        self._sem = asyncio.Semaphore(self.concurrency)
+        self._probes = {}
+        connector = aiohttp.TCPConnector(limit=self.concurrency)
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        results = {}
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout,
+                                         trace_configs=[aiohttp_trace_config(), trace_config()]) as session:
+            tasks = {asyncio.ensure_future(self.check_config(session, url)): url for url in dict.fromkeys(urls)}
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, timeout=CANCEL_POLL)
+                for task in done:
+                    results[tasks[task]] = task.result()
+                if token is not None and token.cancelled and pending:
+                    logger.warning(f"健康检查已取消（{token.reason}），放弃 {len(pending)} 个未完成的配置")
+                    break
+            for task in list(pending) + list(self._probes.values()):
+                task.cancel()
+            await asyncio.gather(*pending, *self._probes.values(), return_exceptions=True)
+        return results
+
+    def log_stats(self):
+        logger.warning(
+            f"深度健康检查：检查 {self.stats['configs']} 个配置（{self.stats['unparsed']} 个无法解析），"
+            f"探测 {self.stats['probes']} 个资源，共享探测结果 {self.stats['shared']} 次，失效资源 {self.stats['dead']} 个。")
+
+
+def check_health(urls, token=None, **options):
+    """同步入口：深度检查配置，返回 {地址: ConfigHealth}"""
+    prober = HealthProber(**options)
+    results = asyncio.run(prober.run(urls, token))
+    prober.log_stats()
+    return results
@@ -0,0 +1,107 @@
+# TVBox 配置的宽松解析：很多真实的配置带有 // 或 /* */ 注释、多余的结尾逗号、BOM 或字符串中的原始换行，
+# json.loads 直接拒绝，以前只能退回到关键字扫描；而以前 is_valid_tvbox_url 对 text/* 内容使用的
+# "sites":\s*\[.*\] 这类 DOTALL 正则在大文件上会大量回溯。这里提供两种模式：
+# 检测模式（find_top_level_key）按词法扫描，只跟踪嵌套深度，遇到顶层的 sites/lives/spider 键立即返回，
+# 不构建任何对象，字符串和注释由正则整段跳过，嵌套的值一次跳到下一个括号，不会回溯；
+# 完整解析模式（loads_lenient）先直接 json.loads，失败时用一次正则替换去掉注释和结尾逗号
+# （字符串原样保留，地址中的 // 不受影响）再解析。判断内容时先用检测模式，只有需要解析出的对象
+# （如统计条目数）或需要知道内容是不是 JSON 时才完整解析一次，同一内容不会解析两次。
+# 对比见 benchmarks/bench_config_parser.py
+import json
+import re
+
+from body_reader import decode_body
+
+# TVBox 配置中的顶层关键字
+TVBOX_KEYS = ('lives', 'sites', 'spider')
+
+# 字符串（展开写法，逐段匹配非转义字符）；内容不完整时到结尾为止，避免在每个引号处重新扫描到结尾
+_STRING = r'"[^"\\]*(?:\\.[^"\\]*)*(?:"|\\?\Z)'
+
+# 注释，未结束的块注释到结尾为止。写成每段内容只有一种匹配方式的形式（行注释必须到行尾，
+# 块注释在第一个 */ 处结束），匹配失败回溯时不会尝试其他拆分方式
+_COMMENT = r'//[^\n]*(?![^\n])|/\*[^*]*(?:\*+[^/*][^*]*)*(?:\*+/|\**\Z)'
+
+# 检测模式在顶层对象中的词法单元：字符串、注释、括号；
+# 其余内容（数字、逗号、冒号、空白等）由正则引擎直接跳过，不产生单元
+_TOKENS = re.compile(_STRING + '|' + _COMMENT + r'|[{}\[\]]', re.S)
+
+# 检测模式在嵌套的值中只关心括号：一次跳过到下一个括号之前的所有内容（字符串和注释中的括号不算）
+_NESTED = re.compile(r'(?:[^"{}\[\]/]+|' + _STRING + '|' + _COMMENT + r'|/)*', re.S)
+
+# 键之后的冒号，中间可以有空白和注释
+_COLON = re.compile(r'(?:\s|' + _COMMENT + r')*:', re.S)
+
+# 完整解析时原样保留的内容：字符串以及不属于注释和结尾逗号的其余内容，尽量长地连成一段，减少替换次数
+_KEEP = (r'(?:[^"/,]+|' + _STRING + r'|/(?![/*])|,(?!(?:\s|' + _COMMENT + r')*[}\]]))+')
+
+# 完整解析的清理：第 1 组原样保留，其余为注释和结尾逗号（删除）
+_CLEANUP = re.compile(r'(' + _KEEP + r')|' + _COMMENT + r'|,(?=(?:\s|' + _COMMENT + r')*[}\]])', re.S)
+
+_BOM = '\ufeff'
+
+
+def find_top_level_key(text, keys=TVBOX_KEYS):
+    """检测模式：返回顶层对象中第一个出现的 keys 中的键，没有时返回 None。
+    只看结构，不检查其余内容是否合法，内容不完整（流式读取提前停止）时也能判断"""
+    quoted = {f'"{key}"' for key in keys}
+    pos = 1 if text.startswith(_BOM) else 0
+    depth = 0
+    top_is_object = False
+    while True:
+        if depth >= 2:
+            # 嵌套的值中不会有顶层键，直接跳到下一个括号
+            pos = _NESTED.match(text, pos).end()
+            if pos >= len(text):
+                return None
+            depth += 1 if text[pos] in '{[' else -1
+            pos += 1
+            continue
+        match = _TOKENS.search(text, pos)
+        if match is None:
+            return None
+        pos = match.end()
+        token = match.group()
+        first = token[0]
+        if first == '"':
+            if depth == 1 and top_is_object and token in quoted and _COLON.match(text, pos):
+                return token[1:-1]
+        elif first in '{[':
+            if depth == 0:
+                top_is_object = first == '{'
+            depth += 1
+        elif first in '}]':
+            depth -= 1
+            if depth <= 0:
+                # 顶层的对象或数组已经结束
+                return None
+
+
+def loads_lenient(text):
+    """完整解析模式：接受注释、结尾逗号、BOM 和字符串中的控制字符；无法解析时抛出 ValueError"""
+    if text.startswith(_BOM):
+        text = text[1:]
+    try:
+        return json.loads(text, strict=False)
+    except ValueError:
+        pass
+    except RecursionError:
+        raise ValueError('嵌套层数过多')
+    try:
+        return json.loads(_CLEANUP.sub(r'\1', text), strict=False)
+    except RecursionError:
+        raise ValueError('嵌套层数过多')
+
+
+def parse_config(text):
+    """宽松解析配置，返回 dict；不是 JSON 对象时返回 None"""
+    try:
+        config = loads_lenient(text)
+    except ValueError:
+        return None
+    return config if isinstance(config, dict) else None
+
+
+def parse_config_body(body, encoding=None):
+    """解码原始内容后宽松解析配置，返回 dict 或 None（在解析进程中执行，见 parse_pool）"""
+    return parse_config(decode_body(body, encoding))
@@ -0,0 +1,143 @@
+# 深度爬虫的待抓取队列（frontier），代替 deep_crawl 对每个链接的无限递归
+# 按“像不像 TVBox 配置”给链接打分，用优先队列先抓分数高的；已访问过的地址不再抓取；
+# 每个域名和全局都有页面预算，并记录深度，不超过最大深度；多个工作线程同时从队列中取链接抓取，
+# 这样深度爬取的请求数和耗时都有上限
+import heapq
+import itertools
+import logging
+import threading
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+from url_classifier import classify_url
+
+logger = logging.getLogger(__name__)
+
+# 一次深度爬取最多抓取的页面数
+MAX_CRAWL_PAGES = 200
+
+# 每个域名最多抓取的页面数
+MAX_PAGES_PER_HOST = 20
+
+# 同时抓取的工作线程数
+CRAWL_WORKERS = 8
+
+# 配置文件常见的后缀
+_CONFIG_SUFFIXES = ('.json', '.txt', '.m3u', '.m3u8')
+
+# 配置文件常见的托管域名
+_CONFIG_HOSTS = ('raw.githubusercontent.com', 'gitee.com', 'gist.githubusercontent.com', 'pastebin.com')
+
+# 地址中出现时说明更可能与 TVBox 相关的词
+_KEYWORDS = ('tvbox', 'box', 'tv', 'live', 'iptv', 'json', 'config', 'source', '接口', '源')
+
+
+def score_link(url, depth=0):
+    """估计链接是 TVBox 配置（或指向配置的页面）的可能性，分数越高越先抓取"""
+    lowered = url.lower()
+    parts = urllib.parse.urlsplit(lowered)
+    score = 0
+    keep, _ = classify_url(url)
+    if keep:
+        score += 10
+    if parts.path.endswith(_CONFIG_SUFFIXES):
+        score += 5
+    if parts.hostname in _CONFIG_HOSTS:
+        score += 3
+    score += sum(1 for keyword in _KEYWORDS if keyword in lowered)
+    # 越深的链接越晚抓
+    return score - 2 * depth
+
+
+class CrawlFrontier:
+    def __init__(self, max_depth=2, max_pages=None, max_pages_per_host=None):
+        self.max_depth = max_depth
+        self.max_pages = MAX_CRAWL_PAGES if max_pages is None else max_pages
+        self.max_pages_per_host = MAX_PAGES_PER_HOST if max_pages_per_host is None else max_pages_per_host
+        self._heap = []
+        self._counter = itertools.count()
+        self._visited = set()
+        self._host_pages = {}
+        self._in_flight = 0
+        self._fetched = 0
+        self._stopped = False
+        self._cond = threading.Condition()
+        self.stats = {'queued': 0, 'duplicate': 0, 'too_deep': 0, 'host_budget': 0, 'global_budget': 0}
+
+    def push(self, url, depth):
+        """加入待抓取队列，已访问过或超过深度时返回 False"""
+        with self._cond:
+            if depth > self.max_depth:
+                self.stats['too_deep'] += 1
+                return False
+            if url in self._visited:
+                self.stats['duplicate'] += 1
+                return False
+            self._visited.add(url)
+            heapq.heappush(self._heap, (-score_link(url, depth), next(self._counter), url, depth))
+            self.stats['queued'] += 1
+            self._cond.notify()
+        return True
+
+    def pop(self):
+        """取出分数最高且仍在预算内的链接，返回 (地址, 深度)；队列已空且没有正在抓取的页面时返回 None"""
+        with self._cond:
+            while True:
+                if self._stopped:
+                    return None
+                while self._heap:
+                    if self._fetched >= self.max_pages:
+                        self.stats['global_budget'] += len(self._heap)
+                        self._heap.clear()
+                        break
+                    _, _, url, depth = heapq.heappop(self._heap)
+                    host = urllib.parse.urlsplit(url).netloc
+                    if self._host_pages.get(host, 0) >= self.max_pages_per_host:
+                        self.stats['host_budget'] += 1
+                        continue
+                    self._host_pages[host] = self._host_pages.get(host, 0) + 1
+                    self._fetched += 1
+                    self._in_flight += 1
+                    return url, depth
+                if self._in_flight == 0:
+                    # 没有正在抓取的页面，也就不会再有新链接加入
+                    self._cond.notify_all()
+                    return None
+                self._cond.wait()
+
+    def task_done(self):
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+
+    @property
+    def fetched(self):
+        return self._fetched
+
+    def _worker(self, visit):
+        while True:
+            item = self.pop()
+            if item is None:
+                return
+            url, depth = item
+            try:
+                for link in visit(url, depth) or ():
+                    self.push(link, depth + 1)
+            except Exception as e:
+                logger.error(f"深度爬虫出错: {url} - {e}")
+            finally:
+                self.task_done()
+
+    def run(self, visit, workers=None):
+        """用多个工作线程抓取，visit(地址, 深度) 返回页面中的链接列表"""
+        workers = workers or CRAWL_WORKERS
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for _ in range(workers):
+                executor.submit(self._worker, visit)
+        logger.info(f"深度爬取完成：抓取 {self._fetched} 个页面，统计 {self.stats}")
+        return self._fetched
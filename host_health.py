@@ -0,0 +1,282 @@
+# 按域名的健康状态：熔断器和自适应超时，代替固定的 10/15/30 秒超时
+# 某个镜像域名挂掉时，以前它的每个地址都要耗尽 5 次重试和完整的超时时间。
+# 熔断器：同一域名连续失败（超时、连接错误、429、5xx）FAILURE_THRESHOLD 次后打开，
+# CIRCUIT_OPEN_SECONDS 秒内该域名的请求直接放弃（异步验证会等到冷却结束，最多等 MAX_DEFER_SECONDS 秒）；
+# 冷却结束后只放行一个试探请求，成功则关闭，失败则重新打开并把冷却时间加倍。
+# 自适应超时：按域名记录最近的建立连接耗时和收到响应头的耗时，
+# 连接超时和读取超时取各自 p99 的 TIMEOUT_MULTIPLIER 倍（限制在 MIN_TIMEOUT~MAX_TIMEOUT 之间）；
+# 样本不足时使用调用方给出的默认值。超时的请求按超时时间记为一个样本，慢域名的超时会逐渐放宽
+import asyncio
+import contextlib
+import logging
+import threading
+import time
+import urllib.parse
+from collections import deque, namedtuple
+
+import aiohttp
+import requests
+
+from metrics import inc
+
+logger = logging.getLogger(__name__)
+
+# 是否启用熔断器
+CIRCUIT_BREAKER = True
+
+# 连续失败多少次后打开熔断器
+FAILURE_THRESHOLD = 5
+
+# 熔断器打开后的冷却时间（秒），试探失败时加倍
+CIRCUIT_OPEN_SECONDS = 30
+
+# 冷却时间的上限（秒）
+MAX_OPEN_SECONDS = 300
+
+# 熔断器打开时，异步验证最多等待多久（秒），超过则放弃该地址
+MAX_DEFER_SECONDS = 60
+
+# 是否根据观测到的延迟计算超时时间
+ADAPTIVE_TIMEOUTS = True
+
+# 超时时间为延迟 p99 的倍数
+TIMEOUT_MULTIPLIER = 3
+
+# 自适应超时的下限和上限（秒）
+MIN_TIMEOUT = 2
+MAX_TIMEOUT = 30
+
+# 每个域名保留的延迟样本数
+LATENCY_WINDOW = 50
+
+# 样本数少于该值时使用默认超时
+MIN_SAMPLES = 5
+
+# 计入失败的状态码（域名本身正常时 4xx 不算失败）
+FAILURE_STATUSES = (429,)
+
+CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+# connect、read 用于 requests 的 (连接超时, 读取超时)；total 用于 aiohttp 的整个请求
+Timeouts = namedtuple('Timeouts', ['connect', 'read', 'total'])
+
+
+class CircuitOpen(requests.exceptions.RequestException):
+    """该域名的熔断器已打开，请求未发出"""
+
+
+def _host(url):
+    return (urllib.parse.urlsplit(url).hostname or '').lower()
+
+
+def _p99(samples):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(0.99 * len(ordered)))]
+
+
+def _clamp(value, low, high):
+    return max(low, min(high, value))
+
+
+class HostHealth:
+    def __init__(self):
+        self.state = CLOSED
+        self.failures = 0
+        self.open_seconds = CIRCUIT_OPEN_SECONDS
+        self.opened_at = 0.0
+        self.probing = False
+        self.probe_started = 0.0
+        self.connect = deque(maxlen=LATENCY_WINDOW)
+        self.ttfb = deque(maxlen=LATENCY_WINDOW)
+        self.stats = {'success': 0, 'failure': 0, 'opened': 0, 'skipped': 0}
+
+
+class HostHealthTracker:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._hosts = {}
+
+    def _get(self, host):
+        health = self._hosts.get(host)
+        if health is None:
+            health = self._hosts[host] = HostHealth()
+        return health
+
+    def retry_in(self, url):
+        """0 表示现在可以发出请求（冷却结束时占用试探名额）；否则返回需要等待的秒数"""
+        if not CIRCUIT_BREAKER:
+            return 0.0
+        with self._lock:
+            health = self._get(_host(url))
+            if health.state == CLOSED:
+                return 0.0
+            if health.state == OPEN:
+                wait = health.opened_at + health.open_seconds - time.monotonic()
+                if wait > 0:
+                    return wait
+                health.state = HALF_OPEN
+                health.probing = False
+            # 试探请求被取消时不会报告结果，超过最长超时时间后允许新的试探
+            if not health.probing or time.monotonic() - health.probe_started > MAX_TIMEOUT:
+                health.probing = True
+                health.probe_started = time.monotonic()
+                inc('circuit_total', event='half_open')
+                return 0.0
+            # 试探请求还没有结果
+            return min(1.0, health.open_seconds)
+
+    def skip(self, url):
+        with self._lock:
+            self._get(_host(url)).stats['skipped'] += 1
+        inc('circuit_total', event='skipped')
+
+    def acquire(self, url, sleep=None, max_defer=0):
+        """同步版本：熔断器打开时，sleep 不为 None 则最多等待 max_defer 秒，仍不能发出请求时抛出 CircuitOpen"""
+        deadline = time.monotonic() + max_defer
+        while True:
+            wait = self.retry_in(url)
+            if not wait:
+                return
+            if sleep is None or time.monotonic() + wait > deadline:
+                self.skip(url)
+                raise CircuitOpen(f"熔断器已打开: {_host(url)}")
+            sleep(wait)
+
+    async def acquire_async(self, url, max_defer=None):
+        """异步版本：熔断器打开时等待冷却结束（最多 max_defer 秒），超过则抛出 CircuitOpen"""
+        max_defer = MAX_DEFER_SECONDS if max_defer is None else max_defer
+        deadline = time.monotonic() + max_defer
+        while True:
+            wait = self.retry_in(url)
+            if not wait:
+                return
+            if time.monotonic() + wait > deadline:
+                self.skip(url)
+                raise CircuitOpen(f"熔断器已打开: {_host(url)}")
+            await asyncio.sleep(wait)
+
+    def record_success(self, url, ttfb):
+        with self._lock:
+            health = self._get(_host(url))
+            health.ttfb.append(ttfb)
+            health.stats['success'] += 1
+            health.failures = 0
+            health.probing = False
+            if health.state != CLOSED:
+                health.state = CLOSED
+                health.open_seconds = CIRCUIT_OPEN_SECONDS
+                logger.info(f"熔断器关闭: {_host(url)}")
+                inc('circuit_total', event='closed')
+
+    def record_failure(self, url, timed_out_after=None):
+        """记录一次失败；timed_out_after 为超时请求的超时时间，作为延迟样本"""
+        host = _host(url)
+        with self._lock:
+            health = self._get(host)
+            if timed_out_after is not None:
+                health.ttfb.append(timed_out_after)
+            health.stats['failure'] += 1
+            health.failures += 1
+            health.probing = False
+            if health.state == HALF_OPEN:
+                health.open_seconds = min(health.open_seconds * 2, MAX_OPEN_SECONDS)
+            elif health.state == OPEN or health.failures < FAILURE_THRESHOLD:
+                return
+            health.state = OPEN
+            health.opened_at = time.monotonic()
+            health.stats['opened'] += 1
+            failures, open_seconds = health.failures, health.open_seconds
+        logger.warning(f"{host} 连续失败 {failures} 次，熔断 {open_seconds} 秒")
+        inc('circuit_total', event='opened')
+
+    def record_status(self, url, status, ttfb):
+        if status in FAILURE_STATUSES or status >= 500:
+            self.record_failure(url)
+        else:
+            self.record_success(url, ttfb)
+
+    def observe_connect(self, host, seconds):
+        with self._lock:
+            self._get(host.lower()).connect.append(seconds)
+
+    def timeouts(self, url, default):
+        """按该域名的延迟分位数计算超时时间，样本不足时使用 default"""
+        if not ADAPTIVE_TIMEOUTS:
+            return Timeouts(default, default, default)
+        with self._lock:
+            health = self._get(_host(url))
+            connect_samples = list(health.connect)
+            ttfb_samples = list(health.ttfb)
+        connect = default
+        if len(connect_samples) >= MIN_SAMPLES:
+            connect = _clamp(_p99(connect_samples) * TIMEOUT_MULTIPLIER, MIN_TIMEOUT, default)
+        read = default
+        if len(ttfb_samples) >= MIN_SAMPLES:
+            read = _clamp(_p99(ttfb_samples) * TIMEOUT_MULTIPLIER, MIN_TIMEOUT, MAX_TIMEOUT)
+        total = min(MAX_TIMEOUT, max(default, connect + read)) if read > default else default
+        return Timeouts(connect, read, total)
+
+    def state(self, url):
+        with self._lock:
+            return self._get(_host(url)).state
+
+    def log_stats(self):
+        with self._lock:
+            opened = {host: dict(health.stats) for host, health in self._hosts.items() if health.stats['opened']}
+        if not opened:
+            return
+        skipped = sum(stats['skipped'] for stats in opened.values())
+        logger.warning(f"熔断器：{len(opened)} 个域名曾被熔断，跳过 {skipped} 个请求。")
+        for host, stats in sorted(opened.items(), key=lambda item: -item[1]['skipped']):
+            logger.info(f"熔断 {host}: {stats}")
+
+
+_tracker = HostHealthTracker()
+
+
+def get_tracker():
+    return _tracker
+
+
+@contextlib.asynccontextmanager
+async def tracked_get(session, url, default_timeout, **kwargs):
+    """aiohttp 的 session.get：使用自适应超时并记录结果。
+    调用方应先 await get_tracker().acquire_async(url)（在占用全局并发名额之前）；
+    排队等待并发名额期间熔断器被打开时，这里直接抛出 CircuitOpen"""
+    tracker = get_tracker()
+    if CIRCUIT_BREAKER and tracker.state(url) == OPEN:
+        tracker.skip(url)
+        raise CircuitOpen(f"熔断器已打开: {_host(url)}")
+    timeouts = tracker.timeouts(url, default_timeout)
+    start = time.monotonic()
+    try:
+        async with session.get(url, timeout=aiohttp.ClientTimeout(
+                total=timeouts.total, sock_connect=timeouts.connect, sock_read=timeouts.read), **kwargs) as response:
+            ttfb = time.monotonic() - start
+            yield response
+        # 内容读取完毕后才记录：读取中途超时或断开时只记为失败
+        tracker.record_status(url, response.status, ttfb)
+    except asyncio.TimeoutError:
+        tracker.record_failure(url, timed_out_after=timeouts.read)
+        raise
+    except aiohttp.ClientConnectionError:
+        tracker.record_failure(url)
+        raise
+
+
+def trace_config():
+    """aiohttp 的 TraceConfig：按域名记录建立连接的耗时，用于计算连接超时"""
+    async def on_request_start(session, ctx, params):
+        ctx.host = params.url.host or ''
+
+    async def on_connection_start(session, ctx, params):
+        ctx.connect_start = time.monotonic()
+
+    async def on_connection_end(session, ctx, params):
+        get_tracker().observe_connect(ctx.host, time.monotonic() - ctx.connect_start)
+
+    trace = aiohttp.TraceConfig()
+    trace.on_request_start.append(on_request_start)
+    trace.on_connection_create_start.append(on_connection_start)
+    trace.on_connection_create_end.append(on_connection_end)
+    return trace
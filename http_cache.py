@@ -0,0 +1,214 @@
+# 验证结果的磁盘缓存，按规范化后的 URL 保存上次的状态码、ETag/Last-Modified、内容哈希和判定结果
+# 在有效期（CACHE_TTL）内直接使用缓存的判定；过期后发送条件请求（If-None-Match / If-Modified-Since），
+# 服务器返回 304 时直接沿用缓存的判定，不再解析内容。只有确定的结果（200、404）使用完整的有效期，
+# 其余状态码（5xx、403、429 等暂时性的错误）只缓存 CACHE_NEGATIVE_TTL 秒，很快会重新验证。
+# 回放模式（REPLAY_MODE）下完全离线：有缓存的判定时不论是否过期都直接使用，没有时记为回放未命中，也不发请求
+import hashlib
+import inspect
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import urllib.parse
+from collections import namedtuple
+
+from metrics import inc
+
+logger = logging.getLogger(__name__)
+
+# 是否启用验证缓存
+CACHE_ENABLED = True
+
+# 缓存文件
+CACHE_FILE = 'tvbox-cache.db'
+
+# 缓存有效期（秒），有效期内不发请求；默认 1 天，每 5 天一次的定时任务总会做一次条件请求
+CACHE_TTL = 24 * 3600
+
+# 不确定的结果（状态码不是 200 或 404）的缓存有效期（秒）
+CACHE_NEGATIVE_TTL = 10 * 60
+
+# 使用完整有效期的状态码
+DEFINITIVE_STATUSES = (200, 404)
+
+# 回放模式：只使用缓存的判定（不论是否过期），从不发请求（见 serp_cache.REPLAY_MODE）
+REPLAY_MODE = False
+
+CacheEntry = namedtuple('CacheEntry', ['status', 'etag', 'last_modified', 'body_hash', 'verdict', 'checked_at'])
+
+# 表示缓存中没有可用判定（判定本身可能就是 None 或 False）
+MISS = object()
+
+
+def normalize_url(url):
+    """统一协议和域名大小写，去掉片段，作为缓存键"""
+    parts = urllib.parse.urlsplit(url.strip())
+    path = parts.path or '/'
+    return urllib.parse.urlunsplit((parts.scheme.lower(), parts.netloc.lower(), path, parts.query, ''))
+
+
+def body_hash(body):
+    return hashlib.sha1(body).hexdigest()
+
+
+class ValidationCache:
+    def __init__(self, path=CACHE_FILE, ttl=CACHE_TTL, negative_ttl=CACHE_NEGATIVE_TTL):
+        self.path = path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS validation ('
+            ' kind TEXT NOT NULL, url TEXT NOT NULL, status INTEGER, etag TEXT, last_modified TEXT,'
+            ' body_hash TEXT, verdict TEXT, checked_at REAL, PRIMARY KEY (kind, url))')
+        self.stats = {'fresh': 0, 'not_modified': 0, 'same_body': 0, 'miss': 0, 'replayed': 0, 'replay_miss': 0}
+
+    def lookup(self, kind, url):
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT status, etag, last_modified, body_hash, verdict, checked_at'
+                ' FROM validation WHERE kind = ? AND url = ?', (kind, normalize_url(url))).fetchone()
+        if row is None:
+            return None
+        status, etag, last_modified, stored_hash, verdict, checked_at = row
+        return CacheEntry(status, etag, last_modified, stored_hash, json.loads(verdict), checked_at)
+
+    def is_fresh(self, entry):
+        if entry is None:
+            return False
+        ttl = self.ttl if entry.status in DEFINITIVE_STATUSES else self.negative_ttl
+        if time.time() - entry.checked_at < ttl:
+            self._count('fresh')
+            return True
+        return False
+
+    def replay(self, kind, url, entry, default):
+        """回放模式：返回缓存的判定；没有缓存时记为回放未命中，返回 default"""
+        if entry is None:
+            self._count('replay_miss')
+            logger.info(f"回放模式下没有缓存的验证结果: {kind} {url}")
+            return default
+        self._count('replayed')
+        return entry.verdict
+
+    @staticmethod
+    def conditional_headers(entry):
+        headers = {}
+        if entry is not None and entry.status == 200:
+            if entry.etag:
+                headers['If-None-Match'] = entry.etag
+            if entry.last_modified:
+                headers['If-Modified-Since'] = entry.last_modified
+        return headers
+
+    def not_modified(self, kind, url, entry):
+        """服务器返回 304：刷新检查时间并返回缓存的判定"""
+        self._count('not_modified')
+        with self._lock:
+            self._conn.execute('UPDATE validation SET checked_at = ? WHERE kind = ? AND url = ?',
+                               (time.time(), kind, normalize_url(url)))
+        return entry.verdict
+
+    def same_body_verdict(self, entry, body):
+        """内容哈希与缓存一致时返回缓存的判定，可省去解析；否则返回 MISS"""
+        if entry is not None and entry.status == 200 and body is not None and entry.body_hash == body_hash(body):
+            self._count('same_body')
+            return entry.verdict
+        return MISS
+
+    def store(self, kind, url, result, verdict):
+        body = result.body.body if result.body is not None else None
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO validation VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (kind, normalize_url(url), result.status, result.headers.get('ETag'),
+                 result.headers.get('Last-Modified'), body_hash(body) if body is not None else None,
+                 json.dumps(verdict), time.time()))
+
+    def _count(self, field):
+        with self._lock:
+            self.stats[field] += 1
+        inc('cache_total', cache='validate', result=field)
+
+    def log_stats(self):
+        logger.warning(
+            f"验证缓存：有效期内命中 {self.stats['fresh']} 次，304 命中 {self.stats['not_modified']} 次，"
+            f"内容未变 {self.stats['same_body']} 次，重新验证 {self.stats['miss']} 次。")
+        if REPLAY_MODE:
+            logger.warning(
+                f"验证缓存回放：使用缓存 {self.stats['replayed']} 次，没有缓存 {self.stats['replay_miss']} 次。")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """获取进程共享的验证缓存，未启用时返回 None（回放模式总是启用）"""
+    global _cache
+    if not CACHE_ENABLED and not REPLAY_MODE:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            try:
+                _cache = ValidationCache(CACHE_FILE, CACHE_TTL, CACHE_NEGATIVE_TTL)
+            except sqlite3.Error as e:
+                logger.error(f"无法打开验证缓存 {os.path.abspath(CACHE_FILE)}: {e}")
+                return None
+        return _cache
+
+
+def check_with_cache(kind, url, fetch, judge, default=None):
+    """带缓存的验证：fetch(额外请求头) 返回 FetchResult，judge(FetchResult) 返回判定结果；
+    default 为回放模式下没有缓存时返回的判定"""
+    cache = get_cache()
+    if cache is None:
+        return judge(fetch({}))
+    entry = cache.lookup(kind, url)
+    if REPLAY_MODE:
+        return cache.replay(kind, url, entry, default)
+    if cache.is_fresh(entry):
+        return entry.verdict
+    result = fetch(cache.conditional_headers(entry))
+    if result.status == 304 and entry is not None:
+        return cache.not_modified(kind, url, entry)
+    verdict = cache.same_body_verdict(entry, result.body.body if result.body is not None else None)
+    if verdict is MISS:
+        cache._count('miss')
+        verdict = judge(result)
+    cache.store(kind, url, result, verdict)
+    return verdict
+
+
+async def _judge_async(judge, result):
+    verdict = judge(result)
+    return await verdict if inspect.isawaitable(verdict) else verdict
+
+
+async def check_with_cache_async(kind, url, fetch, judge, default=None):
+    """check_with_cache 的异步版本，fetch 为协程函数，judge 可以返回协程"""
+    cache = get_cache()
+    if cache is None:
+        return await _judge_async(judge, await fetch({}))
+    entry = cache.lookup(kind, url)
+    if REPLAY_MODE:
+        return cache.replay(kind, url, entry, default)
+    if cache.is_fresh(entry):
+        return entry.verdict
+    result = await fetch(cache.conditional_headers(entry))
+    if result.status == 304 and entry is not None:
+        return cache.not_modified(kind, url, entry)
+    verdict = cache.same_body_verdict(entry, result.body.body if result.body is not None else None)
+    if verdict is MISS:
+        cache._count('miss')
+        verdict = await _judge_async(judge, result)
+    cache.store(kind, url, result, verdict)
+    return verdict
@@ -0,0 +1,286 @@
+# 进程内共享的 HTTP 会话和连接池
+# 所有同步抓取路径（make_request、process_url、search_google 等）都从这里获取会话，
+# 同一个域名的请求复用 keep-alive 连接，新建 TLS 连接时尽量复用之前的 TLS 会话，
+# 并统计连接池命中/未命中次数，便于衡量节省了多少次握手
+import logging
+import ssl
+import threading
+import time
+import weakref
+from collections import defaultdict
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3 import poolmanager
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.retry import Retry
+
+import metrics
+from cancellation import current_token
+from host_health import get_tracker
+
+logger = logging.getLogger(__name__)
+
+# 每个域名默认保留的连接数
+DEFAULT_POOL_SIZE = 4
+
+# 常用域名的连接池大小，我们的大部分地址都在这几个域名下
+HOST_POOL_SIZES = {
+    'raw.githubusercontent.com': 16,
+    'github.com': 8,
+    'gitee.com': 8,
+    'www.cnblogs.com': 4,
+    'cdn.jsdelivr.net': 8,
+}
+
+# 最多同时保留多少个域名的连接池
+MAX_POOLS = 100
+
+
+class _PoolStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._hosts = defaultdict(lambda: {'requests': 0, 'new_connections': 0, 'tls_resumed': 0})
+
+    def record(self, host, field):
+        with self._lock:
+            self._hosts[host][field] += 1
+        metrics.inc('pool_total', event=field)
+
+    def snapshot(self):
+        with self._lock:
+            hosts = {host: dict(stats) for host, stats in self._hosts.items()}
+        for stats in hosts.values():
+            # 没有新建连接的请求就是复用了已有连接
+            stats['reused'] = max(stats['requests'] - stats['new_connections'], 0)
+        return hosts
+
+    def reset(self):
+        with self._lock:
+            self._hosts.clear()
+
+
+_stats = _PoolStats()
+
+
+class _CountingHTTPConnection(HTTPConnection):
+    def connect(self):
+        _stats.record(self.host, 'new_connections')
+        start = time.monotonic()
+        try:
+            return super().connect()
+        finally:
+            # DNS 解析在 urllib3 内部进行，这里与建立 TCP 连接合并统计
+            seconds = time.monotonic() - start
+            metrics.add_time('connect', seconds)
+            get_tracker().observe_connect(self.host, seconds)
+
+
+class _CountingHTTPSConnection(HTTPSConnection):
+    def _new_conn(self):
+        start = time.monotonic()
+        try:
+            return super()._new_conn()
+        finally:
+            self._tcp_seconds = time.monotonic() - start
+            metrics.add_time('connect', self._tcp_seconds)
+
+    def connect(self):
+        _stats.record(self.host, 'new_connections')
+        self._tcp_seconds = 0.0
+        start = time.monotonic()
+        try:
+            return super().connect()
+        finally:
+            # connect 包含 _new_conn（DNS 和 TCP）和 TLS 握手；连接超时按包含握手的总时间计算
+            seconds = time.monotonic() - start
+            metrics.add_time('tls', max(seconds - self._tcp_seconds, 0.0))
+            get_tracker().observe_connect(self.host, seconds)
+
+    def close(self):
+        # 关闭前记下 TLS 会话，此时 TLS 1.3 的会话票据通常已经收到
+        if isinstance(self.ssl_context, ResumingSSLContext) and isinstance(self.sock, ssl.SSLSocket):
+            self.ssl_context.remember_session(self.sock)
+        super().close()
+
+
+class _CountingHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _CountingHTTPConnection
+
+    def urlopen(self, method, url, *args, **kwargs):
+        _stats.record(self.host, 'requests')
+        return super().urlopen(method, url, *args, **kwargs)
+
+
+class _CountingHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _CountingHTTPSConnection
+
+    def urlopen(self, method, url, *args, **kwargs):
+        _stats.record(self.host, 'requests')
+        return super().urlopen(method, url, *args, **kwargs)
+
+
+class ResumingSSLContext(ssl.SSLContext):
+    """新建 TLS 连接时带上同一域名上次的 TLS 会话，服务器支持时可跳过完整握手"""
+
+    def __new__(cls, *args, **kwargs):
+        # SSLContext 在 __new__ 中按协议创建，参数原样交给它
+        ctx = super().__new__(cls, *args, **kwargs)
+        ctx._session_lock = threading.Lock()
+        ctx._sessions = {}
+        return ctx
+
+    def _cached_session(self, host):
+        with self._session_lock:
+            entry = self._sessions.get(host)
+        if entry is None:
+            return None
+        sock_ref, session = entry
+        sock = sock_ref()
+        # TLS 1.3 的会话票据在握手之后才到达，优先从仍然存活的连接上取最新的会话
+        if sock is not None:
+            try:
+                session = sock.session or session
+            except (OSError, ValueError):
+                pass
+        return session
+
+    def remember_session(self, ssl_sock):
+        host = ssl_sock.server_hostname
+        try:
+            session = ssl_sock.session
+        except (OSError, ValueError):
+            return
+        if host and session is not None:
+            with self._session_lock:
+                self._sessions[host] = (weakref.ref(ssl_sock), session)
+
+    def wrap_socket(self, sock, *args, server_hostname=None, session=None, **kwargs):
+        if session is None and server_hostname:
+            session = self._cached_session(server_hostname)
+        try:
+            ssl_sock = super().wrap_socket(
+                sock, *args, server_hostname=server_hostname, session=session, **kwargs)
+        except ValueError:
+            # 会话不属于当前上下文等情况，退回到完整握手
+            ssl_sock = super().wrap_socket(
+                sock, *args, server_hostname=server_hostname, **kwargs)
+        if server_hostname:
+            if ssl_sock.session_reused:
+                _stats.record(server_hostname, 'tls_resumed')
+            with self._session_lock:
+                self._sessions[server_hostname] = (
+                    weakref.ref(ssl_sock), ssl_sock.session or session)
+        return ssl_sock
+
+
+def _create_ssl_context(insecure):
+    ctx = ResumingSSLContext(ssl.PROTOCOL_TLS_CLIENT)
+    if insecure:
+        # 放宽加密套件，不校验证书，与 make_request 中的 verify=False 一致
+        ctx.set_ciphers('DEFAULT@SECLEVEL=1')
+        ctx.check_hostname = False
+        ctx.verify_mode = ssl.CERT_NONE
+    else:
+        ctx.load_verify_locations(requests.certs.where())
+    return ctx
+
+
+class _PooledPoolManager(poolmanager.PoolManager):
+    def __init__(self, *args, ssl_context=None, cert_reqs=None, **kwargs):
+        super().__init__(*args, ssl_context=ssl_context, cert_reqs=cert_reqs, **kwargs)
+        self._ssl_context = ssl_context
+        self._cert_reqs = cert_reqs
+        self.pool_classes_by_scheme = {
+            'http': _CountingHTTPConnectionPool,
+            'https': _CountingHTTPSConnectionPool,
+        }
+
+    def connection_from_context(self, request_context):
+        # 按域名设置连接池大小，并始终使用本会话的 TLS 上下文
+        host = (request_context.get('host') or '').lower()
+        request_context['maxsize'] = HOST_POOL_SIZES.get(host, DEFAULT_POOL_SIZE)
+        if request_context['scheme'].lower() == 'https':
+            request_context['ssl_context'] = self._ssl_context
+            request_context['cert_reqs'] = self._cert_reqs
+        return super().connection_from_context(request_context)
+
+
+class TLSAdapter(HTTPAdapter):
+    def __init__(self, *args, insecure=True, **kwargs):
+        self.insecure = insecure
+        super().__init__(*args, **kwargs)
+
+    def init_poolmanager(self, connections, maxsize, block=False, **pool_kwargs):
+        """Create and initialize the urllib3 PoolManager."""
+        self.poolmanager = _PooledPoolManager(
+            num_pools=connections,
+            maxsize=maxsize,
+            block=block,
+            ssl_context=_create_ssl_context(self.insecure),
+            cert_reqs='CERT_NONE' if self.insecure else 'CERT_REQUIRED',
+            **pool_kwargs)
+
+
+class CancellableRetry(Retry):
+    """当前线程的取消令牌（见 cancellation.use_token）被取消后不再重试"""
+
+    def is_exhausted(self):
+        token = current_token()
+        return super().is_exhausted() or (token is not None and token.cancelled)
+
+    def sleep(self, response=None):
+        # 只有出错或状态码需要重试时才会调用（重定向不会）
+        metrics.inc('retries_total', kind='urllib3')
+        start = time.monotonic()
+        try:
+            super().sleep(response)
+        finally:
+            metrics.add_time('retry_wait', time.monotonic() - start)
+
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def get_session(insecure=True):
+    """获取共享会话。insecure=True 时不校验证书（用于 make_request），否则正常校验证书"""
+    with _sessions_lock:
+        session = _sessions.get(insecure)
+        if session is None:
+            session = requests.Session()
+            # 与原来 process_url 中的重试策略一致
+            retries = CancellableRetry(total=5, backoff_factor=0.1,
+                                       status_forcelist=[500, 502, 503, 504]) if insecure else 0
+            adapter = TLSAdapter(pool_connections=MAX_POOLS, pool_maxsize=DEFAULT_POOL_SIZE,
+                                 max_retries=retries, insecure=insecure)
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            _sessions[insecure] = session
+        return session
+
+
+def pool_stats():
+    """返回每个域名的请求数、新建连接数、复用连接数和 TLS 会话复用数"""
+    return _stats.snapshot()
+
+
+def log_pool_stats():
+    hosts = pool_stats()
+    total_requests = sum(s['requests'] for s in hosts.values())
+    total_new = sum(s['new_connections'] for s in hosts.values())
+    total_resumed = sum(s['tls_resumed'] for s in hosts.values())
+    logger.warning(
+        f"连接池统计：共 {total_requests} 次请求，新建连接 {total_new} 个，"
+        f"复用连接 {max(total_requests - total_new, 0)} 次，TLS 会话复用 {total_resumed} 次。")
+    for host, stats in sorted(hosts.items(), key=lambda item: -item[1]['requests']):
+        logger.info(f"连接池 {host}: {stats}")
+
+
+def close_sessions():
+    """关闭所有共享会话和其中的连接（程序结束时调用）"""
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
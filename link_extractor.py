@@ -0,0 +1,113 @@
+# 从 HTML 中提取链接，代替只为了取 <a href> 就构建整棵 BeautifulSoup 树的做法
+# 默认使用流式的标签扫描：按顺序逐个找出 <a> 标签并取出 href，跳过注释、<script> 和 <style>，
+# 不构建文档树，边扫描边产出链接；BeautifulSoup（html.parser）作为备选后端保留
+import html
+import logging
+import re
+
+from body_reader import decode_body
+
+logger = logging.getLogger(__name__)
+
+# 链接提取后端：'stream'（流式扫描）或 'bs4'（BeautifulSoup）
+LINK_BACKEND = 'stream'
+
+BACKENDS = ('stream', 'bs4')
+
+# 注释、脚本和样式中的内容不是链接，整段跳过；其余只关心 <a> 标签
+_TOKENS = re.compile(
+    r'<!--.*?-->|<script\b.*?</script\s*>|<style\b.*?</style\s*>|<a\s([^>]*)>',
+    re.I | re.S)
+
+_HREF = re.compile(r'''\bhref\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s"'>]+))''', re.I)
+
+_HTTP_LINK = re.compile(r'https?://')
+
+
+def _href(attrs):
+    match = _HREF.search(attrs)
+    if not match:
+        return None
+    value = match.group(1)
+    if value is None:
+        value = match.group(2) if match.group(2) is not None else match.group(3)
+    return html.unescape(value)
+
+
+def iter_hrefs(text):
+    """按文档顺序逐个产出所有 <a> 标签的 href（不构建文档树）"""
+    for match in _TOKENS.finditer(text):
+        attrs = match.group(1)
+        if attrs is None:
+            continue
+        href = _href(attrs)
+        if href is not None:
+            yield href
+
+
+def _container_pattern(tag, class_name):
+    return re.compile(
+        r'<!--.*?-->|<script\b.*?</script\s*>|<style\b.*?</style\s*>'
+        r'|(?P<container><' + tag + r'\b[^>]*\bclass\s*=\s*["\']?[^"\'>]*\b' + re.escape(class_name) + r'\b[^>]*>)'
+        r'|<a\s(?P<attrs>[^>]*)>',
+        re.I | re.S)
+
+
+def iter_first_hrefs_in(text, tag, class_name):
+    """产出每个带有指定 class 的 <tag> 之后的第一个 <a href>，相当于 soup.find_all(tag, class_=...) 再 find('a')"""
+    pattern = _container_pattern(tag, class_name)
+    waiting = False
+    for match in pattern.finditer(text):
+        if match.group('container') is not None:
+            waiting = True
+        elif waiting and match.group('attrs') is not None:
+            href = _href(match.group('attrs'))
+            if href is not None:
+                waiting = False
+                yield href
+
+
+def _bs4_hrefs(text):
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(text, 'html.parser')
+    return [link.get('href') for link in soup.find_all('a') if link.get('href') is not None]
+
+
+def _bs4_first_hrefs_in(text, tag, class_name):
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(text, 'html.parser')
+    hrefs = []
+    for result in soup.find_all(tag, class_=class_name):
+        link = result.find('a')
+        if link and link.get('href') is not None:
+            hrefs.append(link['href'])
+    return hrefs
+
+
+def _backend(backend):
+    backend = backend or LINK_BACKEND
+    if backend not in BACKENDS:
+        logger.error(f"未知的链接提取后端 {backend}，改用 stream")
+        return 'stream'
+    return backend
+
+
+def extract_links(text, backend=None):
+    """提取页面中所有 http/https 链接"""
+    if _backend(backend) == 'bs4':
+        hrefs = _bs4_hrefs(text)
+    else:
+        hrefs = iter_hrefs(text)
+    return [href for href in hrefs if _HTTP_LINK.match(href)]
+
+
+def extract_result_links(text, tag, class_name, backend=None):
+    """提取搜索结果页中每个结果的第一个链接"""
+    if _backend(backend) == 'bs4':
+        return _bs4_first_hrefs_in(text, tag, class_name)
+    return list(iter_first_hrefs_in(text, tag, class_name))
+
+
+def extract_body_links(body, encoding=None, backend=None):
+    """从原始内容中提取 http/https 链接（可在解析进程中执行，backend 需由调用方传入）"""
+    return extract_links(decode_body(body, encoding), backend)
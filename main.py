@@ -13,17 +13,46 @@
 # 2. 运行：python main.py
 import sys
 import os
-import requests
-import json
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from search_tvbox_sources import search_tvbox_sources, stop_search, SEARCH_TIMEOUT, MAX_URLS
+from search_tvbox_sources import search_tvbox_sources, request_scheduler, SEARCH_TIMEOUT, MAX_URLS
+from async_validator import Measurement, MAX_CONCURRENCY, PER_HOST_LIMIT
+import body_reader
+from body_reader import STREAM_VALIDATION, MAX_BODY_BYTES
+import http_cache
+from http_cache import get_cache, CACHE_ENABLED, CACHE_TTL, CACHE_NEGATIVE_TTL
+from http_pool import close_sessions, log_pool_stats
+from result_store import ResultStore, read_url_file
+from url_canon import dedupe_urls, canon_stats
+from pipeline import ValidationPipeline
+from cancellation import Cancelled, root_token, reset_root_token
+import link_extractor
+import crawl_frontier
+import config_health
+import multi_repo
+from multi_repo import expand_multi_repo
+from config_health import check_health
+import serp_cache
+from serp_cache import get_serp_cache
+import metrics
+from metrics import phase, profiling, export_metrics, set_gauge
+import host_health
+from host_health import get_tracker
+import mirror_race
+from mirror_race import get_mirror_stats
+import parse_pool
+import run_journal
+from run_journal import open_journal
+import work_queue
+from work_queue import open_queue
+from queue_worker import run_worker, collect
 import time
 import threading
 import signal
-import select
 import logging
 from logging.handlers import RotatingFileHandler
 import configparser
+import argparse
+import sqlite3
+import subprocess
 import datetime
 import traceback
 
@@ -31,10 +60,22 @@ import traceback
 should_exit = False
 main_thread = None
 
+# 是否正在搜索或测试（此时 Ctrl+C 先停止并保存结果，而不是直接退出）
+work_running = False
+
 # 在文件开头添加全局变量
 OUTPUT_FILE = 'tvbox-source.txt'  # 输出文件名source
 URL_FILE = 'tvbox-url.txt'     # URL文件名
 
+# 是否把搜索到的地址写入 tvbox-url.txt 作为检查点（验证不再依赖这个文件）
+URL_CHECKPOINT = True
+
+# 是否额外导出按速度和可用率排序的地址列表（tvbox-ranked.jsonl 和 tvbox-ranked.txt）
+RANKED_OUTPUT = True
+
+# 有效地址结果库（带索引），第一次使用时创建
+result_store = None
+
 # 设置日志
 
 
@@ -70,128 +111,238 @@ logger = setup_logging()
 
 
 def signal_handler(signum, frame):
-    global should_exit, stop_search
+    global should_exit
+    if should_exit or not work_running:
+        # 没有正在进行的任务，或再次按下 Ctrl+C：立即退出
+        logger.warning("接收到中断信号，正在退出程序...")
+        print("\n正在退出程序，请稍候...")
+        sys.exit(0)
     should_exit = True
-    stop_search = True
-    logger.warning("接收到中断信号，正在退出程序...")
-    print("\n正在退出程序，请稍候...")
-    if main_thread and main_thread != threading.current_thread():
-        main_thread.join(timeout=5)  # 等待主线程最多5秒
-    sys.exit(0)
+    # 取消根令牌：所有请求、重试和等待都会停止，已得到的结果会先保存
+    root_token().cancel('接收到中断信号')
+    logger.warning("接收到中断信号，正在停止并保存已得到的结果...")
+    print("\n正在停止并保存已得到的结果，再按一次 Ctrl+C 立即退出...")
 
 
-# 注册信号处理函数
+# 注册信号处理函数；GitHub Actions 取消任务时先发送 SIGINT，再发送 SIGTERM
 signal.signal(signal.SIGINT, signal_handler)
-
-
-def test_url(url):
+signal.signal(signal.SIGTERM, signal_handler)
+
+
+def get_result_store():
+    global result_store
+    if result_store is None:
+        result_store = ResultStore(OUTPUT_FILE)
+    return result_store
+
+
+def report_results(tested, valid, new_count, store):
+    set_gauge('urls', tested, state='tested')
+    set_gauge('urls', valid, state='valid')
+    set_gauge('urls', new_count, state='new')
+    set_gauge('urls', len(store), state='stored')
+    logger.warning(f"测试完成。共测试 {tested} 个地址，有效地址 {valid} 个。")
+    logger.warning(f"其中 {new_count} 个新地址已追加到 {OUTPUT_FILE} 文件中。")
+    logger.warning(f"{OUTPUT_FILE} 文件现共包含 {len(store)} 个有效地址。")
+    print(f"测试完成。共测试 {tested} 个地址，有效地址 {valid} 个。")
+    print(f"其中 {new_count} 个新地址已追加到 {OUTPUT_FILE} 文件中。")
+    print(f"{OUTPUT_FILE} 文件现共包含 {len(store)} 个有效地址。")
+
+
+def deep_check(urls, store):
+    """深度健康检查（DEEP_VALIDATION 开启时）：探测配置引用的 jar、接口和 ext 地址，记录每个配置的健康分"""
+    if not config_health.DEEP_VALIDATION or not urls:
+        return
+    logger.warning(f"开始深度健康检查 {len(urls)} 个配置...")
+    print(f"开始深度健康检查 {len(urls)} 个配置...")
+    with phase('deep_check'):
+        results = check_health(
+            urls, token=root_token(), max_probes=config_health.MAX_PROBES_PER_CONFIG,
+            concurrency=config_health.PROBE_CONCURRENCY, max_body_bytes=MAX_BODY_BYTES)
+    scores = {url: health.score for url, health in results.items() if health.score is not None}
+    store.record_health(scores)
+    # 深度检查读取了完整配置，补上流式验证得不到的条目数
+    store.record_performance({url: Measurement(None, None, None, health.sites, health.lives)
+                              for url, health in results.items() if health.sites is not None})
+    unhealthy = [health for health in results.values() if health.score is not None and health.score < 50]
+    for health in unhealthy:
+        logger.info(f"健康分 {health.score}: {health.url}，失效资源 {len(health.dead)} 个，例如 {health.dead[:3]}")
+    logger.warning(f"深度健康检查完成：{len(scores)} 个配置得到健康分，其中 {len(unhealthy)} 个低于 50 分。")
+    print(f"深度健康检查完成：{len(scores)} 个配置得到健康分，其中 {len(unhealthy)} 个低于 50 分。")
+
+
+def export_ranked(store):
+    """按测得的速度和可用率导出排序后的地址列表（RANKED_OUTPUT 开启时）"""
+    if not RANKED_OUTPUT:
+        return
     try:
-        response = requests.get(url, timeout=10)
-        if response.status_code == 200:
-            try:
-                json_data = response.json()
-                if isinstance(json_data, dict) and ('lives' in json_data or 'sites' in json_data or 'spider' in json_data):
-                    logger.debug(f"有效的 TVBox 地址: {url}")
-                    return url
-            except json.JSONDecodeError:
-                # 如果不是 JSON，检查是否包含常见 TVBox 配置关键字
-                text_content = response.text.lower()
-                if any(keyword in text_content for keyword in ['tvbox', 'live', 'vod', 'epg', 'source']):
-                    logger.debug(f"可能的 TVBox 地址: {url}")
-                    return url
-        else:
-            logger.debug(f"无效的地址 (状态码 {response.status_code}): {url}")
-    except requests.RequestException as e:
-        logger.error(f"测试 URL 时出错: {url} - {e}")
-    return None
+        count = store.export_ranked()
+    except OSError as e:
+        logger.error(f"无法导出排序后的地址列表: {e}")
+        return
+    logger.warning(f"已按速度和可用率排序导出 {count} 个地址。")
+
+
+def expand_indexes(invalid_urls, known, store):
+    """展开被判为无效的地址中的多仓索引，叶子配置作为单独的地址记录。
+    返回 ({叶子地址: 判定结果}, 新追加到输出文件的地址列表)"""
+    if not multi_repo.EXPAND_MULTI_REPO or not invalid_urls:
+        return {}, []
+    with phase('expand'):
+        leaves = expand_multi_repo(
+            invalid_urls, token=root_token(), known=known, max_depth=multi_repo.MAX_EXPAND_DEPTH,
+            max_children=multi_repo.MAX_CHILDREN_PER_INDEX, max_urls=multi_repo.MAX_EXPANDED_URLS,
+            per_host=PER_HOST_LIMIT, max_body_bytes=MAX_BODY_BYTES)
+    new_urls = store.record({url: verdict or 'invalid' for url, verdict in leaves.items()}) if leaves else []
+    return leaves, new_urls
+
+
+def close_journal(journal, completed):
+    """运行完成时删除检查点日志；被中断或出错时保留，下次运行从检查点继续"""
+    if journal is None:
+        return
+    if completed:
+        journal.finish()
+        return
+    journal.close()
+    logger.warning(f"运行没有完成，检查点已保存到 {journal.path}，下次运行时继续。")
 
 
 def test_main(input_file):
-    with open(input_file, 'r') as f:
-        urls = [line.strip().split('] ')[-1] if ']' in line else line.strip()
-                for line in f if line.strip()]
-
-    valid_urls = []
-    with ThreadPoolExecutor(max_workers=10) as executor:
-        future_to_url = {executor.submit(test_url, url): url for url in urls}
-        for future in as_completed(future_to_url):
-            result = future.result()
-            if result:
-                valid_urls.append(result)
-
-    # 读取现有的输出文件内容
-    existing_urls = set()
-    if os.path.exists(OUTPUT_FILE):
-        with open(OUTPUT_FILE, 'r') as f:
-            existing_urls = set(line.strip().split('] ')[-1] if ']' in line else line.strip()
-                                for line in f if line.strip())
-
-    # 追加新的有效地址到输出文件
-    new_urls_count = 0
-    current_time = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
-    with open(OUTPUT_FILE, 'a') as f:
-        for url in valid_urls:
-            if url not in existing_urls:
-                f.write(f"[{current_time}] {url}\n")
-                new_urls_count += 1
-                existing_urls.add(url)
-
-    logger.warning(f"测试完成。共测试 {len(urls)} 个地址，有效地址 {len(valid_urls)} 个。")
-    logger.warning(f"其中 {new_urls_count} 个新地址已追加到 {OUTPUT_FILE} 文件中。")
-    logger.warning(f"{OUTPUT_FILE} 文件现共包含 {len(existing_urls)} 个有效地址。")
-    print(f"测试完成。共测试 {len(urls)} 个地址，有效地址 {len(valid_urls)} 个。")
-    print(f"其中 {new_urls_count} 个新地址已追加到 {OUTPUT_FILE} 文件中。")
-    print(f"{OUTPUT_FILE} 文件现共包含 {len(existing_urls)} 个有效地址。")
+    global work_running
+    # 先规范化并合并镜像地址，同一个配置只验证一次
+    urls = dedupe_urls(read_url_file(input_file))
+    # 同一个文件（路径和修改时间都相同）上次被中断时从检查点继续
+    journal = open_journal('file', f"{os.path.abspath(input_file)} {os.path.getmtime(input_file)}")
+
+    # 在开始并发请求之前启动解析进程
+    parse_pool.start()
+
+    # 验证结果分批写入结果库和检查点日志，中断时已保存的结果不会丢失
+    token = reset_root_token()
+    store = get_result_store()
+    pipeline = ValidationPipeline(
+        store, token=token, journal=journal, max_concurrency=MAX_CONCURRENCY, per_host=PER_HOST_LIMIT,
+        stream=STREAM_VALIDATION, max_body_bytes=MAX_BODY_BYTES).start()
+    work_running = True
+    completed = False
+    try:
+        with phase('validate'):
+            try:
+                # 上次已完成的地址由流水线跳过
+                for url in urls:
+                    pipeline.submit(url)
+            except Cancelled:
+                pass
+            finally:
+                pipeline.close()
+            # 中断时放弃未完成的地址，已得到的结果照常保存
+            pipeline.join()
+
+        # 多仓索引中的配置逐个作为单独的地址
+        leaves, leaf_new_urls = expand_indexes(
+            pipeline.invalid_urls, pipeline.valid_urls + pipeline.invalid_urls, store)
+        leaf_valid_urls = [url for url, verdict in leaves.items() if verdict]
+        deep_check(pipeline.valid_urls + leaf_valid_urls, store)
+        completed = not token.cancelled
+    finally:
+        work_running = False
+        close_journal(journal, completed)
+    store.maybe_compact()
+    export_ranked(store)
+
+    report_results(pipeline.tested + len(leaves), pipeline.valid + len(leaf_valid_urls),
+                   len(pipeline.new_urls) + len(leaf_new_urls), store)
 
 
 def search_and_test(timeout=None):
     # 如果没有指定 timeout，就使用默认值
     search_timeout = timeout if timeout is not None else SEARCH_TIMEOUT
-    global should_exit, stop_search
+    global should_exit, work_running
+    search_timed_out = False
     logger.warning("开始搜索TVBox源地址...")
     print("正在搜索TVBox源地址...")
     start_time = time.time()
 
-    search_thread = threading.Thread(
-        target=search_tvbox_sources, args=(search_timeout,))
-    search_thread.start()
-
-    while search_thread.is_alive() and time.time() - start_time < search_timeout and not should_exit:
-        remaining_time = search_timeout - (time.time() - start_time)
-        print(f"\r搜索中，剩余时间约 {int(remaining_time)} 秒...", end="")
-        sys.stdout.flush()
-        time.sleep(1)  # 每秒更新一次
-
-    if search_thread.is_alive():
-        if should_exit:
-            logger.warning("搜索被用户中断。")
-            print("\n搜索被用户中断。")
-        else:
-            logger.warning("搜索超时，超过设定时间。")
-            print("\n搜索超时，超过设定时间。")
-            search_timed_out = True
-        stop_search = True
-        search_thread.join(10)  # 给线程10秒时间来清理和退出
-
-    elapsed_time = time.time() - start_time
-    logger.warning(f"搜索完成或已中断，耗时 {elapsed_time:.2f} 秒。")
-    print(f"\n搜索完成或已中断，耗时 {elapsed_time:.2f} 秒。")
-
-    input_file = "tvbox-url.txt"
-    input_file_path = os.path.join(os.getcwd(), input_file)
-
-    if not os.path.exists(input_file_path):
-        logger.error(f"错误：文件 '{input_file_path}' 不存在。搜索可能未找到任何结果。")
-        print(f"错误：文件 '{input_file_path}' 不存在。搜索可能未找到任何结果。")
-        return False
-    elif os.path.getsize(input_file_path) == 0:
-        logger.warning(f"警告：文件 '{input_file_path}' 为空。搜索未找到任何结果。")
-        print(f"警告：文件 '{input_file_path}' 为空。搜索未找到任何结果。")
+    # Ctrl+C 取消根令牌；搜索使用带截止时间的子令牌，超时只停止搜索，已找到的地址仍会验证完
+    run_token = reset_root_token()
+    search_token = run_token.child(search_timeout)
+
+    # 上次搜索被中断时从检查点继续：已完成的地址不再验证，已发现但未完成的地址最先验证
+    journal = open_journal('search')
+
+    # 在开始并发请求之前启动解析进程
+    parse_pool.start()
+
+    # 搜索到的地址直接流入验证流水线，验证与搜索同时进行；tvbox-url.txt 只作为可选的检查点
+    store = get_result_store()
+    pipeline = ValidationPipeline(
+        store, token=run_token, journal=journal, max_concurrency=MAX_CONCURRENCY, per_host=PER_HOST_LIMIT,
+        stream=STREAM_VALIDATION, max_body_bytes=MAX_BODY_BYTES).start()
+
+    def run_search():
+        try:
+            for url in journal.pending if journal is not None else ():
+                pipeline.submit(url)
+            with phase('search'):
+                search_tvbox_sources(search_timeout, on_url=pipeline.submit,
+                                     url_file=URL_FILE if URL_CHECKPOINT else None, token=search_token)
+        except Cancelled:
+            pass
+        finally:
+            pipeline.close()
+
+    work_running = True
+    completed = False
+    try:
+        search_thread = threading.Thread(target=run_search)
+        search_thread.start()
+
+        while search_thread.is_alive():
+            remaining_time = search_token.remaining()
+            print(f"\r搜索中，已验证 {pipeline.tested} 个地址，剩余时间约 {int(remaining_time)} 秒...", end="")
+            sys.stdout.flush()
+            search_thread.join(1)  # 每秒更新一次
+
+        if search_token.cancelled:
+            if run_token.cancelled:
+                logger.warning("搜索被用户中断。")
+                print("\n搜索被用户中断。")
+                stopped_after = time.monotonic() - run_token.cancelled_at
+            else:
+                logger.warning("搜索超时，超过设定时间。")
+                print("\n搜索超时，超过设定时间。")
+                search_timed_out = True
+                stopped_after = time.monotonic() - search_token.deadline
+            logger.warning(f"取消后 {stopped_after:.2f} 秒内停止了所有搜索请求。")
+
+        elapsed_time = time.time() - start_time
+        logger.warning(f"搜索完成或已中断，耗时 {elapsed_time:.2f} 秒。")
+        print(f"\n搜索完成或已中断，耗时 {elapsed_time:.2f} 秒。等待剩余地址验证完成...")
+
+        # 被中断时流水线放弃未完成的验证，但已得到的结果都会写入结果库
+        pipeline.join()
+        # 验证与搜索同时进行，这里是从开始搜索到验证全部完成的时间
+        metrics.get_metrics().add_phase('pipeline', time.time() - start_time)
+        leaves, leaf_new_urls = expand_indexes(
+            pipeline.invalid_urls, pipeline.valid_urls + pipeline.invalid_urls, store)
+        leaf_valid_urls = [url for url, verdict in leaves.items() if verdict]
+        deep_check(pipeline.valid_urls + leaf_valid_urls, store)
+        # 搜索超时不影响：已发现的地址都已验证完
+        completed = not run_token.cancelled
+    finally:
+        work_running = False
+        close_journal(journal, completed)
+    store.maybe_compact()
+    export_ranked(store)
+
+    if pipeline.tested == 0:
+        logger.warning("警告：搜索未找到任何结果。")
+        print("警告：搜索未找到任何结果。")
         return False
-    else:
-        logger.info(f"文件 '{input_file_path}' 存在且不为空。开始测试已找到的地址...")
-        print(f"文件 '{input_file_path}' 存在且不为空。开始测试已找到的地址...")
-        test_main(input_file_path)
+
+    report_results(pipeline.tested + len(leaves), pipeline.valid + len(leaf_valid_urls),
+                   len(pipeline.new_urls) + len(leaf_new_urls), store)
 
     if should_exit or search_timed_out:
         return False
@@ -215,42 +366,7 @@ def test_local_file():
         logger.warning(f"开始测试本地文件: {input_file}")
         print(f"开始测试本地文件: {input_file}")
 
-        with open(input_file, 'r') as f:
-            urls = [line.strip().split('] ')[-1] if ']' in line else line.strip()
-                    for line in f if line.strip()]
-
-        valid_urls = []
-        with ThreadPoolExecutor(max_workers=10) as executor:
-            future_to_url = {executor.submit(
-                test_url, url): url for url in urls}
-            for future in as_completed(future_to_url):
-                result = future.result()
-                if result:
-                    valid_urls.append(result)
-
-        # 读取现有的输出文件内容
-        existing_urls = set()
-        if os.path.exists(OUTPUT_FILE):
-            with open(OUTPUT_FILE, 'r') as f:
-                existing_urls = set(line.strip().split('] ')[-1] if ']' in line else line.strip()
-                                    for line in f if line.strip())
-
-        # 追加新的有效地址到输出文件
-        new_urls_count = 0
-        current_time = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
-        with open(OUTPUT_FILE, 'a') as f:
-            for url in valid_urls:
-                if url not in existing_urls:
-                    f.write(f"[{current_time}] {url}\n")
-                    new_urls_count += 1
-                    existing_urls.add(url)
-
-        logger.warning(f"测试完成。共测试 {len(urls)} 个地址，有效地址 {len(valid_urls)} 个。")
-        logger.warning(f"其中 {new_urls_count} 个新地址已追加到 {OUTPUT_FILE} 文件中。")
-        logger.warning(f"{OUTPUT_FILE} 文件现共包含 {len(existing_urls)} 个有效地址。")
-        print(f"测试完成。共测试 {len(urls)} 个地址，有效地址 {len(valid_urls)} 个")
-        print(f"其中 {new_urls_count} 个新地址已追加到 {OUTPUT_FILE} 文件中。")
-        print(f"{OUTPUT_FILE} 文件现共包含 {len(existing_urls)} 个有效地址。")
+        test_main(input_file)
         return True  # 返回 True 表示测试完成，可以退出程序
 
 
@@ -260,14 +376,104 @@ def load_config():
         config.read('config.ini')
     if 'Settings' not in config:
         config['Settings'] = {}
+    existing = dict(config['Settings'])
     if 'SEARCH_TIMEOUT' not in config['Settings']:
         config['Settings']['SEARCH_TIMEOUT'] = '600'  # 10分钟
     if 'MAX_URLS' not in config['Settings']:
         config['Settings']['MAX_URLS'] = '300'
-
-    # 保存默认配置
-    with open('config.ini', 'w') as configfile:
-        config.write(configfile)
+    if 'MAX_CONCURRENCY' not in config['Settings']:
+        config['Settings']['MAX_CONCURRENCY'] = str(MAX_CONCURRENCY)
+    if 'PER_HOST_LIMIT' not in config['Settings']:
+        config['Settings']['PER_HOST_LIMIT'] = str(PER_HOST_LIMIT)
+    if 'STREAM_VALIDATION' not in config['Settings']:
+        config['Settings']['STREAM_VALIDATION'] = str(STREAM_VALIDATION)
+    if 'MAX_BODY_BYTES' not in config['Settings']:
+        config['Settings']['MAX_BODY_BYTES'] = str(MAX_BODY_BYTES)
+    if 'CACHE_ENABLED' not in config['Settings']:
+        config['Settings']['CACHE_ENABLED'] = str(CACHE_ENABLED)
+    if 'CACHE_TTL' not in config['Settings']:
+        config['Settings']['CACHE_TTL'] = str(CACHE_TTL)
+    if 'CACHE_NEGATIVE_TTL' not in config['Settings']:
+        config['Settings']['CACHE_NEGATIVE_TTL'] = str(CACHE_NEGATIVE_TTL)
+    if 'LINK_BACKEND' not in config['Settings']:
+        config['Settings']['LINK_BACKEND'] = link_extractor.LINK_BACKEND
+    if 'MAX_CRAWL_PAGES' not in config['Settings']:
+        config['Settings']['MAX_CRAWL_PAGES'] = str(crawl_frontier.MAX_CRAWL_PAGES)
+    if 'MAX_PAGES_PER_HOST' not in config['Settings']:
+        config['Settings']['MAX_PAGES_PER_HOST'] = str(crawl_frontier.MAX_PAGES_PER_HOST)
+    if 'CRAWL_WORKERS' not in config['Settings']:
+        config['Settings']['CRAWL_WORKERS'] = str(crawl_frontier.CRAWL_WORKERS)
+    if 'EXPAND_MULTI_REPO' not in config['Settings']:
+        config['Settings']['EXPAND_MULTI_REPO'] = str(multi_repo.EXPAND_MULTI_REPO)
+    if 'MAX_EXPAND_DEPTH' not in config['Settings']:
+        config['Settings']['MAX_EXPAND_DEPTH'] = str(multi_repo.MAX_EXPAND_DEPTH)
+    if 'MAX_CHILDREN_PER_INDEX' not in config['Settings']:
+        config['Settings']['MAX_CHILDREN_PER_INDEX'] = str(multi_repo.MAX_CHILDREN_PER_INDEX)
+    if 'MAX_EXPANDED_URLS' not in config['Settings']:
+        config['Settings']['MAX_EXPANDED_URLS'] = str(multi_repo.MAX_EXPANDED_URLS)
+    if 'DEEP_VALIDATION' not in config['Settings']:
+        config['Settings']['DEEP_VALIDATION'] = str(config_health.DEEP_VALIDATION)
+    if 'MAX_PROBES_PER_CONFIG' not in config['Settings']:
+        config['Settings']['MAX_PROBES_PER_CONFIG'] = str(config_health.MAX_PROBES_PER_CONFIG)
+    if 'PROBE_CONCURRENCY' not in config['Settings']:
+        config['Settings']['PROBE_CONCURRENCY'] = str(config_health.PROBE_CONCURRENCY)
+    if 'URL_CHECKPOINT' not in config['Settings']:
+        config['Settings']['URL_CHECKPOINT'] = str(URL_CHECKPOINT)
+    if 'SERP_CACHE_ENABLED' not in config['Settings']:
+        config['Settings']['SERP_CACHE_ENABLED'] = str(serp_cache.SERP_CACHE_ENABLED)
+    if 'SERP_CACHE_TTL' not in config['Settings']:
+        config['Settings']['SERP_CACHE_TTL'] = str(serp_cache.SERP_CACHE_TTL)
+    if 'SERP_CACHE_MAX_ENTRIES' not in config['Settings']:
+        config['Settings']['SERP_CACHE_MAX_ENTRIES'] = str(serp_cache.SERP_CACHE_MAX_ENTRIES)
+    if 'REPLAY_MODE' not in config['Settings']:
+        config['Settings']['REPLAY_MODE'] = str(serp_cache.REPLAY_MODE)
+    if 'METRICS_ENABLED' not in config['Settings']:
+        config['Settings']['METRICS_ENABLED'] = str(metrics.METRICS_ENABLED)
+    if 'METRICS_FILE' not in config['Settings']:
+        config['Settings']['METRICS_FILE'] = metrics.METRICS_FILE
+    if 'METRICS_PROM_FILE' not in config['Settings']:
+        config['Settings']['METRICS_PROM_FILE'] = metrics.METRICS_PROM_FILE
+    if 'PROFILE_MODE' not in config['Settings']:
+        config['Settings']['PROFILE_MODE'] = metrics.PROFILE_MODE
+    if 'CIRCUIT_BREAKER' not in config['Settings']:
+        config['Settings']['CIRCUIT_BREAKER'] = str(host_health.CIRCUIT_BREAKER)
+    if 'FAILURE_THRESHOLD' not in config['Settings']:
+        config['Settings']['FAILURE_THRESHOLD'] = str(host_health.FAILURE_THRESHOLD)
+    if 'CIRCUIT_OPEN_SECONDS' not in config['Settings']:
+        config['Settings']['CIRCUIT_OPEN_SECONDS'] = str(host_health.CIRCUIT_OPEN_SECONDS)
+    if 'ADAPTIVE_TIMEOUTS' not in config['Settings']:
+        config['Settings']['ADAPTIVE_TIMEOUTS'] = str(host_health.ADAPTIVE_TIMEOUTS)
+    if 'MAX_TIMEOUT' not in config['Settings']:
+        config['Settings']['MAX_TIMEOUT'] = str(host_health.MAX_TIMEOUT)
+    if 'MIRROR_RACING' not in config['Settings']:
+        config['Settings']['MIRROR_RACING'] = str(mirror_race.MIRROR_RACING)
+    if 'MIRROR_STAGGER' not in config['Settings']:
+        config['Settings']['MIRROR_STAGGER'] = str(mirror_race.MIRROR_STAGGER)
+    if 'MAX_MIRRORS' not in config['Settings']:
+        config['Settings']['MAX_MIRRORS'] = str(mirror_race.MAX_MIRRORS)
+    if 'RANKED_OUTPUT' not in config['Settings']:
+        config['Settings']['RANKED_OUTPUT'] = str(RANKED_OUTPUT)
+    if 'PARSE_WORKERS' not in config['Settings']:
+        config['Settings']['PARSE_WORKERS'] = str(parse_pool.PARSE_WORKERS)
+    if 'JOURNAL_ENABLED' not in config['Settings']:
+        config['Settings']['JOURNAL_ENABLED'] = str(run_journal.JOURNAL_ENABLED)
+    if 'JOURNAL_MAX_AGE' not in config['Settings']:
+        config['Settings']['JOURNAL_MAX_AGE'] = str(run_journal.JOURNAL_MAX_AGE)
+    if 'QUEUE_BACKEND' not in config['Settings']:
+        config['Settings']['QUEUE_BACKEND'] = work_queue.QUEUE_BACKEND
+    if 'QUEUE_FILE' not in config['Settings']:
+        config['Settings']['QUEUE_FILE'] = work_queue.QUEUE_FILE
+    if 'QUEUE_BATCH_SIZE' not in config['Settings']:
+        config['Settings']['QUEUE_BATCH_SIZE'] = str(work_queue.QUEUE_BATCH_SIZE)
+    if 'QUEUE_LEASE_SECONDS' not in config['Settings']:
+        config['Settings']['QUEUE_LEASE_SECONDS'] = str(work_queue.QUEUE_LEASE_SECONDS)
+    if 'QUEUE_MAX_ATTEMPTS' not in config['Settings']:
+        config['Settings']['QUEUE_MAX_ATTEMPTS'] = str(work_queue.QUEUE_MAX_ATTEMPTS)
+
+    # 保存补充的默认配置；没有变化时不写入，多个工作进程同时启动时不会互相覆盖
+    if dict(config['Settings']) != existing:
+        with open('config.ini', 'w') as configfile:
+            config.write(configfile)
 
     return config
 
@@ -329,9 +535,69 @@ def ensure_files_exist():
                 print(f"无法创建文件 {file}: {e}")
 
 
+def apply_config():
+    """加载配置并应用到各模块，返回配置"""
+    global SEARCH_TIMEOUT, MAX_URLS, MAX_CONCURRENCY, PER_HOST_LIMIT
+    global STREAM_VALIDATION, MAX_BODY_BYTES, URL_CHECKPOINT, RANKED_OUTPUT
+    config = load_config()
+    SEARCH_TIMEOUT = int(config['Settings']['SEARCH_TIMEOUT'])
+    MAX_URLS = int(config['Settings']['MAX_URLS'])
+    MAX_CONCURRENCY = int(config['Settings']['MAX_CONCURRENCY'])
+    PER_HOST_LIMIT = int(config['Settings']['PER_HOST_LIMIT'])
+    STREAM_VALIDATION = config['Settings'].getboolean('STREAM_VALIDATION')
+    MAX_BODY_BYTES = int(config['Settings']['MAX_BODY_BYTES'])
+    # 搜索模块中的 is_valid_tvbox_url 也使用这两个设置
+    body_reader.STREAM_VALIDATION = STREAM_VALIDATION
+    body_reader.MAX_BODY_BYTES = MAX_BODY_BYTES
+    http_cache.CACHE_ENABLED = config['Settings'].getboolean('CACHE_ENABLED')
+    http_cache.CACHE_TTL = int(config['Settings']['CACHE_TTL'])
+    http_cache.CACHE_NEGATIVE_TTL = int(config['Settings']['CACHE_NEGATIVE_TTL'])
+    link_extractor.LINK_BACKEND = config['Settings']['LINK_BACKEND']
+    crawl_frontier.MAX_CRAWL_PAGES = int(config['Settings']['MAX_CRAWL_PAGES'])
+    crawl_frontier.MAX_PAGES_PER_HOST = int(config['Settings']['MAX_PAGES_PER_HOST'])
+    crawl_frontier.CRAWL_WORKERS = int(config['Settings']['CRAWL_WORKERS'])
+    URL_CHECKPOINT = config['Settings'].getboolean('URL_CHECKPOINT')
+    multi_repo.EXPAND_MULTI_REPO = config['Settings'].getboolean('EXPAND_MULTI_REPO')
+    multi_repo.MAX_EXPAND_DEPTH = int(config['Settings']['MAX_EXPAND_DEPTH'])
+    multi_repo.MAX_CHILDREN_PER_INDEX = int(config['Settings']['MAX_CHILDREN_PER_INDEX'])
+    multi_repo.MAX_EXPANDED_URLS = int(config['Settings']['MAX_EXPANDED_URLS'])
+    config_health.DEEP_VALIDATION = config['Settings'].getboolean('DEEP_VALIDATION')
+    config_health.MAX_PROBES_PER_CONFIG = int(config['Settings']['MAX_PROBES_PER_CONFIG'])
+    config_health.PROBE_CONCURRENCY = int(config['Settings']['PROBE_CONCURRENCY'])
+    serp_cache.SERP_CACHE_ENABLED = config['Settings'].getboolean('SERP_CACHE_ENABLED')
+    serp_cache.SERP_CACHE_TTL = int(config['Settings']['SERP_CACHE_TTL'])
+    serp_cache.SERP_CACHE_MAX_ENTRIES = int(config['Settings']['SERP_CACHE_MAX_ENTRIES'])
+    # 回放模式同时作用于搜索结果缓存和验证缓存
+    serp_cache.REPLAY_MODE = http_cache.REPLAY_MODE = config['Settings'].getboolean('REPLAY_MODE')
+    if serp_cache.REPLAY_MODE:
+        logger.warning("回放模式：只使用缓存的搜索结果页和验证结果")
+    metrics.METRICS_ENABLED = config['Settings'].getboolean('METRICS_ENABLED')
+    metrics.METRICS_FILE = config['Settings']['METRICS_FILE']
+    metrics.METRICS_PROM_FILE = config['Settings']['METRICS_PROM_FILE']
+    metrics.PROFILE_MODE = config['Settings']['PROFILE_MODE']
+    host_health.CIRCUIT_BREAKER = config['Settings'].getboolean('CIRCUIT_BREAKER')
+    host_health.FAILURE_THRESHOLD = int(config['Settings']['FAILURE_THRESHOLD'])
+    host_health.CIRCUIT_OPEN_SECONDS = int(config['Settings']['CIRCUIT_OPEN_SECONDS'])
+    host_health.ADAPTIVE_TIMEOUTS = config['Settings'].getboolean('ADAPTIVE_TIMEOUTS')
+    host_health.MAX_TIMEOUT = int(config['Settings']['MAX_TIMEOUT'])
+    mirror_race.MIRROR_RACING = config['Settings'].getboolean('MIRROR_RACING')
+    mirror_race.MIRROR_STAGGER = float(config['Settings']['MIRROR_STAGGER'])
+    mirror_race.MAX_MIRRORS = int(config['Settings']['MAX_MIRRORS'])
+    RANKED_OUTPUT = config['Settings'].getboolean('RANKED_OUTPUT')
+    parse_pool.PARSE_WORKERS = int(config['Settings']['PARSE_WORKERS'])
+    run_journal.JOURNAL_ENABLED = config['Settings'].getboolean('JOURNAL_ENABLED')
+    run_journal.JOURNAL_MAX_AGE = int(config['Settings']['JOURNAL_MAX_AGE'])
+    work_queue.QUEUE_BACKEND = config['Settings']['QUEUE_BACKEND']
+    work_queue.QUEUE_FILE = config['Settings']['QUEUE_FILE']
+    work_queue.QUEUE_BATCH_SIZE = int(config['Settings']['QUEUE_BATCH_SIZE'])
+    work_queue.QUEUE_LEASE_SECONDS = int(config['Settings']['QUEUE_LEASE_SECONDS'])
+    work_queue.QUEUE_MAX_ATTEMPTS = int(config['Settings']['QUEUE_MAX_ATTEMPTS'])
+    return config
+
+
 def auto_run():
     """自动运行模式，用于 GitHub Actions"""
-    global main_thread, should_exit, SEARCH_TIMEOUT, MAX_URLS
+    global main_thread
     main_thread = threading.current_thread()
 
     logger.info("程序启动 - 自动模式")
@@ -340,25 +606,129 @@ def auto_run():
     ensure_files_exist()
 
     # 加载配置
-    config = load_config()
-    SEARCH_TIMEOUT = int(config['Settings']['SEARCH_TIMEOUT'])
-    MAX_URLS = int(config['Settings']['MAX_URLS'])
+    apply_config()
 
     try:
-        # 直接执行搜索
-        if not search_and_test():
-            logger.warning("搜索超时或被中断")
-            return False
-        else:
-            logger.warning("搜索和测试完成")
-            return True
+        # 直接执行搜索；PROFILE_MODE 不为 off 时剖析整次运行
+        with profiling(), phase('total'):
+            if not search_and_test():
+                logger.warning("搜索超时或被中断")
+                return False
+            else:
+                logger.warning("搜索和测试完成")
+                return True
     except Exception as e:
         logger.error(f"程序发生异常: {str(e)}")
         logger.error(f"异常详情:\n{traceback.format_exc()}")
         return False
+    finally:
+        parse_pool.shutdown()
+        log_pool_stats()
+        close_sessions()
+        request_scheduler.log_stats()
+        get_tracker().log_stats()
+        # 记录各镜像的表现，下次运行优先尝试最快的镜像
+        get_mirror_stats().log_stats()
+        get_mirror_stats().save()
+        if get_cache() is not None:
+            get_cache().log_stats()
+        if get_serp_cache() is not None:
+            get_serp_cache().log_stats()
+        stats = canon_stats()
+        logger.warning(
+            f"地址规范化：处理 {stats['input']} 个地址，改写 {stats['rewritten']} 个，避免重复请求 {stats['avoided']} 次。")
+        export_metrics()
+
+
+def worker_command():
+    """启动一个工作进程的命令行（打包后的可执行文件没有脚本路径）"""
+    script = [] if getattr(sys, 'frozen', False) else [os.path.abspath(__file__)]
+    return [sys.executable] + script + ['queue', 'work', '--spawned']
+
+
+def queue_work(queue, processes, spawned=False):
+    """在本机启动 processes 个工作进程（1 个时在当前进程中运行），等待它们领取并验证完队列中的地址；
+    spawned 表示当前进程是由 worker_command 启动的工作进程之一"""
+    global work_running
+    # Ctrl+C 同时发给各工作进程，它们放回未完成的地址后退出，这里等待它们结束
+    work_running = True
+    try:
+        if processes > 1:
+            workers = [subprocess.Popen(worker_command()) for _ in range(processes)]
+            logger.warning(f"已启动 {processes} 个工作进程")
+            print(f"已启动 {processes} 个工作进程")
+            for worker in workers:
+                worker.wait()
+            return
+        if spawned:
+            # 多个工作进程不共享验证缓存（SQLite 缓存文件不适合多个进程同时写入），由队列保证每个地址只验证一次；
+            # 工作进程本身就是多进程，不再启动解析进程。在当前进程中运行时照常使用两者
+            http_cache.CACHE_ENABLED = False
+            parse_pool.PARSE_WORKERS = 0
+        with phase('validate'):
+            run_worker(queue, work_queue.QUEUE_BATCH_SIZE, work_queue.QUEUE_LEASE_SECONDS, token=reset_root_token(),
+                       max_concurrency=MAX_CONCURRENCY, per_host=PER_HOST_LIMIT, stream=STREAM_VALIDATION,
+                       max_body_bytes=MAX_BODY_BYTES)
+    finally:
+        parse_pool.shutdown()
+        work_running = False
+
+
+def queue_collect(queue):
+    """把队列中已完成的结果写入结果库，新的有效地址追加到输出文件"""
+    store = get_result_store()
+    recorded, valid, new_urls = collect(queue, store)
+    store.maybe_compact()
+    export_ranked(store)
+    report_results(recorded, valid, len(new_urls), store)
+
+
+def queue_main(argv):
+    """分布式验证：python main.py queue add 文件... | work [--processes N] [--collect] | collect | status"""
+    parser = argparse.ArgumentParser(prog='main.py queue', description='通过工作队列在多个进程或多台机器上验证地址')
+    commands = parser.add_subparsers(dest='command', required=True)
+    add_parser = commands.add_parser('add', help='把地址文件中的地址加入队列')
+    add_parser.add_argument('files', nargs='+', help='地址文件，每行一个地址（可带 [时间] 前缀）')
+    work_parser = commands.add_parser('work', help='领取并验证队列中的地址，全部完成后退出')
+    work_parser.add_argument('--processes', type=int, default=1, help='在本机启动的工作进程数')
+    work_parser.add_argument('--collect', action='store_true', help='验证完成后把结果写入结果库')
+    work_parser.add_argument('--spawned', action='store_true', help=argparse.SUPPRESS)
+    commands.add_parser('collect', help='把已完成的结果写入结果库和输出文件')
+    commands.add_parser('status', help='查看队列状态')
+    args = parser.parse_args(argv)
+
+    apply_config()
+    try:
+        queue = open_queue()
+    except (ValueError, OSError, sqlite3.Error) as e:
+        logger.error(f"无法打开工作队列: {e}")
+        print(f"无法打开工作队列: {e}")
+        return 1
+    try:
+        if args.command == 'add':
+            urls = dedupe_urls([url for path in args.files for url in read_url_file(path)])
+            added = queue.add(urls)
+            logger.warning(f"已把 {added} 个地址加入队列（共读取 {len(urls)} 个）")
+            print(f"已把 {added} 个地址加入队列（共读取 {len(urls)} 个）")
+        elif args.command == 'work':
+            queue_work(queue, args.processes, args.spawned)
+            if args.collect:
+                queue_collect(queue)
+        elif args.command == 'collect':
+            queue_collect(queue)
+        stats = queue.stats()
+        logger.warning(f"队列状态：{stats}")
+        print(f"队列状态：待验证 {stats['pending']}，验证中 {stats['leased']}，已完成 {stats['done']}"
+              f"（未写入结果库 {stats['unreported']}），失败 {stats['failed']}")
+    finally:
+        queue.close()
+    return 0
 
 
 if __name__ == "__main__":
+    # 分布式验证的命令
+    if len(sys.argv) > 1 and sys.argv[1] == 'queue':
+        sys.exit(queue_main(sys.argv[2:]))
     # 检查是否在 GitHub Actions 环境中运行
     if os.environ.get('GITHUB_ACTIONS'):
         auto_run()
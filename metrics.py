@@ -0,0 +1,400 @@
+# 运行指标：以前只有 WARNING 级别的中文日志，看不出一次运行的时间花在了哪里。
+# 这里收集阶段耗时、各域名的请求延迟直方图、计数器（请求、重试、缓存命中、被拒绝的地址），
+# 以及按类型累计的耗时：make_request 中的等待（限速排队、backoff 重试前等待、urllib3 重试前等待）、
+# DNS、建立连接、TLS 握手、下载内容和解析判断。
+# auto_run 结束时写出 JSON 摘要和 Prometheus textfile（node_exporter 的 textfile collector 格式）。
+# PROFILE_MODE 为一次运行打开剖析：cprofile 使用 cProfile（只覆盖调用线程），
+# sample 定时采样所有线程的调用栈，输出可以直接生成火焰图的折叠调用栈
+import bisect
+import contextlib
+import cProfile
+import json
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+import urllib.parse
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+# 是否收集运行指标
+METRICS_ENABLED = True
+
+# JSON 摘要文件
+METRICS_FILE = 'tvbox-metrics.json'
+
+# Prometheus textfile
+METRICS_PROM_FILE = 'tvbox-metrics.prom'
+
+# 剖析模式：off、cprofile 或 sample
+PROFILE_MODE = 'off'
+
+# 剖析结果文件名（不含扩展名）
+PROFILE_FILE = 'tvbox-profile'
+
+# sample 模式的采样间隔（秒）
+PROFILE_INTERVAL = 0.01
+
+# 延迟直方图的桶上限（秒）
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# 单独统计的域名数上限，超过后的域名计入 other，避免标签过多
+MAX_HOST_LABELS = 50
+
+# Prometheus 指标名前缀
+PREFIX = 'tvbox_'
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # 最后一个桶为 +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """按桶上限估算分位数"""
+        rank = q * self.count
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            if total >= rank:
+                return bound
+        return self.buckets[-1]
+
+    def snapshot(self):
+        cumulative = 0
+        buckets = {}
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            cumulative += count
+            buckets[str(bound)] = cumulative
+        return {'count': self.count, 'sum': round(self.sum, 6), 'buckets': buckets,
+                'p50': self.quantile(0.5) if self.count else None,
+                'p99': self.quantile(0.99) if self.count else None}
+
+
+def _label_key(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = time.time()
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+        self._phases = {}
+        self._hosts = set()
+
+    def inc(self, name, value=1, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set_gauge(self, name, value, **labels):
+        with self._lock:
+            self._gauges[(name, _label_key(labels))] = value
+
+    def observe(self, name, value, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def add_phase(self, name, seconds):
+        with self._lock:
+            self._phases[name] = self._phases.get(name, 0.0) + seconds
+
+    def host_label(self, url):
+        """地址的域名标签，超过 MAX_HOST_LABELS 个域名后返回 other"""
+        host = urllib.parse.urlsplit(url).hostname or ''
+        with self._lock:
+            if host in self._hosts:
+                return host
+            if len(self._hosts) < MAX_HOST_LABELS:
+                self._hosts.add(host)
+                return host
+        return 'other'
+
+    def snapshot(self):
+        with self._lock:
+            counters, gauges = dict(self._counters), dict(self._gauges)
+            histograms = {key: histogram.snapshot() for key, histogram in self._histograms.items()}
+            phases = dict(self._phases)
+
+        def group(items):
+            grouped = {}
+            for (name, labels), value in sorted(items.items()):
+                grouped.setdefault(name, []).append({'labels': dict(labels), 'value': value})
+            return grouped
+
+        return {
+            'started_at': self.started,
+            'duration': round(time.time() - self.started, 3),
+            'phases': {name: round(seconds, 3) for name, seconds in phases.items()},
+            'counters': group({key: round(value, 6) for key, value in counters.items()}),
+            'gauges': group(gauges),
+            'histograms': group(histograms),
+        }
+
+    def prometheus(self):
+        """Prometheus 文本格式"""
+        with self._lock:
+            counters, gauges = sorted(self._counters.items()), sorted(self._gauges.items())
+            histograms = sorted((key, (h.buckets, list(h.counts), h.count, h.sum))
+                                for key, h in self._histograms.items())
+            phases = sorted(self._phases.items())
+        lines = []
+        typed = set()
+
+        def declare(name, kind):
+            if name not in typed:
+                typed.add(name)
+                lines.append(f'# TYPE {PREFIX}{name} {kind}')
+
+        declare('run_start_timestamp_seconds', 'gauge')
+        lines.append(f'{PREFIX}run_start_timestamp_seconds {self.started:.3f}')
+        declare('run_duration_seconds', 'gauge')
+        lines.append(f'{PREFIX}run_duration_seconds {time.time() - self.started:.3f}')
+        for name, seconds in phases:
+            declare('phase_seconds', 'gauge')
+            lines.append(f'{PREFIX}phase_seconds{_format_labels((("phase", name),))} {seconds:.6f}')
+        for (name, labels), value in counters:
+            declare(name, 'counter')
+            lines.append(f'{PREFIX}{name}{_format_labels(labels)} {value:g}')
+        for (name, labels), value in gauges:
+            declare(name, 'gauge')
+            lines.append(f'{PREFIX}{name}{_format_labels(labels)} {value:g}')
+        for (name, labels), (buckets, counts, count, total) in histograms:
+            declare(name, 'histogram')
+            cumulative = 0
+            for bound, bucket_count in zip(buckets + ('+Inf',), counts):
+                cumulative += bucket_count
+                lines.append(f'{PREFIX}{name}_bucket{_format_labels(labels, (("le", str(bound)),))} {cumulative}')
+            lines.append(f'{PREFIX}{name}_sum{_format_labels(labels)} {total:.6f}')
+            lines.append(f'{PREFIX}{name}_count{_format_labels(labels)} {count}')
+        return '\n'.join(lines) + '\n'
+
+
+_metrics = Metrics()
+
+
+def get_metrics():
+    return _metrics
+
+
+def reset_metrics():
+    global _metrics
+    _metrics = Metrics()
+    return _metrics
+
+
+def inc(name, value=1, **labels):
+    """累加计数器，例如 inc('requests_total', client='requests', status='2xx')"""
+    if METRICS_ENABLED:
+        _metrics.inc(name, value, **labels)
+
+
+def add_time(kind, seconds):
+    """按类型累计耗时（秒），例如 add_time('rate_limit_wait', 0.5)"""
+    if METRICS_ENABLED:
+        _metrics.inc('time_seconds_total', seconds, kind=kind)
+
+
+def set_gauge(name, value, **labels):
+    if METRICS_ENABLED:
+        _metrics.set_gauge(name, value, **labels)
+
+
+def observe(name, value, **labels):
+    """记录一次观测值到直方图"""
+    if METRICS_ENABLED:
+        _metrics.observe(name, value, **labels)
+
+
+def observe_request(client, url, seconds, status):
+    """记录一次 HTTP 请求：按域名的延迟直方图和按状态分类的请求数"""
+    if not METRICS_ENABLED:
+        return
+    status = f"{status // 100}xx" if isinstance(status, int) else status
+    _metrics.observe('request_seconds', seconds, client=client, host=_metrics.host_label(url))
+    _metrics.inc('requests_total', client=client, status=status)
+
+
+@contextlib.contextmanager
+def phase(name):
+    """记录一个阶段的耗时；阶段可以嵌套或重叠（例如搜索和验证同时进行），各自记录墙钟时间"""
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        if METRICS_ENABLED:
+            _metrics.add_phase(name, time.monotonic() - start)
+
+
+def aiohttp_trace_config():
+    """aiohttp 的 TraceConfig：记录每个请求的 DNS、建立连接（含 TLS）和收到响应头的耗时"""
+    import aiohttp
+
+    async def on_request_start(session, ctx, params):
+        ctx.start = time.monotonic()
+        ctx.dns = 0.0
+
+    async def on_request_end(session, ctx, params):
+        observe_request('aiohttp', str(params.url), time.monotonic() - ctx.start, params.response.status)
+
+    async def on_request_exception(session, ctx, params):
+        observe_request('aiohttp', str(params.url), time.monotonic() - ctx.start, 'error')
+
+    async def on_dns_start(session, ctx, params):
+        ctx.dns_start = time.monotonic()
+
+    async def on_dns_end(session, ctx, params):
+        ctx.dns = time.monotonic() - ctx.dns_start
+        add_time('dns', ctx.dns)
+
+    async def on_dns_cache_hit(session, ctx, params):
+        inc('cache_total', cache='dns', result='hit')
+
+    async def on_connection_start(session, ctx, params):
+        ctx.dns = 0.0
+        ctx.connect_start = time.monotonic()
+
+    async def on_connection_end(session, ctx, params):
+        # aiohttp 的建立连接包含 DNS 解析，这里去掉已单独统计的部分
+        add_time('connect', max(time.monotonic() - ctx.connect_start - ctx.dns, 0.0))
+
+    async def on_connection_reuse(session, ctx, params):
+        inc('pool_total', event='reused')
+
+    trace = aiohttp.TraceConfig()
+    trace.on_request_start.append(on_request_start)
+    trace.on_request_end.append(on_request_end)
+    trace.on_request_exception.append(on_request_exception)
+    trace.on_dns_resolvehost_start.append(on_dns_start)
+    trace.on_dns_resolvehost_end.append(on_dns_end)
+    trace.on_dns_cache_hit.append(on_dns_cache_hit)
+    trace.on_connection_create_start.append(on_connection_start)
+    trace.on_connection_create_end.append(on_connection_end)
+    trace.on_connection_reuseconn.append(on_connection_reuse)
+    return trace
+
+
+class SamplingProfiler:
+    """定时采样所有线程的调用栈，按折叠调用栈（函数;函数;... 次数）计数"""
+
+    def __init__(self, interval=PROFILE_INTERVAL):
+        self.interval = interval
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                self.samples[';'.join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def write(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+@contextlib.contextmanager
+def profiling(mode=None, path=None):
+    """按 PROFILE_MODE 剖析 with 块中的代码，结束后写出结果文件"""
+    mode = (mode or PROFILE_MODE or 'off').lower()
+    path = path or PROFILE_FILE
+    if mode == 'cprofile':
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            profiler.dump_stats(f"{path}.prof")
+            with open(f"{path}.txt", 'w', encoding='utf-8') as f:
+                pstats.Stats(profiler, stream=f).sort_stats('cumulative').print_stats(50)
+            logger.warning(f"cProfile 剖析结果已保存到 {path}.prof 和 {path}.txt")
+    elif mode == 'sample':
+        profiler = SamplingProfiler()
+        profiler.start()
+        try:
+            yield
+        finally:
+            profiler.stop()
+            profiler.write(f"{path}.txt")
+            logger.warning(f"采样剖析结果（{sum(profiler.samples.values())} 个样本）已保存到 {path}.txt")
+    else:
+        if mode != 'off':
+            logger.warning(f"未知的剖析模式: {mode}")
+        yield
+
+
+def _write_atomic(path, text):
+    # textfile collector 可能随时读取，先写临时文件再替换
+    tmp = f"{path}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+def export_metrics(json_file=None, prom_file=None):
+    """写出 JSON 摘要和 Prometheus textfile，并在日志中输出阶段耗时和耗时分布"""
+    if not METRICS_ENABLED:
+        return None
+    snapshot = _metrics.snapshot()
+    json_file = json_file or METRICS_FILE
+    prom_file = prom_file or METRICS_PROM_FILE
+    try:
+        _write_atomic(json_file, json.dumps(snapshot, ensure_ascii=False, indent=2))
+        _write_atomic(prom_file, _metrics.prometheus())
+    except OSError as e:
+        logger.error(f"无法写出运行指标: {e}")
+        return snapshot
+    phases = '，'.join(f"{name} {seconds:.1f} 秒" for name, seconds in snapshot['phases'].items())
+    times = sorted(((item['labels']['kind'], item['value'])
+                    for item in snapshot['counters'].get('time_seconds_total', ())), key=lambda item: -item[1])
+    logger.warning(f"运行指标：总耗时 {snapshot['duration']:.1f} 秒；阶段：{phases or '无'}")
+    if times:
+        logger.warning("耗时分布（各线程累计）：" + '，'.join(f"{kind} {seconds:.1f} 秒" for kind, seconds in times))
+    logger.warning(f"运行指标已保存到 {json_file} 和 {prom_file}")
+    return snapshot
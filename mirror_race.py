@@ -0,0 +1,254 @@
+# GitHub 文件的镜像竞速：很多配置在 raw.githubusercontent.com 上，同一个文件还可以经由 jsDelivr、
+# ghproxy 一类代理和 kkgithub 获取，其中某一个在运行环境中可能很慢或被屏蔽。
+# 规范地址（见 url_canon）映射为各镜像的地址，按历史表现排序后依次发起请求，相邻两个请求间隔 MIRROR_STAGGER 秒
+# （前一个失败时立即发起下一个），第一个成功的响应获胜，其余请求取消（同步版本通过每次竞速的取消令牌
+# 中断已经开始的请求和内容读取）。镜像都是 CDN 或代理，不计入按域名的请求冷却（见 MIRROR_HOSTS）。
+# 每次竞速的结果按源域名记录到 MIRROR_FILE，下次运行优先尝试最快的镜像；保存和发布的地址仍是规范地址
+import asyncio
+import concurrent.futures
+import json
+import logging
+import os
+import threading
+import time
+import urllib.parse
+
+from cancellation import CANCEL_POLL, CancelToken, Cancelled, use_token
+
+logger = logging.getLogger(__name__)
+
+# 是否对 GitHub 文件启用镜像竞速
+MIRROR_RACING = True
+
+# 相邻两个镜像请求之间的间隔（秒）
+MIRROR_STAGGER = 0.3
+
+# 每次最多竞速的镜像数
+MAX_MIRRORS = 3
+
+# 各镜像历史表现的保存文件
+MIRROR_FILE = 'tvbox-mirrors.json'
+
+# 镜像失败时计入的耗时（秒），失败多的镜像排到后面
+MIRROR_FAILURE_PENALTY = 10
+
+# 没有记录的镜像按这个耗时（秒）排序，排在表现好的镜像之后、经常失败的镜像之前
+MIRROR_DEFAULT_SCORE = 1.0
+
+# 耗时的指数加权平均系数
+MIRROR_EWMA_ALPHA = 0.3
+
+# raw.githubusercontent.com 文件的镜像地址模板，按默认优先顺序排列
+GITHUB_RAW_MIRRORS = {
+    'raw.githubusercontent.com': 'https://raw.githubusercontent.com/{user}/{repo}/{ref}/{path}',
+    'cdn.jsdelivr.net': 'https://cdn.jsdelivr.net/gh/{user}/{repo}{at_ref}/{path}',
+    'fastly.jsdelivr.net': 'https://fastly.jsdelivr.net/gh/{user}/{repo}{at_ref}/{path}',
+    'ghproxy.net': 'https://ghproxy.net/https://raw.githubusercontent.com/{user}/{repo}/{ref}/{path}',
+    'raw.kkgithub.com': 'https://raw.kkgithub.com/{user}/{repo}/{ref}/{path}',
+}
+
+# 所有镜像的域名，请求调度器对它们不做按域名的冷却（竞速中落败的请求不会让该镜像的下一个请求等待）
+MIRROR_HOSTS = frozenset(GITHUB_RAW_MIRRORS)
+
+
+class MirrorStats:
+    def __init__(self, path=MIRROR_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        # 源域名 -> 镜像 -> {'wins': 获胜次数, 'failures': 失败次数, 'score': 耗时的加权平均}
+        self._mirrors = {}
+        self.stats = {'races': 0, 'failovers': 0}
+        if path and os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self._mirrors = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.error(f"无法读取镜像记录 {path}: {e}")
+
+    def rank(self, origin, names):
+        """按历史表现排序镜像，分数相同时保持默认顺序"""
+        with self._lock:
+            records = self._mirrors.get(origin, {})
+            return sorted(names, key=lambda name: records.get(name, {}).get('score', MIRROR_DEFAULT_SCORE))
+
+    def _update(self, origin, name, field, seconds):
+        with self._lock:
+            record = self._mirrors.setdefault(origin, {}).setdefault(name, {'wins': 0, 'failures': 0})
+            record[field] += 1
+            score = record.get('score')
+            record['score'] = round(seconds if score is None else
+                                    score + MIRROR_EWMA_ALPHA * (seconds - score), 3)
+
+    def record_win(self, origin, name, seconds, first):
+        self._update(origin, name, 'wins', seconds)
+        with self._lock:
+            self.stats['races'] += 1
+            if not first:
+                self.stats['failovers'] += 1
+
+    def record_failure(self, origin, name):
+        self._update(origin, name, 'failures', MIRROR_FAILURE_PENALTY)
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            data = json.dumps(self._mirrors, ensure_ascii=False, indent=2, sort_keys=True)
+        try:
+            tmp = f"{self.path}.tmp"
+            with open(tmp, 'w', encoding='utf-8') as f:
+                f.write(data)
+            os.replace(tmp, self.path)
+        except OSError as e:
+            logger.error(f"无法保存镜像记录 {self.path}: {e}")
+
+    def log_stats(self):
+        with self._lock:
+            ranking = {origin: sorted(records, key=lambda name: records[name].get('score', MIRROR_DEFAULT_SCORE))
+                       for origin, records in self._mirrors.items()}
+        logger.warning(
+            f"镜像竞速：{self.stats['races']} 次成功获取，其中 {self.stats['failovers']} 次由排在后面的镜像获胜。")
+        for origin, names in ranking.items():
+            logger.info(f"镜像排序 {origin}: {names}")
+
+
+_stats = None
+_stats_lock = threading.Lock()
+
+
+def get_mirror_stats():
+    global _stats
+    with _stats_lock:
+        if _stats is None:
+            _stats = MirrorStats(MIRROR_FILE)
+        return _stats
+
+
+def mirror_candidates(url, max_mirrors=None):
+    """返回 [(镜像名, 地址), ...]，按历史表现排序；不是 GitHub 文件或未启用竞速时只有原地址"""
+    parts = urllib.parse.urlsplit(url)
+    segments = [s for s in parts.path.split('/') if s]
+    if (not MIRROR_RACING or parts.hostname != 'raw.githubusercontent.com'
+            or len(segments) < 4 or parts.query):
+        return [(parts.hostname or '', url)]
+    user, repo, ref = segments[:3]
+    fields = {'user': user, 'repo': repo, 'ref': ref, 'at_ref': '' if ref == 'HEAD' else f"@{ref}",
+              'path': '/'.join(segments[3:])}
+    names = get_mirror_stats().rank(parts.hostname, list(GITHUB_RAW_MIRRORS))
+    max_mirrors = MAX_MIRRORS if max_mirrors is None else max_mirrors
+    return [(name, GITHUB_RAW_MIRRORS[name].format(**fields)) for name in names[:max_mirrors]]
+
+
+def response_ok(result):
+    """镜像返回了这个文件（内容是否为 TVBox 配置与镜像无关）"""
+    return result.status in (200, 304)
+
+
+async def race_async(url, candidates, fetch, is_ok=response_ok, stagger=None):
+    """依次发起 fetch(镜像地址) 协程，第一个 is_ok 的结果获胜，取消其余请求。
+    全部失败时返回第一个完成的结果（例如 404），都出错时抛出第一个异常"""
+    if len(candidates) == 1:
+        return await fetch(candidates[0][1])
+    stagger = MIRROR_STAGGER if stagger is None else stagger
+    mirror_stats = get_mirror_stats()
+    origin = urllib.parse.urlsplit(url).hostname
+    start = time.monotonic()
+    remaining = list(candidates)
+    tasks = {}
+    pending = set()
+    fallback = error = None
+    try:
+        while remaining or pending:
+            if remaining:
+                name, mirror_url = remaining.pop(0)
+                task = asyncio.ensure_future(fetch(mirror_url))
+                tasks[task] = name
+                pending.add(task)
+            done, pending = await asyncio.wait(
+                pending, timeout=stagger if remaining else None, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                name = tasks[task]
+                if task.exception() is None and is_ok(task.result()):
+                    mirror_stats.record_win(origin, name, time.monotonic() - start, name == candidates[0][0])
+                    return task.result()
+                mirror_stats.record_failure(origin, name)
+                if task.exception() is not None:
+                    error = error or task.exception()
+                elif fallback is None:
+                    fallback = task.result()
+    finally:
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+    if fallback is not None:
+        return fallback
+    raise error
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = concurrent.futures.ThreadPoolExecutor(max_workers=MAX_MIRRORS * 4,
+                                                              thread_name_prefix='mirror-race')
+        return _executor
+
+
+def _fetch_with_token(fetch, mirror_url, token):
+    # 请求和内容读取通过当前线程的令牌检查是否已取消（见 cancellation.use_token）
+    with use_token(token):
+        return fetch(mirror_url)
+
+
+def race(url, candidates, fetch, is_ok=response_ok, stagger=None, token=None):
+    """race_async 的同步版本，fetch(镜像地址) 在线程池中执行；token 被取消时抛出 Cancelled。
+    竞速结束时取消本次竞速的令牌，落败的请求即使已经开始也会在排队、重试或读取内容时停止"""
+    if len(candidates) == 1:
+        return fetch(candidates[0][1])
+    stagger = MIRROR_STAGGER if stagger is None else stagger
+    mirror_stats = get_mirror_stats()
+    origin = urllib.parse.urlsplit(url).hostname
+    race_token = token.child() if token is not None else CancelToken()
+    start = time.monotonic()
+    remaining = list(candidates)
+    futures = {}
+    pending = set()
+    fallback = error = None
+    try:
+        while remaining or pending:
+            if remaining:
+                name, mirror_url = remaining.pop(0)
+                future = _get_executor().submit(_fetch_with_token, fetch, mirror_url, race_token)
+                futures[future] = name
+                pending.add(future)
+            launched = time.monotonic()
+            done = set()
+            while not done and (not remaining or time.monotonic() - launched < stagger):
+                race_token.check()
+                wait = CANCEL_POLL if not remaining else min(CANCEL_POLL, max(stagger - (time.monotonic() - launched), 0))
+                done, pending = concurrent.futures.wait(
+                    pending, timeout=wait, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                name = futures[future]
+                if future.exception() is None and is_ok(future.result()):
+                    mirror_stats.record_win(origin, name, time.monotonic() - start, name == candidates[0][0])
+                    return future.result()
+                if isinstance(future.exception(), Cancelled):
+                    raise future.exception()
+                mirror_stats.record_failure(origin, name)
+                if future.exception() is not None:
+                    error = error or future.exception()
+                elif fallback is None:
+                    fallback = future.result()
+    finally:
+        for future in pending:
+            future.cancel()
+        race_token.cancel('镜像竞速已结束')
+    if fallback is not None:
+        return fallback
+    raise error
@@ -0,0 +1,180 @@
+# 多仓配置展开：很多地址是“多仓”索引文件（JSON 中的 urls 或 storeHouse 列表指向其他配置，还可以再嵌套），
+# 验证时它们没有 sites/lives/spider 键而被判为无效。这里按层并发获取嵌套的配置，每个叶子配置作为单独的地址验证。
+# 每个地址只获取一次（结果写入验证缓存，下次运行也不必重新获取），指回祖先的链接视为循环跳过，
+# 展开深度、每个索引的子配置数和一次运行展开的总地址数都有上限
+import asyncio
+import logging
+import urllib.parse
+
+import aiohttp
+
+from async_validator import match_keywords, PER_HOST_LIMIT, VALIDATE_TIMEOUT
+from body_reader import MAX_BODY_BYTES, decode_body, read_response_async
+from config_parser import TVBOX_KEYS, find_top_level_key, loads_lenient
+from http_cache import check_with_cache_async
+from metrics import aiohttp_trace_config
+from host_health import CircuitOpen, get_tracker, tracked_get, trace_config
+import parse_pool
+from url_canon import canonicalize_url
+
+logger = logging.getLogger(__name__)
+
+# 是否展开多仓配置
+EXPAND_MULTI_REPO = True
+
+# 最大展开深度（索引 -> 配置为 1 层）
+MAX_EXPAND_DEPTH = 3
+
+# 每个索引最多展开的子配置数
+MAX_CHILDREN_PER_INDEX = 100
+
+# 一次运行最多展开的地址数
+MAX_EXPANDED_URLS = 2000
+
+# 同时进行的请求数
+EXPAND_CONCURRENCY = 50
+
+
+def _child_url(item):
+    if isinstance(item, str):
+        return item
+    if isinstance(item, dict):
+        return item.get('url') or item.get('sourceUrl')
+    return None
+
+
+def index_children(config, base_url=''):
+    """返回多仓索引中的子配置地址，不是索引时返回空列表"""
+    children = []
+    for key in ('urls', 'storeHouse'):
+        items = config.get(key)
+        if not isinstance(items, list):
+            continue
+        for item in items:
+            url = _child_url(item)
+            if not isinstance(url, str):
+                continue
+            url = url.strip()
+            if url.startswith(('./', '../')):
+                url = urllib.parse.urljoin(base_url, url)
+            if url.startswith(('http://', 'https://')):
+                children.append(url)
+    return list(dict.fromkeys(children))
+
+
+def parse_node_body(body, encoding=None):
+    """解码后宽松解析一次（在解析进程中执行），返回 (配置 dict 或 None, 不是配置时的判定结果)。
+    不是 JSON 时不再重新解析，直接按顶层键和关键字判断"""
+    text = decode_body(body, encoding)
+    try:
+        config = loads_lenient(text)
+    except ValueError:
+        return None, 'valid' if find_top_level_key(text) else match_keywords(text)
+    if not isinstance(config, dict):
+        return None, None
+    return config, None
+
+
+class MultiRepoExpander:
+    def __init__(self, max_depth=MAX_EXPAND_DEPTH, max_children=MAX_CHILDREN_PER_INDEX,
+                 max_urls=MAX_EXPANDED_URLS, concurrency=EXPAND_CONCURRENCY, per_host=PER_HOST_LIMIT,
+                 timeout=VALIDATE_TIMEOUT, max_body_bytes=MAX_BODY_BYTES):
+        self.max_depth = max_depth
+        self.max_children = max_children
+        self.max_urls = max_urls
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.timeout = timeout
+        self.max_body_bytes = max_body_bytes
+        self._sem = None
+        self.stats = {'indexes': 0, 'leaves': 0, 'cycles': 0, 'shared': 0,
+                      'trimmed': 0, 'too_deep': 0, 'over_budget': 0}
+
+    async def _node(self, session, url):
+        """获取一个地址，返回 {'children': [子地址, ...]}（索引）或 {'verdict': 判定结果}（配置）"""
+        async def fetch(headers):
+            await get_tracker().acquire_async(url)
+            async with self._sem:
+                async with tracked_get(session, url, self.timeout, headers=headers) as response:
+                    return await read_response_async(response, self.max_body_bytes, stop_on_key=False)
+
+        async def judge(result):
+            if result.status != 200 or result.body is None or result.body.truncated:
+                return {'verdict': None}
+            # 在解析进程中解析，不阻塞事件循环
+            config, verdict = await parse_pool.run_async(parse_node_body, result.body.body, result.encoding)
+            if config is None:
+                return {'verdict': verdict}
+            children = index_children(config, url)
+            if children:
+                return {'children': children}
+            # 已经解析过，直接按顶层键判定，不再重新解析
+            return {'verdict': 'valid' if any(key in config for key in TVBOX_KEYS) else None}
+
+        try:
+            return await check_with_cache_async('expand', url, fetch, judge) or {'verdict': None}
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError, CircuitOpen) as e:
+            logger.debug(f"展开多仓配置出错: {url} - {e!r}")
+            return {'verdict': None}
+
+    async def run(self, urls, token=None, known=()):
+        """按层展开，返回叶子配置的 {地址: 判定结果}；不是索引的根地址不包含在内。
+        known 中的地址（已经单独验证过）不再获取"""
+        self._sem = asyncio.Semaphore(self.concurrency)
+        roots = list(dict.fromkeys(urls))
+        visited = set(known) | set(roots)
+        leaves = {}
+        expanded = 0
+        level = [(url, (url,)) for url in roots]
+        connector = aiohttp.TCPConnector(limit=self.concurrency, limit_per_host=self.per_host)
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout,
+                                         trace_configs=[aiohttp_trace_config(), trace_config()]) as session:
+            for depth in range(self.max_depth + 1):
+                if not level or (token is not None and token.cancelled):
+                    break
+                nodes = await asyncio.gather(*(self._node(session, url) for url, _ in level))
+                next_level = []
+                for (url, path), node in zip(level, nodes):
+                    if 'children' not in node:
+                        if depth > 0:
+                            leaves[url] = node['verdict']
+                        continue
+                    self.stats['indexes'] += 1
+                    children = node['children']
+                    if len(children) > self.max_children:
+                        self.stats['trimmed'] += len(children) - self.max_children
+                        children = children[:self.max_children]
+                    if depth == self.max_depth:
+                        self.stats['too_deep'] += len(children)
+                        continue
+                    for child in map(canonicalize_url, children):
+                        if child in path:
+                            # 指回祖先：循环引用
+                            self.stats['cycles'] += 1
+                        elif child in visited:
+                            # 被多个索引共享的子树只展开一次
+                            self.stats['shared'] += 1
+                        elif expanded >= self.max_urls:
+                            self.stats['over_budget'] += 1
+                        else:
+                            expanded += 1
+                            visited.add(child)
+                            next_level.append((child, path + (child,)))
+                level = next_level
+        self.stats['leaves'] = len(leaves)
+        return leaves
+
+    def log_stats(self):
+        logger.warning(
+            f"多仓展开：{self.stats['indexes']} 个索引，展开 {self.stats['leaves']} 个配置，"
+            f"循环引用 {self.stats['cycles']} 次，共享子配置 {self.stats['shared']} 次，"
+            f"超出数量上限 {self.stats['trimmed'] + self.stats['over_budget']} 个，超出深度 {self.stats['too_deep']} 个。")
+
+
+def expand_multi_repo(urls, token=None, known=(), **options):
+    """同步入口：展开多仓索引，返回叶子配置的 {地址: 'valid'、'possible' 或 None}"""
+    expander = MultiRepoExpander(**options)
+    leaves = asyncio.run(expander.run(urls, token, known))
+    expander.log_stats()
+    return leaves
@@ -0,0 +1,145 @@
+# 解析进程池：把下载之后的 CPU 密集工作（解析 JSON 配置、匹配关键字、从页面提取链接）交给单独的进程，
+# 代替在共用一个 GIL 的线程里解析，线程再多也只能用到一个核的做法。
+# 请求仍在线程/协程中进行，得到内容后调用 run(函数, 内容, ...) 或 await run_async(...)：
+# 内容较小时直接在当前线程中解析（进程间传递的开销比解析本身还大），
+# 较大的内容复制一次到共享内存，解析进程直接从共享内存解码，不再经过 pickle 和管道复制。
+# 只在支持 fork 的系统上启用，进程池在开始验证之前预先启动（start()），避免在多线程运行时才 fork；
+# 不支持 fork 的系统（Windows 打包的程序等）照常在当前线程中解析
+import asyncio
+import concurrent.futures
+import logging
+import multiprocessing
+import threading
+import time
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import resource_tracker, shared_memory
+
+from metrics import add_time, inc
+
+logger = logging.getLogger(__name__)
+
+# 解析进程数，0 表示不使用进程池，在调用线程中解析
+PARSE_WORKERS = 2
+
+# 内容不少于该字节数时才交给解析进程
+PARSE_POOL_MIN_BYTES = 64 * 1024
+
+_pool = None
+_pool_lock = threading.Lock()
+
+# 不支持 fork 或进程池出错后不再尝试启动，之后都在调用线程中解析
+_inline_only = False
+
+
+def _noop():
+    return None
+
+
+def _run_shared(func, name, size, args):
+    """在解析进程中执行：从共享内存读取内容，调用 func(内容, *args)"""
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        with shm.buf[:size] as body:
+            return func(body, *args)
+    finally:
+        shm.close()
+
+
+def start(workers=None):
+    """启动解析进程池（已启动或未启用时不做任何事），返回进程池或 None"""
+    global _pool, _inline_only
+    workers = PARSE_WORKERS if workers is None else workers
+    with _pool_lock:
+        if _pool is not None or _inline_only or workers <= 0:
+            return _pool
+        if 'fork' not in multiprocessing.get_all_start_methods():
+            logger.info("当前系统不支持 fork，在调用线程中解析内容")
+            _inline_only = True
+            return None
+        # 先启动共享内存的资源跟踪进程，解析进程继承同一个跟踪进程，
+        # 否则每个解析进程各自启动一个，退出时会把父进程还在使用的共享内存当作泄漏清理掉
+        resource_tracker.ensure_running()
+        _pool = concurrent.futures.ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context('fork'))
+        # 提交一个空任务，让所有解析进程现在就启动
+        _pool.submit(_noop).result()
+        logger.info(f"已启动 {workers} 个解析进程")
+        return _pool
+
+
+def shutdown():
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def _reset(pool, error):
+    global _pool, _inline_only
+    logger.error(f"解析进程池异常，改为在当前线程中解析: {error!r}")
+    with _pool_lock:
+        _inline_only = True
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _offload(body):
+    """返回应使用的进程池，内容较小或未启用时返回 None"""
+    if PARSE_WORKERS <= 0 or len(body) < PARSE_POOL_MIN_BYTES:
+        return None
+    return start()
+
+
+def _share(body):
+    shm = shared_memory.SharedMemory(create=True, size=len(body))
+    shm.buf[:len(body)] = body
+    return shm
+
+
+def _release(shm):
+    shm.close()
+    shm.unlink()
+
+
+def run(func, body, *args):
+    """执行 func(body, *args) 并返回结果；func 必须是模块级函数，body 可能以 memoryview 传入，func 不能保留它"""
+    start_time = time.monotonic()
+    try:
+        pool = _offload(body)
+        if pool is not None:
+            shm = _share(body)
+            try:
+                result = pool.submit(_run_shared, func, shm.name, len(body), args).result()
+                inc('parse_total', mode='process')
+                return result
+            except BrokenProcessPool as e:
+                _reset(pool, e)
+            finally:
+                _release(shm)
+        inc('parse_total', mode='inline')
+        return func(body, *args)
+    finally:
+        add_time('parse', time.monotonic() - start_time)
+
+
+async def run_async(func, body, *args):
+    """run 的异步版本：交给解析进程时不阻塞事件循环"""
+    start_time = time.monotonic()
+    try:
+        pool = _offload(body)
+        if pool is not None:
+            shm = _share(body)
+            try:
+                result = await asyncio.wrap_future(pool.submit(_run_shared, func, shm.name, len(body), args))
+                inc('parse_total', mode='process')
+                return result
+            except BrokenProcessPool as e:
+                _reset(pool, e)
+            finally:
+                _release(shm)
+        inc('parse_total', mode='inline')
+        return func(body, *args)
+    finally:
+        add_time('parse', time.monotonic() - start_time)
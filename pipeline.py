@@ -0,0 +1,165 @@
+# 搜索 → 去重 → 验证 → 保存 的流式流水线，代替“搜索完写 tvbox-url.txt，再读回文件验证”的做法
+# 搜索每找到一个规范化的地址就放入队列（规范化在搜索中完成，见 url_canon），去重后立即交给异步验证器，验证结果分批写入结果库，
+# 验证与搜索同时进行。各阶段之间是有界队列：下游处理不过来时上游的 put 会阻塞（背压），内存占用有上限。
+# 取消令牌被取消（Ctrl+C）时，前面的阶段立即停止，保存阶段仍会把已得到的结果全部写入结果库。
+# 传入检查点日志（run_journal）时，去重后的地址在验证之前记为已发现，每批结果写入结果库之后记为已完成；
+# 从检查点继续时，上次已完成的地址不再验证，判定结果直接计入本次运行
+import asyncio
+import logging
+import queue
+import threading
+import time
+
+from async_validator import AsyncValidator
+from cancellation import Cancelled, root_token
+
+logger = logging.getLogger(__name__)
+
+# 每个阶段之间队列的最大长度
+PIPELINE_QUEUE_SIZE = 1000
+
+# 结果库每次写入的最大条数
+PERSIST_BATCH_SIZE = 50
+
+# 没有凑满一批时，最多等待多久（秒）就写入
+PERSIST_INTERVAL = 2
+
+# 队列结束标记
+_DONE = object()
+
+
+class ValidationPipeline:
+    def __init__(self, store, queue_size=PIPELINE_QUEUE_SIZE, token=None, journal=None, **validator_options):
+        self.store = store
+        # 流水线自己的子令牌：任何一个阶段出错时取消它，其余阶段和上游的队列操作随之停止，不会永远阻塞
+        self.token = (token or root_token()).child()
+        # 第一个出错阶段的异常，join() 时重新抛出
+        self.error = None
+        self.journal = journal
+        self.validator = AsyncValidator(**validator_options)
+        self._found = queue.Queue(queue_size)        # 搜索 → 去重
+        self._to_validate = queue.Queue(queue_size)  # 去重 → 验证
+        self._results = queue.Queue(queue_size)      # 验证 → 保存
+        self._threads = []
+        self.tested = 0
+        self.valid = 0
+        self.valid_urls = []
+        self.invalid_urls = []
+        self.new_urls = []
+        # 上次运行已完成的 {地址: 判定结果}
+        self._completed = dict(journal.completed) if journal is not None else {}
+        for url, status in self._completed.items():
+            self._count(url, status != 'invalid')
+
+    def _count(self, url, valid):
+        self.tested += 1
+        if valid:
+            self.valid += 1
+            self.valid_urls.append(url)
+        else:
+            self.invalid_urls.append(url)
+
+    def submit(self, url):
+        """上游（搜索）调用：放入一个新发现的规范地址，队列已满时阻塞，取消时抛出 Cancelled"""
+        self.token.put(self._found, url)
+
+    def close(self):
+        """上游不再产生地址"""
+        try:
+            self.token.put(self._found, _DONE)
+        except Cancelled:
+            # 去重阶段已经随令牌停止
+            pass
+
+    def start(self):
+        for name, target in (('dedupe', self._dedupe_stage),
+                             ('validate', self._validate_stage),
+                             ('persist', self._persist_stage)):
+            thread = threading.Thread(target=target, name=f"pipeline-{name}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def join(self):
+        """等待所有阶段处理完毕；有阶段出错时抛出它的异常"""
+        for thread in self._threads:
+            thread.join()
+        if self.error is not None:
+            raise self.error
+
+    def _fail(self, stage, error):
+        logger.error(f"{stage}阶段出错: {error!r}")
+        if self.error is None:
+            self.error = error
+        self.token.cancel(f"{stage}阶段出错")
+
+    def _dedupe_stage(self):
+        seen = set(self._completed)
+        try:
+            while True:
+                url = self.token.get(self._found)
+                if url is _DONE:
+                    self.token.put(self._to_validate, _DONE)
+                    return
+                if url in seen:
+                    continue
+                seen.add(url)
+                if self.journal is not None:
+                    self.journal.found(url)
+                self.token.put(self._to_validate, url)
+        except Cancelled:
+            # 验证阶段也会随令牌停止，不需要再传递结束标记
+            pass
+        except Exception as e:
+            self._fail('去重', e)
+
+    def _validate_stage(self):
+        try:
+            asyncio.run(self.validator.run_stream(self._to_validate, self._results, _DONE, self.token))
+        except Exception as e:
+            self._fail('验证', e)
+            # 保存阶段仍在运行（出错时也会继续取出结果），这里不会阻塞
+            self._results.put(_DONE)
+
+    def _persist_stage(self):
+        try:
+            self._persist()
+        except Exception as e:
+            self._fail('保存', e)
+            # 继续取出结果直到结束标记，验证阶段放入结果时不会因队列已满而阻塞
+            while self._results.get() is not _DONE:
+                pass
+
+    def _persist(self):
+        batch = {}
+        # 当前一批中第一个结果到达的时间，结果陆续到达时也不会等待超过 PERSIST_INTERVAL 秒
+        batch_started = None
+        while True:
+            timeout = PERSIST_INTERVAL
+            if batch_started is not None:
+                timeout = max(0, batch_started + PERSIST_INTERVAL - time.monotonic())
+            try:
+                item = self._results.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            if item is not None and item is not _DONE:
+                url, verdict = item
+                if not batch:
+                    batch_started = time.monotonic()
+                batch[url] = verdict or 'invalid'
+                self._count(url, bool(verdict))
+            if batch and (item is None or item is _DONE or len(batch) >= PERSIST_BATCH_SIZE
+                          or time.monotonic() - batch_started >= PERSIST_INTERVAL):
+                self.new_urls.extend(self.store.record(batch))
+                # 验证器在放入结果之前已记录性能数据
+                measurements = {url: self.validator.measurements.pop(url) for url in batch
+                                if url in self.validator.measurements}
+                if measurements:
+                    self.store.record_performance(measurements)
+                # 写入结果库之后才记为已完成，中断在两者之间时下次重新验证这一批
+                if self.journal is not None:
+                    self.journal.done(batch)
+                batch = {}
+                batch_started = None
+            if item is _DONE:
+                return
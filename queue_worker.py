@@ -0,0 +1,99 @@
+# 分布式验证的工作进程和结果收集（队列见 work_queue）。
+# run_worker 循环从队列领取一批地址，用异步验证器验证，验证期间由后台线程定时发送心跳，
+# 验证完把判定结果和性能数据交回队列；队列中暂时没有可领取的地址、但其他工作进程还持有租约时继续等待，
+# 以便在它们中断后接手到期的地址，全部完成后退出。每个工作进程互不依赖，可以在同一台机器上启动多个，
+# 也可以在多台机器上运行（此时需要它们都能访问的队列后端）。
+# collect 把队列中已完成的结果分批写入结果库（新的有效地址追加到 tvbox-source.txt），只应由一个进程执行
+import logging
+import os
+import socket
+import threading
+
+from async_validator import Measurement, check_urls
+from cancellation import Cancelled, root_token
+from metrics import inc
+
+logger = logging.getLogger(__name__)
+
+# 队列中没有可领取的地址、但仍有其他工作进程在验证时，再次尝试领取的间隔（秒）
+QUEUE_POLL_INTERVAL = 5
+
+# 每次写入结果库的条数
+COLLECT_BATCH_SIZE = 500
+
+
+def worker_name():
+    """工作进程的名称（主机名:进程号），用作租约的持有者"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _heartbeat(queue, worker, lease_seconds, stop):
+    # 租约时长的三分之一发送一次心跳，错过一两次也不会到期
+    while not stop.wait(lease_seconds / 3):
+        try:
+            queue.heartbeat(worker, lease_seconds)
+        except Exception as e:
+            logger.error(f"发送心跳失败: {e!r}")
+
+
+def run_worker(queue, batch_size, lease_seconds, token=None, worker=None, **validator_options):
+    """领取并验证队列中的地址，直到全部完成或 token 被取消；返回本进程验证的地址数"""
+    token = token or root_token()
+    worker = worker or worker_name()
+    checked = 0
+    logger.warning(f"工作进程 {worker} 开始领取地址")
+    while not token.cancelled:
+        urls = queue.claim(worker, batch_size, lease_seconds)
+        if not urls:
+            if not queue.stats()['leased']:
+                break
+            # 其他工作进程还在验证，它们中断时租约到期后由这里接手
+            try:
+                token.sleep(QUEUE_POLL_INTERVAL)
+            except Cancelled:
+                break
+            continue
+        stop = threading.Event()
+        heartbeat = threading.Thread(
+            target=_heartbeat, args=(queue, worker, lease_seconds, stop), name='queue-heartbeat', daemon=True)
+        heartbeat.start()
+        measurements = {}
+        try:
+            # 取消时只返回已完成的地址
+            verdicts = check_urls(urls, token=token, measurements=measurements, **validator_options)
+        finally:
+            stop.set()
+            heartbeat.join()
+        queue.complete(worker, {url: (verdict or 'invalid', measurements.get(url))
+                                for url, verdict in verdicts.items()})
+        unfinished = [url for url in urls if url not in verdicts]
+        if unfinished:
+            queue.release(worker, unfinished)
+        checked += len(verdicts)
+        inc('queue_items_total', len(verdicts), result='done')
+        logger.info(f"工作进程 {worker} 完成 {len(verdicts)} 个地址，共 {checked} 个")
+    logger.warning(f"工作进程 {worker} 结束，共验证 {checked} 个地址")
+    return checked
+
+
+def collect(queue, store, batch_size=COLLECT_BATCH_SIZE):
+    """把已完成的结果写入结果库，返回 (写入的地址数, 有效地址数, 新追加到输出文件的地址列表)"""
+    recorded = valid = 0
+    new_urls = []
+    while True:
+        rows = queue.results(batch_size)
+        if not rows:
+            break
+        new_urls += store.record({url: status for url, status, _ in rows})
+        store.record_performance({url: Measurement(*measurement) for url, _, measurement in rows
+                                  if measurement is not None})
+        queue.mark_reported([url for url, _, _ in rows])
+        recorded += len(rows)
+        valid += sum(1 for _, status, _ in rows if status != 'invalid')
+    failed = queue.failed()
+    if failed:
+        # 多次领取都没有完成（工作进程反复崩溃或被终止），不作为验证结果记录
+        logger.warning(f"{len(failed)} 个地址多次领取后仍未完成，已放弃，例如 {failed[:3]}")
+        queue.mark_reported(failed)
+    return recorded, valid, new_urls
+
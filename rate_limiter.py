@@ -0,0 +1,175 @@
+# 按域名限速的请求调度器，替代 make_request 中基于 time.sleep 的限速
+# 每个域名一个令牌桶，另有一个全局令牌桶；调度线程总是派发当前可以发出的请求，
+# 某个域名还在冷却时不会占用工作线程，其他域名的请求照常进行
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from metrics import add_time
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity=1):
+        # rate: 每秒生成的令牌数；capacity: 最多积攒的令牌数（允许的突发请求数）
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        if self.rate > 0:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now=None):
+        """距离下一个令牌可用还需等待的秒数，0 表示现在就可以取"""
+        with self._lock:
+            now = time.monotonic() if now is None else now
+            self._refill(now)
+            if self.tokens >= 1:
+                return 0.0
+            if self.rate <= 0:
+                return float('inf')
+            return (1 - self.tokens) / self.rate
+
+    def try_acquire(self, now=None):
+        with self._lock:
+            now = time.monotonic() if now is None else now
+            self._refill(now)
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            return False
+
+
+class RequestScheduler:
+    def __init__(self, global_rate, domain_rate, global_burst=1, domain_burst=1, max_workers=10, name='rate_limit',
+                 exempt_domains=()):
+        # name 用于运行指标中区分不同调度器的排队等待时间；
+        # exempt_domains 中的域名（CDN 镜像等）不按域名限速，只受全局令牌桶限制
+        self.name = name
+        self.exempt_domains = frozenset(exempt_domains)
+        self.global_bucket = TokenBucket(global_rate, global_burst)
+        self.domain_rate = domain_rate
+        self.domain_burst = domain_burst
+        self.max_workers = max_workers
+        self._buckets = {}
+        self._queues = defaultdict(deque)
+        self._stats = defaultdict(lambda: {'dispatched': 0, 'wait_total': 0.0, 'wait_max': 0.0})
+        self._cond = threading.Condition()
+        self._executor = None
+        self._thread = None
+
+    def _bucket(self, domain):
+        bucket = self._buckets.get(domain)
+        if bucket is None:
+            bucket = TokenBucket(self.domain_rate, self.domain_burst)
+            self._buckets[domain] = bucket
+        return bucket
+
+    def _ensure_started(self):
+        if self._thread is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
+            self._thread = threading.Thread(target=self._dispatch_loop, daemon=True)
+            self._thread.start()
+
+    def submit(self, domain, fn, *args, **kwargs):
+        """把请求放入该域名的队列，返回 Future；轮到它时在工作线程中执行 fn"""
+        future = Future()
+        with self._cond:
+            self._ensure_started()
+            self._queues[domain].append((time.monotonic(), future, fn, args, kwargs))
+            self._cond.notify()
+        return future
+
+    def _pick(self, now):
+        """在所有可以发出请求的域名中选出等待最久的一个，并返回下次需要检查的等待时间"""
+        best_domain = None
+        best_enqueued = None
+        next_wait = None
+        for domain, queue in self._queues.items():
+            if not queue:
+                continue
+            wait = 0 if domain in self.exempt_domains else self._bucket(domain).wait_time(now)
+            if wait > 0:
+                next_wait = wait if next_wait is None else min(next_wait, wait)
+                continue
+            enqueued = queue[0][0]
+            if best_enqueued is None or enqueued < best_enqueued:
+                best_domain, best_enqueued = domain, enqueued
+        return best_domain, next_wait
+
+    def _drop_cancelled(self):
+        """丢弃队首已取消的请求（超时或 Ctrl+C 时被取消），它们不占用全局和域名的令牌"""
+        for domain in list(self._queues):
+            queue = self._queues[domain]
+            while queue and queue[0][1].cancelled():
+                queue.popleft()[1].set_running_or_notify_cancel()
+            if not queue:
+                del self._queues[domain]
+
+    def _dispatch_loop(self):
+        while True:
+            with self._cond:
+                self._drop_cancelled()
+                now = time.monotonic()
+                domain, next_wait = self._pick(now)
+                if domain is None:
+                    # 没有可发出的请求：等待新请求或最早的域名冷却结束
+                    self._cond.wait(next_wait)
+                    continue
+                global_wait = self.global_bucket.wait_time(now)
+                if global_wait > 0:
+                    self._cond.wait(global_wait)
+                    continue
+                enqueued, future, fn, args, kwargs = self._queues[domain].popleft()
+                if not self._queues[domain]:
+                    del self._queues[domain]
+                if not future.set_running_or_notify_cancel():
+                    continue
+                self.global_bucket.try_acquire(now)
+                if domain not in self.exempt_domains:
+                    self._bucket(domain).try_acquire(now)
+                waited = now - enqueued
+                stats = self._stats[domain]
+                stats['dispatched'] += 1
+                stats['wait_total'] += waited
+                stats['wait_max'] = max(stats['wait_max'], waited)
+            add_time(f"{self.name}_wait", waited)
+            self._executor.submit(self._run, future, fn, args, kwargs)
+
+    @staticmethod
+    def _run(future, fn, args, kwargs):
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+        else:
+            future.set_result(result)
+
+    def stats(self):
+        """每个域名的排队数、已派发数、平均和最长等待时间（秒）"""
+        with self._cond:
+            domains = set(self._stats) | set(self._queues)
+            result = {}
+            for domain in domains:
+                stats = self._stats.get(domain, {'dispatched': 0, 'wait_total': 0.0, 'wait_max': 0.0})
+                dispatched = stats['dispatched']
+                result[domain] = {
+                    'queued': sum(1 for entry in self._queues.get(domain, ()) if not entry[1].cancelled()),
+                    'dispatched': dispatched,
+                    'wait_avg': stats['wait_total'] / dispatched if dispatched else 0.0,
+                    'wait_max': stats['wait_max'],
+                }
+            return result
+
+    def log_stats(self):
+        for domain, stats in sorted(self.stats().items(), key=lambda item: -item[1]['dispatched']):
+            logger.info(
+                f"限速队列 {domain}: 排队 {stats['queued']}，已发出 {stats['dispatched']}，"
+                f"平均等待 {stats['wait_avg']:.2f} 秒，最长等待 {stats['wait_max']:.2f} 秒")
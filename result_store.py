@@ -0,0 +1,271 @@
+# 有效地址的结果库，代替每次运行都重新读取并解析整个 tvbox-source.txt
+# 用 sqlite 保存地址索引（按主键查询，判断是否已存在无需扫描文件）和每个地址的历史
+# （首次发现时间、最近验证时间、最近状态）；新地址仍以 "[时间] 地址" 的格式追加到 tvbox-source.txt，
+# 定期压缩历史记录并重新导出文本文件，供 GitHub Actions 提交。
+# 另外记录每个地址测得的性能数据（收到响应头的耗时、总耗时、大小、sites/lives 数），
+# 结合历史记录中的可用率导出按速度和可靠性排序的列表（JSONL 和纯文本），tvbox-source.txt 的格式不变
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# 结果库文件
+RESULT_DB = 'tvbox-results.db'
+
+# 每个地址最多保留的历史记录条数（压缩时裁剪）
+HISTORY_LIMIT = 20
+
+# 每运行多少次压缩一次
+COMPACT_EVERY_RUNS = 10
+
+# 按速度和可用率排序的导出文件：每行一个 JSON 对象，以及每行一个地址的纯文本列表
+RANKED_JSONL_FILE = 'tvbox-ranked.jsonl'
+RANKED_TEXT_FILE = 'tvbox-ranked.txt'
+
+# 耗时的指数加权平均系数（各次运行的测量结果）
+PERF_EWMA_ALPHA = 0.3
+
+# 没有测量数据的地址按这个耗时（秒）排序，与验证超时相同
+RANK_DEFAULT_SECONDS = 10
+
+# 可用率的下限，避免除以 0
+RANK_MIN_SUCCESS_RATE = 0.05
+
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# 性能数据的列
+_PERF_COLUMNS = ('ttfb REAL', 'elapsed REAL', 'size INTEGER', 'sites INTEGER', 'lives INTEGER', 'measured_at TEXT')
+
+
+def parse_url_line(line):
+    """解析 "[时间] 地址" 或单独地址的一行，返回 (时间, 地址)，时间可能为 None"""
+    line = line.strip()
+    if not line:
+        return None, None
+    if line.startswith('[') and '] ' in line:
+        timestamp, url = line[1:].split('] ', 1)
+        return timestamp, url.strip()
+    if ']' in line:
+        return None, line.split('] ')[-1]
+    return None, line
+
+
+def read_url_file(path):
+    """读取地址文件，返回其中的地址列表（去掉时间前缀）"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return [url for _, url in map(parse_url_line, f) if url]
+
+
+class ResultStore:
+    def __init__(self, text_path, db_path=RESULT_DB):
+        self.text_path = text_path
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.executescript(
+            'CREATE TABLE IF NOT EXISTS results ('
+            ' url TEXT PRIMARY KEY, first_seen TEXT, last_validated TEXT, last_status TEXT,'
+            ' exported INTEGER NOT NULL DEFAULT 0, seq INTEGER, health INTEGER);'
+            'CREATE TABLE IF NOT EXISTS history (url TEXT NOT NULL, checked_at TEXT, status TEXT);'
+            'CREATE INDEX IF NOT EXISTS history_url ON history (url);'
+            'CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);')
+        # 旧版本的结果库没有健康分和性能数据
+        for column in ('health INTEGER',) + _PERF_COLUMNS:
+            try:
+                self._conn.execute(f'ALTER TABLE results ADD COLUMN {column}')
+            except sqlite3.OperationalError:
+                pass
+        self._conn.commit()
+        self._sync_text_file()
+
+    def _meta(self, key, default=None):
+        row = self._conn.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else default
+
+    def _set_meta(self, key, value):
+        self._conn.execute('INSERT OR REPLACE INTO meta VALUES (?, ?)', (key, str(value)))
+
+    def _text_size(self):
+        return os.path.getsize(self.text_path) if os.path.exists(self.text_path) else 0
+
+    def _sync_text_file(self):
+        """文本文件与索引不一致时（首次使用、被手动编辑或从仓库检出了新版本）重新导入"""
+        size = self._text_size()
+        if str(size) == self._meta('text_size'):
+            return
+        logger.info(f"重建 {self.text_path} 的地址索引")
+        with self._lock:
+            self._conn.execute('UPDATE results SET exported = 0, seq = NULL')
+            if size:
+                with open(self.text_path, 'r', encoding='utf-8') as f:
+                    for seq, line in enumerate(f):
+                        timestamp, url = parse_url_line(line)
+                        if not url:
+                            continue
+                        self._conn.execute(
+                            'INSERT INTO results (url, first_seen, exported, seq) VALUES (?, ?, 1, ?)'
+                            ' ON CONFLICT(url) DO UPDATE SET exported = 1,'
+                            ' seq = COALESCE(results.seq, excluded.seq),'
+                            ' first_seen = COALESCE(results.first_seen, excluded.first_seen)',
+                            (url, timestamp, seq))
+            self._set_meta('text_size', size)
+            self._conn.commit()
+
+    def __contains__(self, url):
+        """地址是否已在 tvbox-source.txt 中"""
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT 1 FROM results WHERE url = ? AND exported = 1', (url,)).fetchone()
+        return row is not None
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM results WHERE exported = 1').fetchone()[0]
+
+    def record(self, results):
+        """记录一批验证结果 {地址: 状态}，状态为 'valid'、'possible' 或 'invalid'。
+        新的有效地址追加到文本文件，返回新追加的地址列表"""
+        now = time.strftime(TIME_FORMAT, time.localtime())
+        new_urls = []
+        with self._lock:
+            next_seq = self._conn.execute('SELECT COALESCE(MAX(seq), -1) + 1 FROM results').fetchone()[0]
+            for url, status in results.items():
+                row = self._conn.execute('SELECT exported FROM results WHERE url = ?', (url,)).fetchone()
+                if row is None:
+                    self._conn.execute(
+                        'INSERT INTO results (url, first_seen, exported) VALUES (?, ?, 0)', (url, now))
+                self._conn.execute(
+                    'UPDATE results SET last_validated = ?, last_status = ? WHERE url = ?', (now, status, url))
+                self._conn.execute('INSERT INTO history VALUES (?, ?, ?)', (url, now, status))
+                if status != 'invalid' and (row is None or not row[0]):
+                    self._conn.execute(
+                        'UPDATE results SET exported = 1, seq = ? WHERE url = ?', (next_seq, url))
+                    next_seq += 1
+                    new_urls.append(url)
+            if new_urls:
+                with open(self.text_path, 'a', encoding='utf-8') as f:
+                    for url in new_urls:
+                        f.write(f"[{now}] {url}\n")
+            self._set_meta('text_size', self._text_size())
+            self._conn.commit()
+        return new_urls
+
+    def record_health(self, scores):
+        """记录深度健康检查的结果 {地址: 健康分}"""
+        with self._lock:
+            self._conn.executemany(
+                'UPDATE results SET health = ? WHERE url = ?', [(score, url) for url, score in scores.items()])
+            self._conn.commit()
+
+    def record_performance(self, measurements):
+        """记录测得的性能数据 {地址: (ttfb, elapsed, size, sites, lives)}。
+        耗时取各次运行的加权平均；为 None 的字段保留原来的值"""
+        now = time.strftime(TIME_FORMAT, time.localtime())
+        rows = [(ttfb, ttfb, ttfb, elapsed, elapsed, elapsed, size, sites, lives,
+                 now if elapsed is not None else None, url)
+                for url, (ttfb, elapsed, size, sites, lives) in measurements.items()]
+        with self._lock:
+            self._conn.executemany(
+                'UPDATE results SET'
+                ' ttfb = CASE WHEN ? IS NULL THEN ttfb WHEN ttfb IS NULL THEN ?'
+                f'  ELSE ttfb + {PERF_EWMA_ALPHA} * (? - ttfb) END,'
+                ' elapsed = CASE WHEN ? IS NULL THEN elapsed WHEN elapsed IS NULL THEN ?'
+                f'  ELSE elapsed + {PERF_EWMA_ALPHA} * (? - elapsed) END,'
+                ' size = COALESCE(?, size), sites = COALESCE(?, sites), lives = COALESCE(?, lives),'
+                ' measured_at = COALESCE(?, measured_at) WHERE url = ?', rows)
+            self._conn.commit()
+
+    def ranked(self):
+        """返回按速度和可用率排序的有效地址 [{字段: 值}, ...]。
+        排序依据为平均耗时除以可用率（反复尝试直到成功的预期耗时），相同时 sites 多的在前；
+        最近一次验证无效的地址不包括在内"""
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT r.url, r.first_seen, r.last_validated, r.ttfb, r.elapsed, r.size, r.sites, r.lives,'
+                " r.health, COUNT(h.url), COALESCE(SUM(h.status != 'invalid'), 0)"
+                ' FROM results r LEFT JOIN history h ON h.url = r.url'
+                " WHERE r.exported = 1 AND COALESCE(r.last_status, '') != 'invalid'"
+                ' GROUP BY r.url').fetchall()
+        entries = []
+        for url, first_seen, last_validated, ttfb, elapsed, size, sites, lives, health, checks, ok in rows:
+            success_rate = ok / checks if checks else None
+            seconds = elapsed if elapsed is not None else RANK_DEFAULT_SECONDS
+            score = seconds / max(success_rate if success_rate is not None else 1.0, RANK_MIN_SUCCESS_RATE)
+            entries.append({
+                'url': url,
+                'score': round(score, 3),
+                'ttfb_ms': round(ttfb * 1000) if ttfb is not None else None,
+                'total_ms': round(elapsed * 1000) if elapsed is not None else None,
+                'size': size,
+                'sites': sites,
+                'lives': lives,
+                'success_rate': round(success_rate, 3) if success_rate is not None else None,
+                'checks': checks,
+                'health': health,
+                'first_seen': first_seen,
+                'last_validated': last_validated,
+            })
+        entries.sort(key=lambda entry: (entry['score'], -(entry['sites'] or 0), entry['url']))
+        for rank, entry in enumerate(entries, 1):
+            entry['rank'] = rank
+        return entries
+
+    def export_ranked(self, jsonl_path=RANKED_JSONL_FILE, text_path=RANKED_TEXT_FILE):
+        """导出排序后的地址：JSONL 每行包含地址和性能数据，纯文本每行一个地址"""
+        entries = self.ranked()
+        for path, lines in ((jsonl_path, (json.dumps(entry, ensure_ascii=False) for entry in entries)),
+                            (text_path, (entry['url'] for entry in entries))):
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                for line in lines:
+                    f.write(f"{line}\n")
+            os.replace(tmp_path, path)
+        logger.info(f"已按速度和可用率导出 {len(entries)} 个地址到 {jsonl_path} 和 {text_path}")
+        return len(entries)
+
+    def export_text(self, path=None):
+        """按追加顺序导出 "[时间] 地址" 格式的文本文件（默认覆盖 tvbox-source.txt）"""
+        path = path or self.text_path
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT url, first_seen FROM results WHERE exported = 1 ORDER BY seq').fetchall()
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                for url, first_seen in rows:
+                    f.write(f"[{first_seen}] {url}\n" if first_seen else f"{url}\n")
+            os.replace(tmp_path, path)
+            if path == self.text_path:
+                self._set_meta('text_size', self._text_size())
+                self._conn.commit()
+        return len(rows)
+
+    def compact(self):
+        """裁剪每个地址的历史记录，整理数据库，并重新导出文本文件（顺便去掉重复行）"""
+        with self._lock:
+            self._conn.execute(
+                'DELETE FROM history WHERE rowid IN ('
+                ' SELECT rowid FROM (SELECT rowid, ROW_NUMBER() OVER'
+                ' (PARTITION BY url ORDER BY rowid DESC) AS n FROM history) WHERE n > ?)',
+                (HISTORY_LIMIT,))
+            self._set_meta('runs_since_compact', 0)
+            self._conn.commit()
+            self._conn.execute('VACUUM')
+        count = self.export_text()
+        logger.info(f"结果库已压缩，{self.text_path} 共 {count} 个地址")
+
+    def maybe_compact(self):
+        """每运行 COMPACT_EVERY_RUNS 次压缩一次"""
+        with self._lock:
+            runs = int(self._meta('runs_since_compact', 0)) + 1
+            self._set_meta('runs_since_compact', runs)
+            self._conn.commit()
+        if runs >= COMPACT_EVERY_RUNS:
+            self.compact()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
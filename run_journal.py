@@ -0,0 +1,149 @@
+# 运行检查点日志（预写日志）：地址交给验证之前先记录为“已发现”，验证结果写入结果库之后再记录为“已完成”，
+# 记录分批写入磁盘并 fsync。运行被中断（Ctrl+C、GitHub Actions 任务被取消或超时终止、进程被结束）时
+# 日志留在磁盘上，下次以同样的方式运行（自动搜索，或测试同一个本地文件）时从检查点继续：
+# 已完成的地址不再验证，判定结果直接计入本次运行；已发现但没有完成的地址最先验证。运行正常结束后删除日志。
+# 每行一个 JSON 对象，第一行记录运行的类型和开始时间；进程在写入中途被终止时，最后不完整的一行会被丢弃
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# 是否记录检查点日志，中断后从检查点继续
+JOURNAL_ENABLED = True
+
+# 检查点日志文件
+JOURNAL_FILE = 'tvbox-journal.jsonl'
+
+# 超过该时间（秒）的检查点不再继续，与验证缓存的有效期相同
+JOURNAL_MAX_AGE = 24 * 3600
+
+# 缓冲的记录达到该条数时写入磁盘（每批验证结果写入结果库之后也会立即写入）
+JOURNAL_BATCH_SIZE = 100
+
+
+class RunJournal:
+    def __init__(self, kind, source=None, path=None, max_age=None):
+        """kind 为运行的类型（'search' 或 'file'），source 区分同一类型的不同输入（如本地文件），
+        两者都与日志中记录的相同、且没有超过 max_age 秒时从检查点继续，否则重新开始"""
+        self.kind = kind
+        self.source = source
+        self.path = path or JOURNAL_FILE
+        max_age = JOURNAL_MAX_AGE if max_age is None else max_age
+        # 上次运行已完成的 {地址: 判定结果}
+        self.completed = {}
+        # 上次运行已发现但没有完成的地址，按发现的顺序
+        self.pending = []
+        self._buffer = []
+        self._lock = threading.Lock()
+        self.resumed = self._load(max_age)
+        self._file = open(self.path, 'a' if self.resumed else 'w', encoding='utf-8')
+        if not self.resumed:
+            self._buffer.append(json.dumps(
+                {'event': 'run', 'kind': kind, 'source': source, 'started': time.time()}, ensure_ascii=False) + '\n')
+            self.flush()
+
+    def _load(self, max_age):
+        try:
+            with open(self.path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return False
+        except OSError as e:
+            logger.error(f"无法读取检查点日志 {self.path}: {e}")
+            return False
+        # 只使用完整的行
+        end = data.rfind(b'\n') + 1
+        records = []
+        for line in data[:end].splitlines():
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                logger.warning(f"检查点日志中有损坏的记录，已跳过: {line[:100]!r}")
+        if not records:
+            return False
+        header = records[0]
+        if header.get('event') != 'run' or header.get('kind') != self.kind or header.get('source') != self.source:
+            logger.info("检查点日志属于另一次不同的运行，重新开始")
+            return False
+        if time.time() - header.get('started', 0) > max_age:
+            logger.info("检查点日志已过期，重新开始")
+            return False
+        found = {}
+        for record in records[1:]:
+            event = record.get('event')
+            if event == 'found':
+                found[record['url']] = None
+            elif event == 'done':
+                self.completed[record['url']] = record['status']
+        self.pending = [url for url in found if url not in self.completed]
+        if end < len(data):
+            # 去掉写到一半的最后一行，之后的记录从新的一行开始
+            with open(self.path, 'r+b') as f:
+                f.truncate(end)
+        return True
+
+    def _write(self, records):
+        with self._lock:
+            self._buffer.extend(json.dumps(record, ensure_ascii=False) + '\n' for record in records)
+            if len(self._buffer) >= JOURNAL_BATCH_SIZE:
+                self._flush()
+
+    def _flush(self):
+        if not self._buffer or self._file is None:
+            return
+        try:
+            self._file.write(''.join(self._buffer))
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        except OSError as e:
+            logger.error(f"无法写入检查点日志 {self.path}: {e}")
+        self._buffer = []
+
+    def found(self, url):
+        """地址即将交给验证"""
+        self._write([{'event': 'found', 'url': url}])
+
+    def done(self, results):
+        """一批验证结果 {地址: 判定结果} 已写入结果库，立即写入磁盘"""
+        self._write([{'event': 'done', 'url': url, 'status': status} for url, status in results.items()])
+        self.flush()
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def close(self):
+        """写入缓冲的记录并关闭，日志保留在磁盘上，下次运行时继续"""
+        with self._lock:
+            self._flush()
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def finish(self):
+        """运行正常结束：关闭并删除日志"""
+        self.close()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.error(f"无法删除检查点日志 {self.path}: {e}")
+
+
+def open_journal(kind, source=None):
+    """JOURNAL_ENABLED 时打开检查点日志（有可继续的检查点时从检查点继续），否则返回 None"""
+    if not JOURNAL_ENABLED:
+        return None
+    try:
+        journal = RunJournal(kind, source)
+    except OSError as e:
+        logger.error(f"无法打开检查点日志 {JOURNAL_FILE}: {e}")
+        return None
+    if journal.resumed:
+        logger.warning(f"从检查点继续上次中断的运行：已完成 {len(journal.completed)} 个地址，"
+                       f"已发现但未完成 {len(journal.pending)} 个地址")
+    return journal
@@ -1,33 +1,41 @@
 # 搜索TVBox源地址
 import requests
-from bs4 import BeautifulSoup
 import re
 import sys
 import time
-from concurrent.futures import ThreadPoolExecutor, as_completed
-import json
 import threading
 import random
-import signal
-import concurrent.futures
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
-import ssl
-from urllib3 import poolmanager
 import urllib3
 import backoff
 import urllib.parse
 from requests.exceptions import ProxyError
-from collections import defaultdict
 import itertools
 import os
 import logging
+import body_reader
+from body_reader import read_response, decode_body
+from config_parser import find_top_level_key
+import link_extractor
+from http_cache import check_with_cache
+from http_pool import get_session
+from rate_limiter import RequestScheduler
+from url_canon import Canonicalizer
+from url_classifier import classify_url, classify_urls, record_rejected
+from link_extractor import extract_body_links, extract_result_links
+from crawl_frontier import CrawlFrontier
+from serp_cache import cached_search
+from cancellation import Cancelled, current_token, root_token, use_token
+import metrics
+from host_health import get_tracker
+from mirror_race import MIRROR_HOSTS, mirror_candidates, race
+import parse_pool
 
 # 在文件开头添加这行
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
-# 全局变量用于控制搜索是否应该停止
-stop_search = False
+# 控制搜索是否应该停止的取消令牌（带截止时间），每次搜索开始时由 search_tvbox_sources 创建；
+# 它是共享的对象，其他模块取消根令牌（root_token().cancel()）即可停止搜索
+search_token = root_token()
 
 # 定义提前结束搜索的地址数量阈值
 # 当找到的有效地址数量达到此值时，搜索将提前结束
@@ -55,72 +63,91 @@ USER_AGENTS = [
 
 # 添加一个域名访问间隔（秒）
 DOMAIN_COOLDOWN = 60
-domain_last_access = defaultdict(float)
+
+# 请求的默认超时时间（秒）。只在域名还没有足够的延迟样本时使用，之后按该域名的延迟计算（见 host_health）
+REQUEST_TIMEOUT = 10
+
+# 抓取网页的默认超时时间（秒）
+PAGE_TIMEOUT = 15
 
 # 在全局变量部分添加
 MIN_REQUEST_INTERVAL = 3  # 最小请求间隔（秒）
-last_request_time = 0
 
 # 在全局变量部分添加
 MAX_REQUESTS_PER_MINUTE = 20
-request_times = []
+
+# 同时执行请求的工作线程数
+FETCH_WORKERS = 10
+
+# 请求调度器：每个域名一个令牌桶（每 DOMAIN_COOLDOWN 秒一个请求），
+# 全局令牌桶同时满足最小请求间隔和每分钟请求数上限；GitHub 文件的镜像（CDN 和代理）只受全局限速，
+# 竞速中落败的镜像请求不会让该镜像的下一个请求等待冷却
+request_scheduler = RequestScheduler(
+    global_rate=min(1 / MIN_REQUEST_INTERVAL, MAX_REQUESTS_PER_MINUTE / 60),
+    domain_rate=1 / DOMAIN_COOLDOWN,
+    max_workers=FETCH_WORKERS,
+    exempt_domains=MIRROR_HOSTS)
+
+# 同一搜索引擎两次请求之间的最小间隔（秒），代替每次搜索后随机等待 1~3 秒
+ENGINE_INTERVAL = 2
+
+# 同时进行的搜索请求数
+SEARCH_WORKERS = 6
+
+# 搜索调度器：所有“关键词 × 搜索引擎”组合同时排队，每个搜索引擎一个令牌桶，不同引擎的请求互不等待
+search_scheduler = RequestScheduler(
+    global_rate=SEARCH_WORKERS,
+    domain_rate=1 / ENGINE_INTERVAL,
+    max_workers=SEARCH_WORKERS,
+    name='search_rate_limit')
 
 # 在全局变量部分添加
 urls = set()
 urls_lock = threading.Lock()
 
+# 已处理过的规范化地址，同一个配置的不同镜像/写法只处理一次
+processed_urls = set()
+
+# 本次运行的地址规范化（每个原始地址只规范化一次，并统计不同写法归并后避免的请求）
+canonicalizer = Canonicalizer()
+
 # 在文件开头的全局变量部分添加
 OUTPUT_FILE = 'tvbox-out.txt'  # 输出文件名
 URL_FILE = 'tvbox-url.txt'     # URL文件名
 
 
-class TLSAdapter(requests.adapters.HTTPAdapter):
-    def init_poolmanager(self, connections, maxsize, block=False):
-        """Create and initialize the urllib3 PoolManager."""
-        ctx = ssl.create_default_context()
-        ctx.set_ciphers('DEFAULT@SECLEVEL=1')
-        ctx.check_hostname = False
-        ctx.verify_mode = ssl.CERT_NONE
-        self.poolmanager = poolmanager.PoolManager(
-            num_pools=connections,
-            maxsize=maxsize,
-            block=block,
-            ssl_version=ssl.PROTOCOL_TLSv1_2,
-            ssl_context=ctx)
-
-# 添加一个装饰器用于重试
-
-
-@backoff.on_exception(backoff.expo,
-                      (requests.exceptions.Timeout,
-                       requests.exceptions.ConnectionError,
-                       ProxyError),
-                      max_tries=5)
-def make_request(session, url, timeout):
-    global last_request_time
-    global request_times
-    current_time = time.time()
-
-    # 确保请求间隔不小于 MIN_REQUEST_INTERVAL
-    if current_time - last_request_time < MIN_REQUEST_INTERVAL:
-        time.sleep(MIN_REQUEST_INTERVAL - (current_time - last_request_time))
-
-    # 移除一分钟之前的请求记录
-    request_times = [t for t in request_times if current_time - t < 60]
-
-    # 如果在过去一分钟内的请求数达到上限，则等待
-    if len(request_times) >= MAX_REQUESTS_PER_MINUTE:
-        sleep_time = 60 - (current_time - request_times[0])
-        time.sleep(sleep_time)
+# make_request 最多尝试的次数（超时、连接错误、代理错误时按指数退避重试）
+MAX_REQUEST_TRIES = 5
+
+# make_request 重试的异常
+RETRY_EXCEPTIONS = (requests.exceptions.Timeout, requests.exceptions.ConnectionError, ProxyError)
 
+
+def make_request(session, url, timeout, stream=False, headers=None):
+    # 镜像竞速中由竞速的令牌（search_token 的子令牌）等待，竞速结束后落败的请求不再排队。
+    # 重试前的等待同样在令牌上进行：取消或超过截止时间时立即抛出 Cancelled，不再重试
+    token = current_token() or search_token
+    delays = backoff.expo()
+    next(delays)
+    for attempt in range(1, MAX_REQUEST_TRIES + 1):
+        try:
+            return token.result(submit_request(session, url, timeout, stream, headers))
+        except RETRY_EXCEPTIONS:
+            if attempt == MAX_REQUEST_TRIES or token.cancelled:
+                raise
+            wait = backoff.full_jitter(next(delays))
+            metrics.inc('retries_total', kind='backoff')
+            metrics.add_time('backoff_wait', wait)
+            token.sleep(wait)
+
+
+def submit_request(session, url, timeout, stream=False, headers=None):
+    """按域名排队等待限速，返回 Future，不会占用调用线程"""
     domain = urllib.parse.urlparse(url).netloc
+    return request_scheduler.submit(domain, _send_request, session, url, timeout, stream, headers)
 
-    # 查询域名的上次访问时间
-    if current_time - domain_last_access[domain] < DOMAIN_COOLDOWN:
-        sleep_time = DOMAIN_COOLDOWN - \
-            (current_time - domain_last_access[domain])
-        time.sleep(sleep_time)
 
+def _send_request(session, url, timeout, stream, extra_headers):
     headers = {
         'User-Agent': random.choice(USER_AGENTS),  # 使用随机选择的 User-Agent
         'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
@@ -130,21 +157,39 @@ def make_request(session, url, timeout):
         'Upgrade-Insecure-Requests': '1',
         'Cache-Control': 'max-age=0',
     }
+    if extra_headers:
+        # 例如验证缓存的条件请求头 If-None-Match / If-Modified-Since
+        headers.update(extra_headers)
 
     if PROXIES:
         proxy = random.choice(PROXIES)
     else:
         proxy = None
 
-    response = session.get(url, headers=headers,
-                           timeout=timeout, verify=False, proxies=proxy)
-
-    # 更新域名的最后访问时间
-    domain_last_access[domain] = time.time()
+    # 熔断的域名直接放弃（CircuitOpen 不会被 backoff 重试）；timeout 只是该域名没有延迟样本时的默认值
+    tracker = get_tracker()
+    tracker.acquire(url)
+    timeouts = tracker.timeouts(url, timeout)
 
-    last_request_time = time.time()
-    request_times.append(time.time())
-    return response
+    # 请求耗时为收到响应头的时间（stream=True 时内容稍后读取，单独计入 download）
+    start = time.monotonic()
+    status = 'error'
+    try:
+        with use_token(search_token):
+            response = session.get(url, headers=headers,
+                                   timeout=(search_token.timeout(timeouts.connect), search_token.timeout(timeouts.read)),
+                                   verify=False, proxies=proxy, stream=stream)
+        status = response.status_code
+        tracker.record_status(url, status, time.monotonic() - start)
+        return response
+    except requests.exceptions.Timeout:
+        tracker.record_failure(url, timed_out_after=timeouts.read)
+        raise
+    except requests.exceptions.RequestException:
+        tracker.record_failure(url)
+        raise
+    finally:
+        metrics.observe_request('requests', url, time.monotonic() - start, status)
 
 
 def clean_url(url):
@@ -161,34 +206,49 @@ def clean_url(url):
     return url
 
 
-def is_valid_tvbox_url(url):
-    # 清理 URL
-    url = clean_url(url)
-
-    # 排除 GitHub 搜索页面、仓库主页和其他明显不是 TVBox 配置的 URL
-    if re.search(r'(github\.com/search|github\.com/[^/]+/[^/]+$|search\?q=|\.com/s\?|\.com/web\?)', url, re.I):
-        return False
-
-    # 检查 URL 是否符合基本模式
-    if not re.search(r'(tvbox|tv\.json|live\.json|epg\.json|source\.json|raw\.githubusercontent\.com.*\.json|gitee\.com.*\.json|pastebin\.com|gist\.github\.com)', url, re.I):
+def is_config_json(body, encoding=None):
+    """内容的顶层对象是否含有 lives、sites 或 spider 键，允许注释、结尾逗号等不规范写法（在解析进程中执行）"""
+    return find_top_level_key(decode_body(body, encoding)) is not None
+
+
+def is_valid_tvbox_url(url, classified=False):
+    """验证地址是否为 TVBox 配置；classified 为 True 表示调用方已清理并分类过该地址（结果为保留），不再重复检查"""
+    if not classified:
+        # 清理 URL
+        url = clean_url(url)
+
+        # 排除 GitHub 搜索页面、仓库主页和其他明显不是 TVBox 配置的 URL，并检查 URL 是否符合基本模式
+        keep, reason = classify_url(url)
+        if not keep:
+            record_rejected(reason)
+            return False
+
+    def fetch_mirror(mirror_url, headers):
+        response = make_request(get_session(), mirror_url, timeout=REQUEST_TIMEOUT,
+                                stream=body_reader.STREAM_VALIDATION, headers=headers)
+        return read_response(response, body_reader.MAX_BODY_BYTES,
+                             stop_on_key=body_reader.STREAM_VALIDATION, accept_types=('json', 'text'))
+
+    def fetch(headers):
+        # GitHub 文件在多个镜像之间竞速，保存的仍是规范地址
+        return race(url, mirror_candidates(url), lambda mirror_url: fetch_mirror(mirror_url, headers),
+                    token=search_token)
+
+    def judge(result):
+        if result.status != 200 or result.body is None:
+            return False
+        # 读取时看到 "sites": [、"lives": [ 或 "spider": " 即可判定，无需读完全部内容
+        if result.body.key_found:
+            return True
+        # 其余 json 和 text 内容（raw.githubusercontent.com 等返回 text/plain）都检测顶层键，允许不规范的写法
+        if not result.body.truncated:
+            return parse_pool.run(is_config_json, result.body.body, result.encoding)
         return False
 
     try:
-        response = make_request(requests.Session(), url, timeout=10)
-        if response.status_code == 200:
-            content_type = response.headers.get('Content-Type', '').lower()
-            if 'json' in content_type:
-                try:
-                    json_data = response.json()
-                    if isinstance(json_data, dict) and ('lives' in json_data or 'sites' in json_data or 'spider' in json_data):
-                        return True
-                except json.JSONDecodeError:
-                    pass
-            elif 'text' in content_type:
-                text_content = response.text.lower()
-                # 检查是否包含 TVBox 配置的特定结构
-                if re.search(r'("lives":\s*\[.*\]|"sites":\s*\[.*\]|"spider":\s*".*")', text_content, re.DOTALL):
-                    return True
+        return check_with_cache('search', url, fetch, judge)
+    except Cancelled:
+        raise
     except requests.RequestException as e:
         print(f"验证 URL 时出错: {url} - {e}")
     except Exception as e:
@@ -197,27 +257,87 @@ def is_valid_tvbox_url(url):
 
 
 def signal_handler(signum, frame):
-    global stop_search
     print("\n接收到中断信号，正在停止搜索...")
-    stop_search = True
+    root_token().cancel('接收到中断信号')
 
 # 添加深度爬虫函数
 
 
 def deep_crawl(url, depth=2):
-    if depth == 0:
-        return
-
-    try:
-        response = make_request(requests.Session(), url, 10)
-        soup = BeautifulSoup(response.text, 'html.parser')
-        for link in soup.find_all('a'):
-            new_url = link.get('href')
-            if new_url and re.match(r'https?://', new_url):
-                process_url(new_url)
-                deep_crawl(new_url, depth - 1)
-    except Exception as e:
-        print(f"深度爬虫出错: {url} - {e}")
+    # 按优先级广度优先地抓取，已访问的地址不再抓取，页面数受全局和每个域名的预算限制。
+    # 每个页面只请求一次：同一次请求既判断页面本身是不是配置，也取出其中的链接；
+    # 链接加入待抓取队列（按分数排序、受预算限制），轮到它们时再验证，不在当前页面中逐一验证
+    frontier = CrawlFrontier(max_depth=depth)
+    frontier.push(canonicalizer.canonicalize(url), 0)
+
+    def visit(page_url, page_depth):
+        if search_token.cancelled:
+            frontier.stop()
+            return []
+        keep = False
+        if page_depth > 0:
+            with urls_lock:
+                if page_url in processed_urls:
+                    return []
+                processed_urls.add(page_url)
+            keep, reason = classify_url(page_url)
+            if not keep:
+                # 不会作为配置验证，只抓取其中的链接
+                record_rejected(reason)
+        if page_depth >= depth:
+            # 最深一层不再需要链接，只验证可能是配置的地址
+            if keep and is_valid_tvbox_url(page_url, classified=True):
+                add_valid_url(page_url)
+            return []
+        is_config, links = crawl_page(page_url, REQUEST_TIMEOUT)
+        if is_config:
+            if keep:
+                add_valid_url(page_url)
+            return []
+        links = [clean_url(link) for link in links]
+        return [canonicalizer.canonicalize(link) for link in links if link]
+
+    frontier.run(visit)
+
+
+def inspect_page(body, encoding, backend):
+    """页面是否为 TVBox 配置，不是时一并返回其中的链接（在解析进程中执行）"""
+    if is_config_json(body, encoding):
+        return True, []
+    return False, extract_body_links(body, encoding, backend)
+
+
+def crawl_page(url, timeout):
+    """深度爬虫抓取页面，返回 (是否为配置, 页面中的链接)；结果会缓存，页面未变化时不再解析"""
+    def fetch(headers):
+        response = make_request(get_session(), url, timeout, stream=True, headers=headers)
+        return read_response(response, body_reader.MAX_BODY_BYTES, stop_on_key=False)
+
+    def judge(result):
+        if result.status != 200 or result.body is None:
+            return False, []
+        return parse_pool.run(inspect_page, result.body.body, result.encoding, link_extractor.LINK_BACKEND)
+
+    is_config, links = check_with_cache('crawl_page', url, fetch, judge, default=(False, []))
+    return is_config, links
+
+
+def fetch_page_links(url, timeout):
+    """抓取页面并返回其中的 http/https 链接，链接列表会缓存，页面未变化时不再解析"""
+    # 使用共享会话（已配置重试策略），复用同一域名的连接
+    session = get_session()
+
+    def fetch(headers):
+        response = make_request(
+            session, url, timeout, stream=True, headers=headers)
+        return read_response(response, body_reader.MAX_BODY_BYTES, stop_on_key=False)
+
+    def page_links(result):
+        if result.status != 200 or result.body is None:
+            return []
+        return parse_pool.run(extract_body_links, result.body.body, result.encoding, link_extractor.LINK_BACKEND)
+
+    return check_with_cache('crawl', url, fetch, page_links, default=[])
 
 # 扩展搜索关键词
 
@@ -286,60 +406,64 @@ def process_url(url):
     if cleaned_url is None:  # 如果是百度中转链接，直接返回
         return
 
-    url = cleaned_url
+    # 规范化地址（镜像、blob/raw 链接、跟踪参数等），同一个配置只处理一次
+    url = canonicalizer.canonicalize(cleaned_url)
+    with urls_lock:
+        if url in processed_urls:
+            return
+        processed_urls.add(url)
 
     # 首先检查 URL 是否符合基本模式，并排除明显无效的 URL
-    if re.search(r'(github\.com/search|github\.com/[^/]+/[^/]+$|search\?q=|\.com/s\?|\.com/web\?)', url, re.I):
-        return
-
-    if not re.search(r'(tvbox|tv\.json|live\.json|epg\.json|source\.json|raw\.githubusercontent\.com.*\.json|gitee\.com.*\.json|pastebin\.com|gist\.github\.com)', url, re.I):
+    keep, reason = classify_url(url)
+    if not keep:
+        logger.debug(f"跳过地址 ({reason}): {url}")
+        record_rejected(reason)
         return
 
     if url not in urls:
         try:
-            # 设置重试策略
-            session = requests.Session()
-            retries = Retry(total=5, backoff_factor=0.1,
-                            status_forcelist=[500, 502, 503, 504])
-            session.mount('https://', TLSAdapter(max_retries=retries))
-            session.mount('http://', TLSAdapter(max_retries=retries))
-
-            # 对特定域名使用更长的超时时间
-            timeout = 30 if 'kgithub.com' in url else 15
-
-            if is_valid_tvbox_url(url):
-                with urls_lock:
-                    urls.add(url)
-                    print(f"当前已获取 {len(urls)} 个有效地址", end='\r')
-                    sys.stdout.flush()
-                    # 立即保存到文件
-                    save_url_to_file(url)
+            if is_valid_tvbox_url(url, classified=True):
+                add_valid_url(url)
             else:
                 # 处理可能包含间接链接的页面
-                response = make_request(session, url, timeout)
-                if response.status_code == 200:
-                    soup = BeautifulSoup(response.text, 'html.parser')
-                    for link in soup.find_all('a'):
-                        indirect_url = link.get('href')
-                        if indirect_url and re.match(r'https?://', indirect_url):
-                            indirect_url = clean_url(indirect_url)
-                            try:
-                                if is_valid_tvbox_url(indirect_url):
-                                    with urls_lock:
-                                        urls.add(indirect_url)
-                                        print(
-                                            f"当前已获取 {len(urls)} 个有效地址", end='\r')
-                                        sys.stdout.flush()
-                                        # 立即保存到文件
-                                        save_url_to_file(indirect_url)
-                            except Exception as e:
-                                print(f"处理间接链接时出错: {indirect_url} - {e}")
+                # 一次性规范化并分类页面上的所有链接，只验证可能是配置的地址
+                links = [clean_url(link)
+                         for link in fetch_page_links(url, PAGE_TIMEOUT)]
+                candidates = classify_urls(
+                    [canonicalizer.canonicalize(link) for link in links if link])
+                for indirect_url, keep, reason in candidates:
+                    with urls_lock:
+                        if indirect_url in processed_urls:
+                            continue
+                        processed_urls.add(indirect_url)
+                    if not keep:
+                        record_rejected(reason)
+                        continue
+                    try:
+                        if is_valid_tvbox_url(indirect_url, classified=True):
+                            add_valid_url(indirect_url)
+                    except Cancelled:
+                        raise
+                    except Exception as e:
+                        print(f"处理间接链接时出错: {indirect_url} - {e}")
+        except Cancelled:
+            # 搜索已取消或超过截止时间
+            return
         except requests.RequestException as e:
             print(f"处理 URL 时出错: {url} - {e}")
         except Exception as e:
             print(f"处理 URL 时发生未知错误: {url} - {e}")
 
 
+def add_valid_url(url):
+    """记录验证通过的地址，并立即保存到文件"""
+    with urls_lock:
+        urls.add(url)
+        print(f"当前已获取 {len(urls)} 个有效地址", end='\r')
+        sys.stdout.flush()
+        save_url_to_file(url)
+
+
 def save_url_to_file(url):
     try:
         with open(URL_FILE, 'a', encoding='utf-8') as f:
@@ -352,54 +476,84 @@ def save_url_to_file(url):
 logger = logging.getLogger(__name__)
 
 
+# 获取搜索结果页的超时时间（秒），不会超过搜索的截止时间
+SERP_TIMEOUT = 15
+
+# 各搜索引擎结果页的地址模板（基准测试时替换为本地服务器）
+SEARCH_ENGINE_URLS = {
+    'google': "https://www.google.com/search?q={query}&num={num}",
+    'bing': "https://www.bing.com/search?q={query}&count={num}",
+    'baidu': "https://www.baidu.com/s?wd={query}&rn={num}",
+}
+
+SEARCH_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'}
+
+
+def fetch_serp(url):
+    """获取搜索结果页的 HTML"""
+    start = time.monotonic()
+    status = 'error'
+    try:
+        with use_token(search_token):
+            response = get_session(insecure=False).get(
+                url, headers=SEARCH_HEADERS, timeout=search_token.timeout(SERP_TIMEOUT))
+        status = response.status_code
+        return response.text
+    finally:
+        metrics.observe_request('serp', url, time.monotonic() - start, status)
+
+
 def search_google(query, num_results=10):
-    url = f"https://www.google.com/search?q={query}&num={num_results}"
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'}
-    response = requests.get(url, headers=headers)
-    soup = BeautifulSoup(response.text, 'html.parser')
-    search_results = soup.find_all('div', class_='yuRUbf')
-    return [result.find('a')['href'] for result in search_results if result.find('a')]
+    url = SEARCH_ENGINE_URLS['google'].format(query=query, num=num_results)
+    return cached_search('google', query, num_results, lambda: fetch_serp(url),
+                         lambda text: extract_result_links(text, 'div', 'yuRUbf'))
 
 
 def search_bing(query, num_results=10):
-    url = f"https://www.bing.com/search?q={query}&count={num_results}"
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'}
-    response = requests.get(url, headers=headers)
-    soup = BeautifulSoup(response.text, 'html.parser')
-    search_results = soup.find_all('li', class_='b_algo')
-    return [result.find('a')['href'] for result in search_results if result.find('a')]
+    url = SEARCH_ENGINE_URLS['bing'].format(query=query, num=num_results)
+    return cached_search('bing', query, num_results, lambda: fetch_serp(url),
+                         lambda text: extract_result_links(text, 'li', 'b_algo'))
+
+
+def parse_baidu_results(text):
+    search_results = []
+
+    # 查找所有搜索结果
+    for href in extract_result_links(text, 'h3', 't'):
+        # 跳过百度中转链接
+        if not href.startswith(('http://www.baidu.com/link?', 'https://www.baidu.com/link?')):
+            search_results.append(href)
+
+    return search_results
 
 
 def search_baidu(query, num_results=10):
-    url = f"https://www.baidu.com/s?wd={query}&rn={num_results}"
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-    }
+    url = SEARCH_ENGINE_URLS['baidu'].format(query=query, num=num_results)
     try:
-        response = requests.get(url, headers=headers)
-        soup = BeautifulSoup(response.text, 'html.parser')
-        search_results = []
-
-        # 查找所有搜索结果
-        for result in soup.find_all('h3', class_='t'):
-            link = result.find('a')
-            if link:
-                href = link.get('href', '')
-                # 跳过百度中转链接
-                if not href.startswith(('http://www.baidu.com/link?', 'https://www.baidu.com/link?')):
-                    search_results.append(href)
-
-        return search_results
+        return cached_search('baidu', query, num_results, lambda: fetch_serp(url), parse_baidu_results)
     except Exception as e:
         logger.error(f"百度搜索出错: {str(e)}")
         return []
 
 
-def search_tvbox_sources(timeout=SEARCH_TIMEOUT):
-    global stop_search
-    start_time = time.time()
+def run_search(engine_name, search_function, query):
+    # 排队期间搜索已被取消时不再发出请求
+    search_token.check()
+    logger.info(f"使用 {engine_name} 搜索: {query}")
+    start = time.monotonic()
+    try:
+        return search_function(query)
+    finally:
+        metrics.observe('search_seconds', time.monotonic() - start, engine=engine_name)
+
+
+def search_tvbox_sources(timeout=SEARCH_TIMEOUT, on_url=None, url_file=URL_FILE, token=None):
+    """搜索 TVBox 源地址。每找到一个新地址就调用 on_url(地址)（可用于流式验证）；
+    url_file 不为 None 时，结束后把所有地址写入该文件。
+    token 为取消令牌，默认使用根令牌的子令牌，截止时间为 timeout 秒后"""
+    global search_token
+    search_token = token if token is not None else root_token().child(timeout)
     found_urls = set()
 
     search_engines = [
@@ -417,32 +571,48 @@ def search_tvbox_sources(timeout=SEARCH_TIMEOUT):
         "TVBox接口 site:gitee.com"
     ]
 
-    for query in search_queries:
-        if stop_search or time.time() - start_time > timeout or len(found_urls) >= MAX_URLS:
-            break
-
-        for engine_name, search_function in search_engines:
-            if stop_search or time.time() - start_time > timeout or len(found_urls) >= MAX_URLS:
+    # 所有组合同时提交，按完成顺序合并结果
+    futures = {
+        search_scheduler.submit(engine_name, run_search, engine_name, search_function, query): engine_name
+        for query in search_queries
+        for engine_name, search_function in search_engines
+    }
+    try:
+        for future in search_token.as_completed(futures):
+            if len(found_urls) >= MAX_URLS:
                 break
-
+            engine_name = futures[future]
             try:
-                logger.info(f"使用 {engine_name} 搜索: {query}")
-                results = search_function(query)
-                for url in results:
-                    if stop_search or time.time() - start_time > timeout or len(found_urls) >= MAX_URLS:
-                        break
-                    if url not in found_urls:
-                        found_urls.add(url)
-                        logger.debug(f"找到新的URL: {url}")
-                time.sleep(random.uniform(1, 3))  # 随机延迟，避免被封禁
+                results = future.result()
+            except Cancelled:
+                continue
             except Exception as e:
                 logger.error(f"{engine_name} 搜索出错: {str(e)}")
-
-    # 添加时间信息并写入文件
-    current_time = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
-    with open(URL_FILE, "w", encoding='utf-8') as f:
-        for url in found_urls:
-            f.write(f"[{current_time}] {url}\n")
+                continue
+            for url in results:
+                if len(found_urls) >= MAX_URLS:
+                    break
+                url = canonicalizer.canonicalize(url)
+                if url not in found_urls:
+                    found_urls.add(url)
+                    logger.debug(f"找到新的URL: {url}")
+                    if on_url is not None:
+                        on_url(url)
+    except Cancelled:
+        logger.warning(f"搜索停止（{search_token.reason}），停止等待其余搜索结果")
+    finally:
+        # 尚未发出的搜索不再执行
+        for future in futures:
+            future.cancel()
+
+    # 添加时间信息并写入文件；先写入临时文件再替换，写入中途被终止时原来的文件保持完整
+    if url_file is not None:
+        current_time = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime())
+        tmp_file = f"{url_file}.tmp"
+        with open(tmp_file, "w", encoding='utf-8') as f:
+            for url in found_urls:
+                f.write(f"[{current_time}] {url}\n")
+        os.replace(tmp_file, url_file)
 
     logger.info(f"搜索完成，共找到 {len(found_urls)} 个URL")
     return len(found_urls)
@@ -0,0 +1,129 @@
+# 搜索引擎结果页的磁盘缓存，按 (搜索引擎, 关键词, 结果数) 保存原始页面和解析出的链接
+# 每次运行的关键词是固定的，结果在两次定时任务之间几乎不变：有效期（SERP_CACHE_TTL）内直接使用缓存，
+# 不再请求搜索引擎，既节省时间又降低被封的风险；条目数超过上限时淘汰最久未使用的条目。
+# 回放模式（REPLAY_MODE）下只使用缓存的页面（忽略有效期，重新解析），不访问搜索引擎，便于离线调试和基准测试
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+from metrics import inc
+
+logger = logging.getLogger(__name__)
+
+# 是否启用搜索结果缓存
+SERP_CACHE_ENABLED = True
+
+# 缓存文件
+SERP_CACHE_FILE = 'tvbox-serp.db'
+
+# 缓存有效期（秒），默认 7 天，每 5 天一次的定时任务隔一次刷新一次
+SERP_CACHE_TTL = 7 * 24 * 3600
+
+# 最多保存的结果页数量，超过时淘汰最久未使用的
+SERP_CACHE_MAX_ENTRIES = 500
+
+# 回放模式：只使用缓存的结果页，不访问搜索引擎（验证缓存也直接使用缓存的判定）
+REPLAY_MODE = False
+
+
+class SerpCache:
+    def __init__(self, path=SERP_CACHE_FILE, ttl=SERP_CACHE_TTL, max_entries=SERP_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS serp ('
+            ' engine TEXT NOT NULL, query TEXT NOT NULL, num INTEGER NOT NULL, raw BLOB, results TEXT,'
+            ' fetched_at REAL, last_used REAL, PRIMARY KEY (engine, query, num))')
+        self.stats = {'hit': 0, 'miss': 0, 'replayed': 0, 'evicted': 0}
+
+    def lookup(self, engine, query, num):
+        """返回 (原始页面, 解析出的链接, 抓取时间)，没有缓存时返回 None"""
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT raw, results, fetched_at FROM serp WHERE engine = ? AND query = ? AND num = ?',
+                (engine, query, num)).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                'UPDATE serp SET last_used = ? WHERE engine = ? AND query = ? AND num = ?',
+                (time.time(), engine, query, num))
+        raw, results, fetched_at = row
+        return zlib.decompress(raw).decode('utf-8'), json.loads(results), fetched_at
+
+    def store(self, engine, query, num, raw, results):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO serp VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (engine, query, num, zlib.compress(raw.encode('utf-8')), json.dumps(results), now, now))
+            count = self._conn.execute('SELECT COUNT(*) FROM serp').fetchone()[0]
+            if count > self.max_entries:
+                self._conn.execute(
+                    'DELETE FROM serp WHERE rowid IN (SELECT rowid FROM serp ORDER BY last_used LIMIT ?)',
+                    (count - self.max_entries,))
+                self.stats['evicted'] += count - self.max_entries
+
+    def _count(self, field):
+        with self._lock:
+            self.stats[field] += 1
+        inc('cache_total', cache='serp', result=field)
+
+    def log_stats(self):
+        logger.warning(
+            f"搜索结果缓存：命中 {self.stats['hit']} 次，回放 {self.stats['replayed']} 次，"
+            f"请求搜索引擎 {self.stats['miss']} 次，淘汰 {self.stats['evicted']} 条。")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_serp_cache():
+    """获取进程共享的搜索结果缓存，未启用时返回 None（回放模式总是启用）"""
+    global _cache
+    if not SERP_CACHE_ENABLED and not REPLAY_MODE:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            try:
+                _cache = SerpCache(SERP_CACHE_FILE, SERP_CACHE_TTL, SERP_CACHE_MAX_ENTRIES)
+            except sqlite3.Error as e:
+                logger.error(f"无法打开搜索结果缓存 {os.path.abspath(SERP_CACHE_FILE)}: {e}")
+                return None
+        return _cache
+
+
+def cached_search(engine, query, num, fetch, parse):
+    """带缓存的搜索：fetch() 返回结果页的 HTML，parse(HTML) 返回链接列表"""
+    cache = get_serp_cache()
+    if cache is None:
+        return parse(fetch())
+    entry = cache.lookup(engine, query, num)
+    if REPLAY_MODE:
+        if entry is None:
+            logger.warning(f"回放模式下没有缓存的结果页: {engine} {query}")
+            return []
+        cache._count('replayed')
+        return parse(entry[0])
+    if entry is not None and time.time() - entry[2] < cache.ttl:
+        cache._count('hit')
+        return entry[1]
+    cache._count('miss')
+    raw = fetch()
+    results = parse(raw)
+    # 没有解析出结果（多半是验证码或被限制访问的页面）时不缓存，下次运行重新搜索
+    if results:
+        cache.store(engine, query, num, raw, results)
+    return results
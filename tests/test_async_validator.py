@@ -0,0 +1,16 @@
+from async_validator import AsyncValidator, check_urls
+
+
+def test_unexpected_error_only_drops_that_url(monkeypatch):
+    async def check_url(self, session, url):
+        if url.endswith('bad.json'):
+            raise RuntimeError('解析器崩溃')
+        return 'valid'
+
+    monkeypatch.setattr(AsyncValidator, 'check_url', check_url)
+    urls = ['https://example.com/a.json', 'https://example.com/bad.json', 'https://example.com/b.json']
+    assert check_urls(urls) == {
+        'https://example.com/a.json': 'valid',
+        'https://example.com/bad.json': None,
+        'https://example.com/b.json': 'valid',
+    }
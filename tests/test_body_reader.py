@@ -0,0 +1,84 @@
+import pytest
+
+from body_reader import read_response
+from cancellation import Cancelled, CancelToken, use_token
+
+
+class Response:
+    """requests 响应的替身，记录读取了多少块"""
+
+    def __init__(self, chunks, status_code=200, headers=None):
+        self.chunks = chunks
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.encoding = 'utf-8'
+        self.read = 0
+        self.closed = False
+
+    def iter_content(self, chunk_size):
+        for chunk in self.chunks:
+            self.read += 1
+            yield chunk
+
+    def close(self):
+        self.closed = True
+
+
+def test_stops_at_byte_cap():
+    response = Response([b'x' * 100] * 10)
+    result = read_response(response, max_bytes=250, stop_on_key=False)
+    assert result.body.body == b'x' * 250
+    assert result.body.truncated
+    assert response.read == 3
+    assert response.closed
+
+
+def test_stops_after_top_level_key():
+    response = Response([b'{"spi', b'der": "a.jar", ', b'"sites": []}', b'x' * 100])
+    result = read_response(response)
+    assert result.body.key_found and not result.body.truncated
+    # 关键字跨越两块，第二块读完就停止
+    assert response.read == 2
+
+
+def test_reads_everything_without_stop_on_key():
+    chunks = [b'{"sites": [', b'1, 2', b']}']
+    result = read_response(Response(chunks), stop_on_key=False)
+    assert result.body.body == b''.join(chunks)
+    assert result.body.key_found
+
+
+@pytest.mark.parametrize('headers, reason', [
+    ({'Content-Type': 'image/png'}, '内容类型不符'),
+    ({'Content-Length': str(10 * 1024 * 1024)}, '内容过大'),
+])
+def test_headers_reject_before_reading(headers, reason):
+    response = Response([b'{"sites": []}'], headers=headers)
+    result = read_response(response)
+    assert result.body is None
+    assert result.reason.startswith(reason)
+    assert response.read == 0
+    assert response.closed
+
+
+def test_accept_types():
+    response = Response([b'<html></html>'], headers={'Content-Type': 'text/html'})
+    assert read_response(response, accept_types=('json',)).body is None
+    response = Response([b'{}'], headers={'Content-Type': 'application/json; charset=utf-8'})
+    assert read_response(response, accept_types=('json',)).body.body == b'{}'
+
+
+def test_non_200_is_not_read():
+    response = Response([b'not found'], status_code=404)
+    result = read_response(response)
+    assert result.status == 404 and result.body is None
+    assert response.read == 0
+
+
+def test_cancelled_token_stops_reading():
+    token = CancelToken()
+    token.cancel('测试')
+    response = Response([b'{"a": 1}'] * 5)
+    with use_token(token), pytest.raises(Cancelled):
+        read_response(response, stop_on_key=False)
+    assert response.closed
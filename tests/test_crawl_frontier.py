@@ -0,0 +1,42 @@
+from crawl_frontier import CrawlFrontier
+
+
+def crawl(frontier, pages):
+    """pages: {地址: 页面中的链接}，返回按顺序抓取的地址"""
+    visited = []
+
+    def visit(url, depth):
+        visited.append(url)
+        return pages.get(url, [])
+
+    frontier.run(visit, workers=1)
+    return visited
+
+
+def test_zero_page_budget_is_respected():
+    frontier = CrawlFrontier(max_pages=0)
+    frontier.push('https://example.com/tvbox.json', 0)
+    assert crawl(frontier, {}) == []
+    assert frontier.stats['global_budget'] == 1
+
+
+def test_zero_host_budget_is_respected():
+    frontier = CrawlFrontier(max_pages_per_host=0)
+    frontier.push('https://example.com/tvbox.json', 0)
+    assert crawl(frontier, {}) == []
+    assert frontier.stats['host_budget'] == 1
+
+
+def test_links_are_visited_once_within_depth():
+    pages = {
+        'https://a.com/page': ['https://a.com/tvbox.json', 'https://b.com/page', 'https://a.com/page'],
+        'https://b.com/page': ['https://a.com/tvbox.json', 'https://c.com/deep'],
+        'https://c.com/deep': ['https://d.com/too-deep'],
+    }
+    frontier = CrawlFrontier(max_depth=2)
+    frontier.push('https://a.com/page', 0)
+    visited = crawl(frontier, pages)
+    assert visited[0] == 'https://a.com/page'
+    assert sorted(visited) == ['https://a.com/page', 'https://a.com/tvbox.json', 'https://b.com/page',
+                               'https://c.com/deep']
+    assert frontier.stats['too_deep'] == 1
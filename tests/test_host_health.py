@@ -0,0 +1,43 @@
+import asyncio
+import contextlib
+
+import pytest
+
+import host_health
+from host_health import HostHealthTracker, tracked_get
+
+
+class Response:
+    status = 200
+
+
+class Session:
+    @contextlib.asynccontextmanager
+    async def get(self, url, **kwargs):
+        yield Response()
+
+
+@pytest.fixture
+def tracker(monkeypatch):
+    tracker = HostHealthTracker()
+    monkeypatch.setattr(host_health, '_tracker', tracker)
+    return tracker
+
+
+async def read(url, fail):
+    async with tracked_get(Session(), url, 10):
+        if fail:
+            raise asyncio.TimeoutError()
+
+
+def test_success_recorded_after_body(tracker):
+    asyncio.run(read('https://example.com/tv.json', fail=False))
+    assert tracker._get('example.com').stats['success'] == 1
+
+
+def test_timeout_while_reading_is_only_a_failure(tracker):
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(read('https://example.com/tv.json', fail=True))
+    stats = tracker._get('example.com').stats
+    assert stats['success'] == 0
+    assert stats['failure'] == 1
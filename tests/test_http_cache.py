@@ -0,0 +1,65 @@
+import time
+
+import http_cache
+from body_reader import BodyResult, FetchResult
+from http_cache import ValidationCache, check_with_cache
+
+
+def result(status, body=b'{"sites": []}'):
+    return FetchResult(status, {}, BodyResult(body, False, True) if status == 200 else None, 'utf-8', None)
+
+
+def make_cache(tmp_path, monkeypatch):
+    cache = ValidationCache(str(tmp_path / 'cache.db'), ttl=3600, negative_ttl=60)
+    monkeypatch.setattr(http_cache, '_cache', cache)
+    monkeypatch.setattr(http_cache, 'CACHE_ENABLED', True)
+    return cache
+
+
+def age(cache, seconds):
+    cache._conn.execute('UPDATE validation SET checked_at = checked_at - ?', (seconds,))
+
+
+def test_definitive_results_use_full_ttl(tmp_path, monkeypatch):
+    cache = make_cache(tmp_path, monkeypatch)
+    for status in (200, 404):
+        url = f"https://example.com/{status}.json"
+        check_with_cache('test', url, lambda headers: result(status), lambda r: r.status == 200)
+    age(cache, 600)
+    for status in (200, 404):
+        assert cache.is_fresh(cache.lookup('test', f"https://example.com/{status}.json"))
+
+
+def test_errors_use_negative_ttl(tmp_path, monkeypatch):
+    cache = make_cache(tmp_path, monkeypatch)
+    url = 'https://example.com/flaky.json'
+    fetches = []
+
+    def fetch(headers):
+        fetches.append(time.time())
+        return result(503) if len(fetches) == 1 else result(200)
+
+    assert check_with_cache('test', url, fetch, lambda r: r.status == 200) is False
+    # 有效期内直接使用缓存
+    assert check_with_cache('test', url, fetch, lambda r: r.status == 200) is False
+    assert len(fetches) == 1
+    age(cache, 120)
+    assert check_with_cache('test', url, fetch, lambda r: r.status == 200) is True
+    assert len(fetches) == 2
+
+
+def test_replay_never_fetches(tmp_path, monkeypatch):
+    cache = make_cache(tmp_path, monkeypatch)
+    url = 'https://example.com/tv.json'
+    check_with_cache('test', url, lambda headers: result(200), lambda r: r.status == 200)
+    age(cache, 7 * 24 * 3600)
+    monkeypatch.setattr(http_cache, 'REPLAY_MODE', True)
+
+    def fetch(headers):
+        raise AssertionError('回放模式下不应发出请求')
+
+    # 过期的判定照样使用，没有缓存的地址返回 default
+    assert check_with_cache('test', url, fetch, lambda r: r.status == 200) is True
+    assert check_with_cache('test', 'https://example.com/new.json', fetch, lambda r: True, default=False) is False
+    assert cache.stats['replayed'] == 1
+    assert cache.stats['replay_miss'] == 1
@@ -0,0 +1,43 @@
+import threading
+import time
+from concurrent.futures import Future
+
+import pytest
+import requests
+
+import search_tvbox_sources
+from cancellation import Cancelled, CancelToken
+
+
+def failed_future(*args):
+    future = Future()
+    future.set_exception(requests.exceptions.ConnectionError('连接被重置'))
+    return future
+
+
+def test_cancel_interrupts_retry_wait(monkeypatch):
+    token = CancelToken()
+    monkeypatch.setattr(search_tvbox_sources, 'search_token', token)
+    monkeypatch.setattr(search_tvbox_sources, 'submit_request', failed_future)
+    # 退避等待固定为 30 秒，取消后应立即返回
+    monkeypatch.setattr(search_tvbox_sources.backoff, 'full_jitter', lambda value: 30)
+    threading.Timer(0.2, token.cancel, args=('测试',)).start()
+    start = time.monotonic()
+    with pytest.raises(Cancelled):
+        search_tvbox_sources.make_request(None, 'https://example.com/tv.json', 5)
+    assert time.monotonic() - start < 5
+
+
+def test_gives_up_after_max_tries(monkeypatch):
+    calls = []
+
+    def submit(*args):
+        calls.append(args)
+        return failed_future()
+
+    monkeypatch.setattr(search_tvbox_sources, 'search_token', CancelToken())
+    monkeypatch.setattr(search_tvbox_sources, 'submit_request', submit)
+    monkeypatch.setattr(search_tvbox_sources.backoff, 'full_jitter', lambda value: 0)
+    with pytest.raises(requests.exceptions.ConnectionError):
+        search_tvbox_sources.make_request(None, 'https://example.com/tv.json', 5)
+    assert len(calls) == search_tvbox_sources.MAX_REQUEST_TRIES
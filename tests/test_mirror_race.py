@@ -0,0 +1,72 @@
+import threading
+import time
+
+import pytest
+
+import mirror_race
+from cancellation import Cancelled, CancelToken, current_token
+from rate_limiter import RequestScheduler
+
+
+class Result:
+    def __init__(self, status):
+        self.status = status
+
+
+@pytest.fixture(autouse=True)
+def mirror_stats(monkeypatch):
+    # 不读写镜像记录文件
+    monkeypatch.setattr(mirror_race, '_stats', mirror_race.MirrorStats(path=None))
+
+
+def test_race_cancels_started_losers():
+    loser_stopped = threading.Event()
+
+    def fetch(mirror_url):
+        if mirror_url == 'slow':
+            # 模拟逐块读取内容：每块之前检查当前线程的令牌
+            try:
+                for _ in range(100):
+                    current_token().check()
+                    time.sleep(0.05)
+            except Cancelled:
+                loser_stopped.set()
+                raise
+            return Result(200)
+        return Result(200)
+
+    token = CancelToken()
+    result = mirror_race.race('https://raw.githubusercontent.com/u/r/main/tv.json',
+                              [('a', 'slow'), ('b', 'fast')], fetch, stagger=0.05, token=token)
+    assert result.status == 200
+    assert loser_stopped.wait(2), "落败的请求没有被取消"
+    # 竞速的令牌已取消并从父令牌中移除
+    assert not token.cancelled and token._children == []
+
+
+def test_race_stops_when_parent_cancelled():
+    token = CancelToken()
+
+    def fetch(mirror_url):
+        current_token().sleep(10)
+        return Result(200)
+
+    threading.Timer(0.2, token.cancel).start()
+    start = time.monotonic()
+    with pytest.raises(Cancelled):
+        mirror_race.race('https://raw.githubusercontent.com/u/r/main/tv.json',
+                         [('a', 'one'), ('b', 'two')], fetch, stagger=0.05, token=token)
+    assert time.monotonic() - start < 2
+
+
+def test_mirror_hosts_skip_domain_cooldown():
+    scheduler = RequestScheduler(global_rate=1000, domain_rate=1 / 60, global_burst=10, max_workers=4,
+                                 exempt_domains=mirror_race.MIRROR_HOSTS)
+    mirror = [scheduler.submit('cdn.jsdelivr.net', lambda: 'ok') for _ in range(3)]
+    assert [future.result(timeout=2) for future in mirror] == ['ok'] * 3
+    other = [scheduler.submit('example.com', lambda: 'ok') for _ in range(2)]
+    assert other[0].result(timeout=2) == 'ok'
+    # 其他域名仍然受冷却限制
+    time.sleep(0.3)
+    assert not other[1].done()
+    other[1].cancel()
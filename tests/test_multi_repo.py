@@ -0,0 +1,26 @@
+import config_parser
+import multi_repo
+from multi_repo import parse_node_body
+
+
+def test_index_is_parsed_once(monkeypatch):
+    calls = []
+    loads = config_parser.loads_lenient
+
+    def counting_loads(text):
+        calls.append(text)
+        return loads(text)
+
+    monkeypatch.setattr(multi_repo, 'loads_lenient', counting_loads)
+    config, verdict = parse_node_body(b'{"urls": [{"name": "a", "url": "https://example.com/a.json"}]}')
+    assert config['urls'][0]['url'] == 'https://example.com/a.json'
+    assert verdict is None
+    # 不是 JSON 时只解析一次，直接按关键字判断
+    assert parse_node_body('<html>tvbox 接口</html>'.encode()) == (None, 'possible')
+    assert len(calls) == 2
+
+
+def test_non_json_verdicts():
+    assert parse_node_body(b'{"sites": [], oops') == (None, 'valid')
+    assert parse_node_body(b'<html>hello</html>') == (None, None)
+    assert parse_node_body(b'[1, 2]') == (None, None)
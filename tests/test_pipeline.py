@@ -0,0 +1,137 @@
+import threading
+
+import pytest
+
+from cancellation import CancelToken, Cancelled
+from pipeline import ValidationPipeline
+
+# join() 最多等待的时间（秒），超过即认为流水线卡住
+JOIN_TIMEOUT = 10
+
+
+class FailingStore:
+    def record(self, results):
+        raise RuntimeError('结果库写入失败')
+
+    def record_performance(self, measurements):
+        pass
+
+
+class MemoryStore:
+    def __init__(self):
+        self.results = {}
+
+    def record(self, results):
+        self.results.update(results)
+        return [url for url, status in results.items() if status != 'invalid']
+
+    def record_performance(self, measurements):
+        pass
+
+
+def fake_run_stream(source, sink, done, token=None):
+    """代替真实验证：地址以 .json 结尾为有效，结果直接放入 sink（与真实验证器一样不经过令牌）"""
+    async def run_stream():
+        while True:
+            url = token.get(source)
+            if url is done:
+                break
+            sink.put((url, 'valid' if url.endswith('.json') else None))
+        sink.put(done)
+    return run_stream()
+
+
+def make_pipeline(store, run_stream=fake_run_stream):
+    pipeline = ValidationPipeline(store, queue_size=2, token=CancelToken())
+    pipeline.validator.run_stream = run_stream
+    return pipeline.start()
+
+
+def join_with_timeout(pipeline):
+    errors = []
+
+    def join():
+        try:
+            pipeline.join()
+        except Exception as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=join, daemon=True)
+    thread.start()
+    thread.join(JOIN_TIMEOUT)
+    assert not thread.is_alive(), "join() 没有返回"
+    return errors
+
+
+def submit_all(pipeline, urls):
+    """像搜索线程一样提交地址，流水线停止时 submit 抛出 Cancelled"""
+    try:
+        for url in urls:
+            pipeline.submit(url)
+    except Cancelled:
+        pass
+    finally:
+        pipeline.close()
+
+
+def test_results_are_persisted():
+    store = MemoryStore()
+    pipeline = make_pipeline(store)
+    submit_all(pipeline, [f"https://example.com/{n}.json" for n in range(5)] + ['https://example.com/page'])
+    assert join_with_timeout(pipeline) == []
+    assert pipeline.tested == 6 and pipeline.valid == 5
+    assert store.results['https://example.com/page'] == 'invalid'
+
+
+def test_join_returns_when_store_fails():
+    pipeline = make_pipeline(FailingStore())
+    # 队列很小，保存阶段出错后若不再取出结果，验证和上游都会阻塞
+    submitter = threading.Thread(
+        target=submit_all, args=(pipeline, [f"https://example.com/{n}.json" for n in range(200)]), daemon=True)
+    submitter.start()
+    errors = join_with_timeout(pipeline)
+    submitter.join(JOIN_TIMEOUT)
+    assert not submitter.is_alive()
+    assert len(errors) == 1 and isinstance(errors[0], RuntimeError)
+    assert pipeline.token.cancelled
+
+
+def test_join_returns_when_validator_fails():
+    def failing_run_stream(source, sink, done, token=None):
+        async def run_stream():
+            raise ValueError('验证器出错')
+        return run_stream()
+
+    pipeline = make_pipeline(MemoryStore(), failing_run_stream)
+    submitter = threading.Thread(
+        target=submit_all, args=(pipeline, [f"https://example.com/{n}.json" for n in range(200)]), daemon=True)
+    submitter.start()
+    errors = join_with_timeout(pipeline)
+    submitter.join(JOIN_TIMEOUT)
+    assert not submitter.is_alive()
+    assert len(errors) == 1 and isinstance(errors[0], ValueError)
+
+
+def test_outer_cancel_still_persists_results():
+    store = MemoryStore()
+    token = CancelToken()
+    pipeline = ValidationPipeline(store, queue_size=2, token=token)
+    pipeline.validator.run_stream = fake_run_stream
+    pipeline.start()
+    pipeline.submit('https://example.com/a.json')
+    pipeline.close()
+    assert join_with_timeout(pipeline) == []
+    token.cancel()
+    assert pipeline.error is None
+    assert store.results == {'https://example.com/a.json': 'valid'}
+
+
+@pytest.mark.parametrize('queue_size', [1, 3])
+def test_small_queues(queue_size):
+    store = MemoryStore()
+    pipeline = ValidationPipeline(store, queue_size=queue_size, token=CancelToken())
+    pipeline.validator.run_stream = fake_run_stream
+    pipeline.start()
+    submit_all(pipeline, [f"https://example.com/{n}.json" for n in range(20)])
+    assert join_with_timeout(pipeline) == []
+    assert len(store.results) == 20
@@ -0,0 +1,14 @@
+from rate_limiter import RequestScheduler
+
+
+def test_cancelled_requests_do_not_use_tokens():
+    # 每个域名 10 秒一个请求，全局 0.1 秒一个请求
+    scheduler = RequestScheduler(global_rate=10, domain_rate=0.1, max_workers=2)
+    assert scheduler.submit('a.example', lambda: 'a').result(timeout=2) == 'a'
+    # 第一个请求刚用掉全局令牌，这个请求还在排队时被取消
+    cancelled = scheduler.submit('b.example', lambda: 'cancelled')
+    assert cancelled.cancel()
+    assert scheduler.stats().get('b.example', {'queued': 0})['queued'] == 0
+    # 取消的请求没有占用 b.example 的令牌，下一个请求不需要等待域名冷却
+    assert scheduler.submit('b.example', lambda: 'b').result(timeout=2) == 'b'
+    assert scheduler.stats()['b.example']['dispatched'] == 1
@@ -0,0 +1,70 @@
+import result_store
+from result_store import ResultStore
+
+
+def open_store(tmp_path, lines=None):
+    text_path = tmp_path / 'tvbox-source.txt'
+    if lines is not None:
+        text_path.write_text(''.join(f"{line}\n" for line in lines), encoding='utf-8')
+    return ResultStore(str(text_path), str(tmp_path / 'results.db'))
+
+
+def test_imports_existing_text_file(tmp_path):
+    store = open_store(tmp_path, ['[2024-01-01 00:00:00] https://a.example/tv.json', 'https://b.example/tv.json', ''])
+    assert len(store) == 2
+    assert 'https://a.example/tv.json' in store
+    assert 'https://c.example/tv.json' not in store
+
+
+def test_record_appends_only_new_valid_urls(tmp_path):
+    store = open_store(tmp_path, ['[2024-01-01 00:00:00] https://a.example/tv.json'])
+    new_urls = store.record({
+        'https://a.example/tv.json': 'valid',
+        'https://b.example/tv.json': 'possible',
+        'https://c.example/tv.json': 'invalid',
+    })
+    assert new_urls == ['https://b.example/tv.json']
+    lines = (tmp_path / 'tvbox-source.txt').read_text(encoding='utf-8').splitlines()
+    assert len(lines) == 2 and lines[1].endswith('] https://b.example/tv.json')
+    # 无效的地址之后变为有效时才追加
+    assert store.record({'https://c.example/tv.json': 'valid'}) == ['https://c.example/tv.json']
+
+
+def test_reimports_after_external_edit(tmp_path):
+    store = open_store(tmp_path, ['https://a.example/tv.json'])
+    store.close()
+    with open(tmp_path / 'tvbox-source.txt', 'a', encoding='utf-8') as f:
+        f.write('[2024-01-02 00:00:00] https://b.example/tv.json\n')
+    store = open_store(tmp_path)
+    assert 'https://b.example/tv.json' in store
+    assert len(store) == 2
+
+
+def test_export_text_round_trip(tmp_path):
+    lines = ['[2024-01-01 00:00:00] https://a.example/tv.json', 'https://b.example/tv.json',
+             '[2024-01-03 00:00:00] https://a.example/tv.json']
+    store = open_store(tmp_path, lines)
+    assert store.export_text() == 2
+    exported = (tmp_path / 'tvbox-source.txt').read_text(encoding='utf-8')
+    # 保持原有顺序和首次出现的时间，去掉重复行
+    assert exported == lines[0] + '\n' + lines[1] + '\n'
+    store.close()
+    # 重新打开时文件大小与记录一致，不需要重建索引
+    store = open_store(tmp_path)
+    assert store.export_text(str(tmp_path / 'copy.txt')) == 2
+    assert (tmp_path / 'copy.txt').read_text(encoding='utf-8') == exported
+
+
+def test_compaction_trims_history(tmp_path, monkeypatch):
+    monkeypatch.setattr(result_store, 'HISTORY_LIMIT', 3)
+    monkeypatch.setattr(result_store, 'COMPACT_EVERY_RUNS', 2)
+    store = open_store(tmp_path)
+    url = 'https://a.example/tv.json'
+    for _ in range(5):
+        store.record({url: 'valid'})
+    store.maybe_compact()
+    assert store._conn.execute('SELECT COUNT(*) FROM history').fetchone()[0] == 5
+    store.maybe_compact()
+    assert store._conn.execute('SELECT COUNT(*) FROM history').fetchone()[0] == 3
+    assert url in store
+    assert (tmp_path / 'tvbox-source.txt').read_text(encoding='utf-8').count(url) == 1
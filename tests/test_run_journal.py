@@ -0,0 +1,54 @@
+import json
+
+from run_journal import RunJournal
+
+
+def interrupted_run(path):
+    """模拟被中断的运行：发现三个地址，完成其中一个，不调用 finish"""
+    journal = RunJournal('search', path=path)
+    for n in range(3):
+        journal.found(f"https://example.com/{n}.json")
+    journal.done({'https://example.com/1.json': 'valid'})
+    journal.close()
+
+
+def test_resume_after_interruption(tmp_path):
+    path = str(tmp_path / 'journal.jsonl')
+    interrupted_run(path)
+    journal = RunJournal('search', path=path)
+    assert journal.resumed
+    assert journal.completed == {'https://example.com/1.json': 'valid'}
+    assert journal.pending == ['https://example.com/0.json', 'https://example.com/2.json']
+
+
+def test_truncated_last_line_is_dropped(tmp_path):
+    path = tmp_path / 'journal.jsonl'
+    interrupted_run(str(path))
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write('{"event": "done", "url": "https://example.com/2.js')
+    journal = RunJournal('search', path=str(path))
+    assert journal.resumed
+    assert 'https://example.com/2.json' in journal.pending
+    # 不完整的行被截掉，之后的记录从新的一行开始
+    journal.done({'https://example.com/2.json': 'invalid'})
+    journal.close()
+    records = [json.loads(line) for line in path.read_text(encoding='utf-8').splitlines()]
+    assert records[-1] == {'event': 'done', 'url': 'https://example.com/2.json', 'status': 'invalid'}
+    assert RunJournal('search', path=str(path)).pending == ['https://example.com/0.json']
+
+
+def test_other_or_stale_runs_start_over(tmp_path):
+    path = str(tmp_path / 'journal.jsonl')
+    interrupted_run(path)
+    assert not RunJournal('file', source='urls.txt', path=path).resumed
+    interrupted_run(path)
+    assert not RunJournal('search', path=path, max_age=-1).resumed
+
+
+def test_finish_removes_journal(tmp_path):
+    path = tmp_path / 'journal.jsonl'
+    journal = RunJournal('search', path=str(path))
+    journal.found('https://example.com/0.json')
+    journal.finish()
+    assert not path.exists()
+    assert not RunJournal('search', path=str(path)).resumed
@@ -0,0 +1,35 @@
+from url_canon import Canonicalizer, canon_stats, canonicalize_url, dedupe_urls
+
+RAW = 'https://raw.githubusercontent.com/user/repo/main/tv.json'
+
+
+def test_github_proxies_are_unwrapped():
+    assert canonicalize_url(f"https://ghproxy.net/{RAW}") == RAW
+    # 未知的代理只在被代理的是可以归并的 GitHub 地址时去掉
+    assert canonicalize_url('https://proxy.example.com/https://github.com/user/repo/blob/main/tv.json') == RAW
+
+
+def test_other_sites_keep_embedded_urls():
+    for url in ('https://example.com/https://example.org/tv.json',
+                'https://proxy.example.com/https://raw.githubusercontent.com/user'):
+        assert canonicalize_url(url) == url
+
+
+def test_only_collapsed_variants_count_as_avoided():
+    canonicalizer = Canonicalizer()
+    before = canon_stats()
+    # 完全相同的地址重复出现：只规范化一次，不计入
+    for _ in range(3):
+        assert canonicalizer.canonicalize(RAW) == RAW
+    # 不同写法归并到已有的规范地址：计入
+    assert canonicalizer.canonicalize('https://github.com/user/repo/blob/main/tv.json') == RAW
+    assert canonicalizer.canonicalize("https://cdn.jsdelivr.net/gh/user/repo@main/tv.json") == RAW
+    after = canon_stats()
+    assert after['input'] - before['input'] == 3
+    assert after['avoided'] - before['avoided'] == 2
+
+
+def test_dedupe_urls():
+    before = canon_stats()
+    assert dedupe_urls([RAW, RAW, 'https://github.com/user/repo/blob/main/tv.json?utm_source=x']) == [RAW]
+    assert canon_stats()['avoided'] - before['avoided'] == 1
@@ -0,0 +1,43 @@
+import pytest
+
+import search_tvbox_sources
+from metrics import get_metrics, reset_metrics
+from url_classifier import DROP_NO_MATCH, DROP_SEARCH_PAGE, KEEP, classify_url, classify_urls, record_rejected
+
+
+@pytest.fixture(autouse=True)
+def metrics():
+    reset_metrics()
+    yield
+    reset_metrics()
+
+
+def rejected():
+    counters = get_metrics().snapshot()['counters'].get('rejected_total', [])
+    return {counter['labels']['reason']: counter['value'] for counter in counters}
+
+
+def test_classification():
+    assert classify_url('https://raw.githubusercontent.com/u/r/main/TV.JSON') == (True, KEEP)
+    assert classify_url('https://www.baidu.com/s?wd=tvbox') == (False, DROP_SEARCH_PAGE)
+    assert classify_url('https://example.com/about') == (False, DROP_NO_MATCH)
+    batch = classify_urls(['https://example.com/tvbox.json', 'https://example.com/about',
+                           'https://example.com/tvbox.json'])
+    assert [c.keep for c in batch] == [True, False, True]
+
+
+def test_classifying_does_not_count():
+    for _ in range(3):
+        classify_url('https://example.com/about')
+    classify_urls(['https://example.com/about'] * 3)
+    assert rejected() == {}
+    record_rejected(DROP_NO_MATCH)
+    assert rejected() == {DROP_NO_MATCH: 1}
+
+
+def test_process_url_counts_each_rejected_url_once(monkeypatch):
+    monkeypatch.setattr(search_tvbox_sources, 'processed_urls', set())
+    for _ in range(3):
+        search_tvbox_sources.process_url('https://example.com/about')
+    search_tvbox_sources.process_url('https://www.bing.com/search?q=tvbox')
+    assert rejected() == {DROP_NO_MATCH: 1, DROP_SEARCH_PAGE: 1}
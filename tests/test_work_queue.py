@@ -0,0 +1,93 @@
+import pytest
+
+import work_queue
+from work_queue import open_queue
+
+URLS = [f"https://example.com/{n}.json" for n in range(4)]
+
+
+class Clock:
+    """代替 work_queue 中的 time 模块，由测试推进时间"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = open_queue('sqlite', str(tmp_path / 'queue.db'))
+    queue.add(URLS)
+    yield queue
+    queue.close()
+
+
+def test_claims_do_not_overlap(queue):
+    first = queue.claim('a', 3, 60)
+    second = queue.claim('b', 3, 60)
+    assert len(first) == 3 and len(second) == 1
+    assert not set(first) & set(second)
+    assert queue.claim('c', 3, 60) == []
+    assert queue.stats()['leased'] == 4
+
+
+def test_expired_lease_is_reclaimed(queue, monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(work_queue, 'time', clock)
+    claimed = queue.claim('a', 2, 60)
+    remaining = queue.claim('b', 2, 120)
+    assert queue.claim('b', 10, 60) == []
+    # 工作进程 a 中断，租约到期后由 b 接手；b 的租约还没有到期
+    clock.now += 90
+    assert sorted(queue.claim('b', 10, 60)) == sorted(claimed)
+    assert sorted(claimed + remaining) == URLS
+
+
+def test_heartbeat_keeps_lease(queue, monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(work_queue, 'time', clock)
+    queue.claim('a', 4, 60)
+    clock.now += 50
+    assert queue.heartbeat('a', 60) == 4
+    clock.now += 50
+    assert queue.claim('b', 4, 60) == []
+
+
+def test_release_returns_urls_without_using_an_attempt(queue):
+    claimed = queue.claim('a', 2, 60)
+    queue.release('a', claimed)
+    stats = queue.stats()
+    assert stats['pending'] == 4 and stats['leased'] == 0
+    with queue._lock:
+        attempts = queue._conn.execute('SELECT MAX(attempts) FROM items').fetchone()[0]
+    assert attempts == 0
+    # 只放回自己持有的地址
+    claimed = queue.claim('a', 1, 60)
+    queue.release('b', claimed)
+    assert queue.stats()['leased'] == 1
+
+
+def test_fails_after_max_attempts(queue, monkeypatch):
+    monkeypatch.setattr(work_queue, 'QUEUE_MAX_ATTEMPTS', 2)
+    clock = Clock()
+    monkeypatch.setattr(work_queue, 'time', clock)
+    for _ in range(2):
+        assert len(queue.claim('a', 10, 60)) == 4
+        clock.now += 120
+    assert queue.claim('a', 10, 60) == []
+    assert sorted(queue.failed()) == URLS
+    assert queue.stats()['failed'] == 4
+
+
+def test_complete_results_and_requeue(queue):
+    queue.claim('a', 4, 60)
+    queue.complete('a', {URLS[0]: ('valid', [0.1, 0.2, 100, 3, 1]), URLS[1]: ('invalid', None)})
+    assert sorted(queue.results()) == [(URLS[0], 'valid', [0.1, 0.2, 100, 3, 1]), (URLS[1], 'invalid', None)]
+    assert queue.stats()['unreported'] == 2
+    queue.mark_reported([URLS[0], URLS[1]])
+    assert queue.results() == []
+    # 已取走结果的地址在下一轮重新排队，仍在队列中的地址不重复加入
+    assert queue.add(URLS) == 2
+    assert queue.stats()['pending'] == 2
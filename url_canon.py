@@ -0,0 +1,159 @@
+# 在发起任何请求之前把地址规范化：同一个配置文件经由 github.com/…/blob/…、raw.githubusercontent.com、
+# jsDelivr、kgithub.com、ghproxy 一类代理前缀、gitee 的 raw/blob 链接访问时，都映射为同一个规范地址；
+# 同时去掉跟踪参数、统一协议和域名大小写、去掉片段，并统计因此少发了多少次请求
+import re
+import threading
+import urllib.parse
+
+# 统一改写为 https 的域名（这些站点都支持 https）
+HTTPS_HOSTS = {
+    'github.com', 'raw.githubusercontent.com', 'gist.github.com', 'gist.githubusercontent.com',
+    'gitee.com', 'cdn.jsdelivr.net', 'fastly.jsdelivr.net', 'gcore.jsdelivr.net',
+    'testingcf.jsdelivr.net', 'kgithub.com', 'raw.kgithub.com', 'kkgithub.com', 'raw.kkgithub.com',
+}
+
+# 与 github.com 相同路径结构的镜像站
+GITHUB_MIRRORS = {'github.com', 'kgithub.com', 'kkgithub.com', 'hub.nuaa.cf'}
+
+# 与 raw.githubusercontent.com 相同路径结构的镜像站
+RAW_MIRRORS = {'raw.githubusercontent.com', 'raw.kgithub.com', 'raw.kkgithub.com', 'raw.nuaa.cf'}
+
+# jsDelivr 的各个 CDN 域名
+JSDELIVR_HOSTS = {'cdn.jsdelivr.net', 'fastly.jsdelivr.net', 'gcore.jsdelivr.net', 'testingcf.jsdelivr.net'}
+
+# ghproxy 一类的 GitHub 代理，路径中的地址一律去掉代理前缀
+GITHUB_PROXIES = {
+    'ghproxy.net', 'ghproxy.com', 'mirror.ghproxy.com', 'ghproxy.cc', 'gh-proxy.com', 'ghfast.top',
+    'gh.llkk.cc', 'github.moeyy.xyz', 'gh.api.99988866.xyz',
+}
+
+# 需要去掉的跟踪参数
+TRACKING_PARAMS = {'fbclid', 'gclid', 'msclkid', 'yclid', 'spm', 'mc_cid', 'mc_eid', '_hsenc', '_hsmi'}
+TRACKING_PREFIXES = ('utm_',)
+
+# ghproxy 一类代理：https://代理域名/https://raw.githubusercontent.com/...
+_PROXY_PREFIX = re.compile(r'^/+(https?:/+)(.+)$', re.I)
+
+_lock = threading.Lock()
+_stats = {'input': 0, 'rewritten': 0, 'avoided': 0}
+
+
+def _is_tracking_param(key):
+    key = key.lower()
+    return key in TRACKING_PARAMS or key.startswith(TRACKING_PREFIXES)
+
+
+def _unwrap_proxy(parts):
+    """去掉 ghproxy 一类的代理前缀，返回被代理的原始地址的各部分。
+    只在代理是已知的 GitHub 代理，或被代理的是可以归并的 GitHub、raw、jsDelivr 地址时去掉；
+    其他站点路径中带的地址原样保留，不改变请求的目标"""
+    while True:
+        match = _PROXY_PREFIX.match(parts.path)
+        if not match:
+            return parts
+        scheme = match.group(1).split(':')[0].lower()
+        inner = f"{scheme}://{match.group(2)}"
+        if parts.query:
+            inner += f"?{parts.query}"
+        inner_parts = urllib.parse.urlsplit(inner)
+        if ((parts.hostname or '').lower() not in GITHUB_PROXIES and _github_raw_path(
+                (inner_parts.hostname or '').lower(), [s for s in inner_parts.path.split('/') if s]) is None):
+            return parts
+        parts = inner_parts
+
+
+def _github_raw_path(host, segments):
+    """把 GitHub 及其镜像的各种文件地址转成 raw.githubusercontent.com 的路径段，无法识别时返回 None"""
+    if host in GITHUB_MIRRORS and len(segments) >= 5 and segments[2] in ('blob', 'raw'):
+        # /用户/仓库/blob/分支/路径 -> /用户/仓库/分支/路径
+        return segments[:2] + segments[3:]
+    if host in RAW_MIRRORS and len(segments) >= 4:
+        if len(segments) >= 6 and segments[2] == 'refs' and segments[3] in ('heads', 'tags'):
+            # /用户/仓库/refs/heads/分支/路径 -> /用户/仓库/分支/路径
+            return segments[:2] + segments[4:]
+        return segments
+    if host in JSDELIVR_HOSTS and len(segments) >= 4 and segments[0] == 'gh':
+        # /gh/用户/仓库@分支/路径 -> /用户/仓库/分支/路径，未指定分支时用 HEAD（默认分支）
+        repo, _, ref = segments[2].partition('@')
+        return [segments[1], repo, ref or 'HEAD'] + segments[3:]
+    return None
+
+
+def canonicalize_url(url):
+    """返回地址的规范形式，作为去重的键，也是实际请求和保存的地址"""
+    parts = urllib.parse.urlsplit(url.strip())
+    if parts.scheme.lower() not in ('http', 'https'):
+        return url
+    parts = _unwrap_proxy(parts)
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower()
+    try:
+        port = parts.port
+    except ValueError:
+        return url
+    if port and (scheme, port) not in (('http', 80), ('https', 443)):
+        netloc = f"{host}:{port}"
+    else:
+        netloc = host
+    path = parts.path or '/'
+
+    segments = [s for s in path.split('/') if s]
+    raw_segments = _github_raw_path(host, segments)
+    if raw_segments is not None:
+        netloc = host = 'raw.githubusercontent.com'
+        path = '/' + '/'.join(raw_segments)
+    elif host == 'gitee.com' and len(segments) >= 5 and segments[2] == 'blob':
+        # gitee 的 blob 页面统一为 raw 地址
+        path = '/' + '/'.join(segments[:2] + ['raw'] + segments[3:])
+    if host in HTTPS_HOSTS:
+        scheme = 'https'
+
+    # 按原样保留其余参数的写法，只去掉跟踪参数
+    query = '&'.join(
+        param for param in parts.query.split('&')
+        if param and not _is_tracking_param(param.split('=', 1)[0]))
+    canonical = urllib.parse.urlunsplit((scheme, netloc, path, query, ''))
+    with _lock:
+        _stats['input'] += 1
+        if canonical != url:
+            _stats['rewritten'] += 1
+    return canonical
+
+
+class Canonicalizer:
+    """规范化一次运行中遇到的地址，每个原始地址只规范化一次。
+    不同的原始地址映射到已出现过的规范地址时计入避免的请求数；完全相同的地址再次出现时不计入
+    （不做规范化也能按原样去重）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._canonical = {}  # 原始地址 -> 规范地址
+        self._keys = set()
+
+    def canonicalize(self, url):
+        with self._lock:
+            canonical = self._canonical.get(url)
+        if canonical is not None:
+            return canonical
+        canonical = canonicalize_url(url)
+        with self._lock:
+            if url not in self._canonical:
+                self._canonical[url] = canonical
+                if canonical in self._keys:
+                    with _lock:
+                        _stats['avoided'] += 1
+                else:
+                    self._keys.add(canonical)
+        return canonical
+
+
+def dedupe_urls(urls):
+    """规范化并去重，保持原有顺序；不同写法的同一地址计入避免的请求数"""
+    canonicalizer = Canonicalizer()
+    return list(dict.fromkeys(canonicalizer.canonicalize(url) for url in urls))
+
+
+def canon_stats():
+    """返回 {'input': 规范化的地址数, 'rewritten': 被改写的地址数, 'avoided': 不同写法归并后避免的请求数}"""
+    with _lock:
+        return dict(_stats)
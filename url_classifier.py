@@ -0,0 +1,77 @@
+# 预编译的地址分类器：判断一个地址是否可能是 TVBox 配置，代替 process_url 和 is_valid_tvbox_url
+# 中重复执行的两个正则（排除规则和匹配规则）。
+# 地址转小写后用预编译的正则检查（比不区分大小写的正则快得多）：先检查排除规则（“仓库主页”这一条
+# 只在包含 github.com/ 时才检查），再检查匹配规则（关键字和“域名之后出现 .json”两类合并为一个正则）。
+# 每个地址只分类一次：process_url 分类后把结果交给 is_valid_tvbox_url；页面上的链接由 classify_urls
+# 批量分类，同一批中重复的地址只检查一次。
+# 判定结果与原来的两个正则完全一致，见 benchmarks/bench_url_classifier.py
+import re
+from collections import namedtuple
+
+from metrics import inc
+
+# 分类结果的原因代码
+KEEP = 'keep'                        # 符合 TVBox 配置地址的模式
+DROP_GITHUB_SEARCH = 'github_search'  # GitHub 搜索页面
+DROP_REPO_HOME = 'repo_home'          # GitHub 仓库主页
+DROP_SEARCH_PAGE = 'search_page'      # 搜索引擎结果页
+DROP_NO_MATCH = 'no_match'            # 不符合任何 TVBox 配置地址的模式
+DROP_EMPTY = 'empty'                  # 空地址
+
+# 排除规则：原正则 github\.com/search|search\?q=|\.com/s\?|\.com/web\?，匹配到的字符串 -> 原因代码
+EXCLUDE_REASONS = {
+    'github.com/search': DROP_GITHUB_SEARCH,
+    'search?q=': DROP_SEARCH_PAGE,
+    '.com/s?': DROP_SEARCH_PAGE,
+    '.com/web?': DROP_SEARCH_PAGE,
+}
+_EXCLUDE = re.compile('|'.join(re.escape(substring) for substring in EXCLUDE_REASONS))
+
+# 排除规则：原正则 github\.com/[^/]+/[^/]+$
+_REPO_HOME = re.compile(r'github\.com/[^/]+/[^/]+$')
+
+# 匹配规则：关键字和“域名之后某处出现 .json”合并为一个正则，原正则 tvbox|tv\.json|live\.json|epg\.json
+# |source\.json|raw\.githubusercontent\.com.*\.json|gitee\.com.*\.json|pastebin\.com|gist\.github\.com
+_INCLUDE = re.compile(
+    r'tvbox|tv\.json|live\.json|epg\.json|source\.json|pastebin\.com|gist\.github\.com'
+    r'|raw\.githubusercontent\.com.*\.json|gitee\.com.*\.json')
+
+Classification = namedtuple('Classification', ['url', 'keep', 'reason'])
+
+
+def _classify(url):
+    lowered = url.lower()
+    excluded = _EXCLUDE.search(lowered)
+    if excluded:
+        return EXCLUDE_REASONS[excluded.group()]
+    if 'github.com/' in lowered and _REPO_HOME.search(lowered):
+        return DROP_REPO_HOME
+    if _INCLUDE.search(lowered):
+        return KEEP
+    return DROP_NO_MATCH
+
+
+def classify_url(url):
+    """返回 (是否保留, 原因代码)；不计数，地址最终被丢弃时由调用方调用 record_rejected"""
+    if not url:
+        return False, DROP_EMPTY
+    reason = _classify(url)
+    return reason == KEEP, reason
+
+
+def classify_urls(urls):
+    """批量分类，返回与输入顺序一致的 Classification 列表；同一批中重复的地址只检查一次"""
+    results = []
+    seen = {}
+    for url in urls:
+        classification = seen.get(url)
+        if classification is None:
+            reason = _classify(url) if url else DROP_EMPTY
+            classification = seen[url] = Classification(url, reason == KEEP, reason)
+        results.append(classification)
+    return results
+
+
+def record_rejected(reason):
+    """地址因 reason 被丢弃（每个地址只在最终丢弃的地方计数一次）"""
+    inc('rejected_total', reason=reason)
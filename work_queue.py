@@ -0,0 +1,191 @@
+# 分布式验证的工作队列：把大批候选地址（爬取得到的几十万个）分给多个验证进程，或多台机器上的进程。
+# 地址加入队列后，每个工作进程领取一批（租约：QUEUE_LEASE_SECONDS 秒内归它处理），验证期间定时发送心跳延长租约，
+# 验证完把判定结果和性能数据交回队列。工作进程崩溃或被终止时租约到期，这批地址由其他工作进程重新领取，
+# 领取超过 QUEUE_MAX_ATTEMPTS 次仍没有完成的地址记为失败。
+# 结果由 collect（见 queue_worker）统一写入同一个结果库，结果库和 tvbox-source.txt 始终只有一个写入者。
+# 默认后端是本地 SQLite 文件（WAL 模式，多个进程可以同时读写）；其他后端（Redis、HTTP 服务等）
+# 实现与 SqliteWorkQueue 相同的方法后用 register_backend 注册，通过 QUEUE_BACKEND 选择
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# 工作队列的后端
+QUEUE_BACKEND = 'sqlite'
+
+# 后端的位置，sqlite 后端为数据库文件
+QUEUE_FILE = 'tvbox-queue.db'
+
+# 每次领取的地址数
+QUEUE_BATCH_SIZE = 200
+
+# 租约时长（秒），超过该时间没有心跳的地址可以被其他工作进程重新领取
+QUEUE_LEASE_SECONDS = 120
+
+# 每个地址最多领取的次数，超过后记为失败
+QUEUE_MAX_ATTEMPTS = 3
+
+# 等待数据库锁的最长时间（秒），多个进程同时领取时会短暂排队
+QUEUE_BUSY_TIMEOUT = 30
+
+# 每个地址的状态
+PENDING = 'pending'
+LEASED = 'leased'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class SqliteWorkQueue:
+    def __init__(self, path=None):
+        self.path = path or QUEUE_FILE
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            self.path, timeout=QUEUE_BUSY_TIMEOUT, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript(
+            'CREATE TABLE IF NOT EXISTS items ('
+            ' url TEXT PRIMARY KEY, state TEXT NOT NULL, owner TEXT, lease_expires REAL,'
+            ' attempts INTEGER NOT NULL DEFAULT 0, status TEXT, measurement TEXT,'
+            ' reported INTEGER NOT NULL DEFAULT 0, added REAL, finished REAL);'
+            'CREATE INDEX IF NOT EXISTS items_state ON items (state, lease_expires);'
+            'CREATE INDEX IF NOT EXISTS items_unreported ON items (state) WHERE reported = 0;')
+
+    def _transaction(self, work):
+        """在写事务中执行 work(连接)；BEGIN IMMEDIATE 一开始就取得写锁，多个进程同时领取时不会领到同一批地址"""
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                result = work(self._conn)
+            except BaseException:
+                self._conn.execute('ROLLBACK')
+                raise
+            self._conn.execute('COMMIT')
+            return result
+
+    def add(self, urls):
+        """加入地址，返回新加入的数量；已在队列中的地址忽略，上一轮已取走结果的地址重新排队"""
+        now = time.time()
+
+        def work(conn):
+            before = conn.total_changes
+            conn.executemany(
+                'INSERT INTO items (url, state, added) VALUES (?, ?, ?)'
+                ' ON CONFLICT(url) DO UPDATE SET state = excluded.state, owner = NULL, lease_expires = NULL,'
+                ' attempts = 0, status = NULL, measurement = NULL, reported = 0, added = excluded.added,'
+                ' finished = NULL WHERE items.reported = 1',
+                ((url, PENDING, now) for url in urls))
+            return conn.total_changes - before
+
+        return self._transaction(work)
+
+    def claim(self, worker, limit=None, lease_seconds=None):
+        """领取最多 limit 个地址（先领取租约已到期的，再领取新地址），返回地址列表"""
+        limit = limit or QUEUE_BATCH_SIZE
+        lease_seconds = lease_seconds or QUEUE_LEASE_SECONDS
+        now = time.time()
+
+        def work(conn):
+            # 租约到期、领取次数已用完的地址记为失败
+            conn.execute(
+                'UPDATE items SET state = ?, owner = NULL, finished = ?'
+                ' WHERE state = ? AND lease_expires < ? AND attempts >= ?',
+                (FAILED, now, LEASED, now, QUEUE_MAX_ATTEMPTS))
+            urls = [row[0] for row in conn.execute(
+                'SELECT url FROM items WHERE state = ? AND lease_expires < ? LIMIT ?', (LEASED, now, limit))]
+            if len(urls) < limit:
+                urls += [row[0] for row in conn.execute(
+                    'SELECT url FROM items WHERE state = ? LIMIT ?', (PENDING, limit - len(urls)))]
+            conn.executemany(
+                'UPDATE items SET state = ?, owner = ?, lease_expires = ?, attempts = attempts + 1 WHERE url = ?',
+                ((LEASED, worker, now + lease_seconds, url) for url in urls))
+            return urls
+
+        return self._transaction(work)
+
+    def heartbeat(self, worker, lease_seconds=None):
+        """延长 worker 持有的所有租约，返回延长的地址数"""
+        lease_seconds = lease_seconds or QUEUE_LEASE_SECONDS
+        with self._lock:
+            return self._conn.execute(
+                'UPDATE items SET lease_expires = ? WHERE state = ? AND owner = ?',
+                (time.time() + lease_seconds, LEASED, worker)).rowcount
+
+    def complete(self, worker, results):
+        """交回判定结果 {地址: (状态, Measurement 或 None)}，状态为 'valid'、'possible' 或 'invalid'。
+        租约已被其他工作进程重新领取的地址同样接受，先交回的结果为准"""
+        now = time.time()
+
+        def work(conn):
+            conn.executemany(
+                'UPDATE items SET state = ?, owner = NULL, status = ?, measurement = ?, finished = ?'
+                ' WHERE url = ? AND state != ?',
+                ((DONE, status, json.dumps(measurement) if measurement is not None else None, now, url, DONE)
+                 for url, (status, measurement) in results.items()))
+
+        self._transaction(work)
+
+    def release(self, worker, urls):
+        """放回没有验证完的地址（工作进程正常停止时），不计入领取次数"""
+        def work(conn):
+            conn.executemany(
+                'UPDATE items SET state = ?, owner = NULL, lease_expires = NULL, attempts = attempts - 1'
+                ' WHERE url = ? AND state = ? AND owner = ?',
+                ((PENDING, url, LEASED, worker) for url in urls))
+
+        self._transaction(work)
+
+    def results(self, limit=None):
+        """返回尚未取走的已完成地址 [(地址, 状态, [ttfb, elapsed, size, sites, lives] 或 None), ...]"""
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT url, status, measurement FROM items WHERE state = ? AND reported = 0 LIMIT ?',
+                (DONE, limit or -1)).fetchall()
+        return [(url, status, json.loads(measurement) if measurement else None) for url, status, measurement in rows]
+
+    def failed(self, limit=None):
+        """返回尚未取走的失败地址"""
+        with self._lock:
+            return [row[0] for row in self._conn.execute(
+                'SELECT url FROM items WHERE state = ? AND reported = 0 LIMIT ?', (FAILED, limit or -1))]
+
+    def mark_reported(self, urls):
+        """结果已写入结果库，这些地址在下一轮 add 时可以重新排队"""
+        self._transaction(lambda conn: conn.executemany(
+            'UPDATE items SET reported = 1 WHERE url = ?', ((url,) for url in urls)))
+
+    def stats(self):
+        """返回各状态的地址数，以及已完成但尚未取走结果的地址数（unreported）"""
+        with self._lock:
+            counts = dict(self._conn.execute('SELECT state, COUNT(*) FROM items GROUP BY state').fetchall())
+            unreported = self._conn.execute(
+                'SELECT COUNT(*) FROM items WHERE state = ? AND reported = 0', (DONE,)).fetchone()[0]
+        stats = {state: counts.get(state, 0) for state in (PENDING, LEASED, DONE, FAILED)}
+        stats['unreported'] = unreported
+        return stats
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+# 后端名称 -> 工厂函数(位置)
+_BACKENDS = {'sqlite': SqliteWorkQueue}
+
+
+def register_backend(name, factory):
+    """注册工作队列后端：factory(位置) 返回实现 add/claim/heartbeat/complete/release/results/failed/
+    mark_reported/stats/close 的对象"""
+    _BACKENDS[name] = factory
+
+
+def open_queue(backend=None, location=None):
+    """打开工作队列，backend 默认为 QUEUE_BACKEND，location 默认为 QUEUE_FILE"""
+    backend = backend or QUEUE_BACKEND
+    factory = _BACKENDS.get(backend)
+    if factory is None:
+        raise ValueError(f"未知的工作队列后端 {backend}，可用的后端: {', '.join(sorted(_BACKENDS))}")
+    return factory(location or QUEUE_FILE)